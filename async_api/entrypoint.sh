@@ -1,5 +1,5 @@
 #!/bin/sh
 
-gunicorn main:app --chdir src --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
+gunicorn main:app -c gunicorn.conf.py --chdir src --workers 4 --worker-class uvicorn.workers.UvicornWorker --bind 0.0.0.0:8000
 
 exec "$@"
\ No newline at end of file
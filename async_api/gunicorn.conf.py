@@ -0,0 +1,39 @@
+"""
+Gunicorn hooks: the master starts the catalog snapshot builder next to the workers, see jobs.catalog_snapshot.
+
+The builder runs in a process of its own rather than in the master, which must stay free to manage the workers.
+A thread of the master restarts the builder when it crashes; it exits by itself only when the snapshot is disabled.
+"""
+import subprocess
+import sys
+import threading
+
+# Pause before restarting a crashed builder, so one failing on start doesn't spin
+_RESTART_DELAY_SECONDS = 10
+
+_builder: subprocess.Popen | None = None
+_stopping = threading.Event()
+
+
+def when_ready(server):
+    threading.Thread(target=_keep_builder_running, args=(server,), name='catalog-snapshot-builder', daemon=True).start()
+
+
+def on_exit(server):
+    _stopping.set()
+    if _builder and _builder.poll() is None:
+        _builder.terminate()
+        _builder.wait()
+
+
+def _keep_builder_running(server):
+    global _builder
+    while not _stopping.is_set():
+        _builder = subprocess.Popen([sys.executable, '-m', 'jobs.catalog_snapshot', '--watch'], cwd=server.cfg.chdir)
+        server.log.info('Started catalog snapshot builder, pid %s', _builder.pid)
+        returncode = _builder.wait()
+        if returncode == 0 or _stopping.is_set():
+            return
+        server.log.error('Catalog snapshot builder exited with %s, restarting in %s s', returncode,
+                         _RESTART_DELAY_SECONDS)
+        _stopping.wait(_RESTART_DELAY_SECONDS)
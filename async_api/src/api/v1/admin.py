@@ -0,0 +1,131 @@
+import os
+import time
+from http import HTTPStatus
+from typing import Annotated, Dict, List, Literal
+
+from elasticsearch import AsyncElasticsearch
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Response
+from redis import RedisError
+from redis.asyncio import Redis
+
+from core.config import settings
+from core.profiler import Profiler, ProfileMode, ProfilerBusyError, get_profiler
+from db.cache_generations import CacheGeneration, CacheGenerations, get_cache_generations
+from db.elastic import get_elastic
+from db.hot_keys import CATEGORIES, HotKey, HotKeys, aggregated_top, get_hot_keys
+from db.query_log import QueryLog, SlowQuery, get_query_log
+from db.redis import get_redis
+from models.user import User
+from services.film import MOVIES_INDEX
+from services.genre import GENRES_INDEX
+from services.person import PERSONS_INDEX
+from services.warmup import build_cache_warmer
+from api.v1.dependencies import get_admin_user
+
+router = APIRouter()
+
+
+@router.post('/profile', response_class=Response)
+async def profile_worker(
+    _: Annotated[User, Depends(get_admin_user)],
+    profiler: Annotated[Profiler, Depends(get_profiler)],
+    mode: Annotated[ProfileMode, Query(description='profiler type')] = ProfileMode.SAMPLING,
+    seconds: Annotated[float, Query(gt=0, le=settings.profiling_max_seconds, description='profiling duration')] = 10,
+    requests: Annotated[int | None, Query(ge=1, description='stop after this many requests')] = None,
+) -> Response:
+    """
+    Profile the worker serving this request and return pstats or collapsed stacks
+    """
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='profiling is disabled')
+    try:
+        session = await profiler.profile(mode, seconds, requests)
+    except ProfilerBusyError:
+        raise HTTPException(status_code=HTTPStatus.CONFLICT, detail='profiling is already in progress')
+    filename = f'profile-{os.getpid()}-{int(time.time())}.{session.extension}'
+    return Response(
+        content=session.dump(),
+        media_type=session.media_type,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Profiled-Requests': str(session.requests),
+        },
+    )
+
+
+@router.get('/slow-queries', response_model=List[SlowQuery])
+async def slow_queries(
+    _: Annotated[User, Depends(get_admin_user)],
+    query_log: Annotated[QueryLog, Depends(get_query_log)],
+    limit: Annotated[int | None, Query(ge=1, description='max number of queries to return')] = None,
+) -> List[SlowQuery]:
+    """
+    Get the latest slow Elasticsearch queries recorded by this worker
+    """
+    return query_log.entries(limit)
+
+
+@router.delete('/slow-queries', status_code=HTTPStatus.NO_CONTENT)
+async def clear_slow_queries(
+    _: Annotated[User, Depends(get_admin_user)],
+    query_log: Annotated[QueryLog, Depends(get_query_log)],
+) -> None:
+    """
+    Clear slow Elasticsearch queries recorded by this worker
+    """
+    query_log.clear()
+
+
+@router.get('/cache/generations', response_model=Dict[str, int])
+async def cache_generations(
+    _: Annotated[User, Depends(get_admin_user)],
+    generations: Annotated[CacheGenerations, Depends(get_cache_generations)],
+) -> Dict[str, int]:
+    """
+    Get cache generations of indices seen by this worker
+    """
+    return generations.all()
+
+
+@router.post('/cache/generations/{index}', response_model=CacheGeneration)
+async def bump_cache_generation(
+    _: Annotated[User, Depends(get_admin_user)],
+    index: Annotated[Literal[MOVIES_INDEX, PERSONS_INDEX, GENRES_INDEX], Path(description='index name')],
+    generations: Annotated[CacheGenerations, Depends(get_cache_generations)],
+    redis: Annotated[Redis, Depends(get_redis)],
+    elastic: Annotated[AsyncElasticsearch, Depends(get_elastic)],
+    prewarm: Annotated[bool, Query(description='fill the new generation before switching to it')] = False,
+) -> CacheGeneration:
+    """
+    Invalidate cached data of an index by switching it to a new cache generation
+    """
+    async def warm(pinned: CacheGenerations) -> None:
+        await build_cache_warmer(redis, elastic, pinned).warm()
+
+    try:
+        generation = await generations.bump(redis, index, warm if prewarm else None)
+    except RedisError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail='cache is unavailable')
+    return CacheGeneration(index=index, generation=generation)
+
+
+@router.get('/hot-keys/{category}', response_model=List[HotKey])
+async def hot_keys_top(
+    _: Annotated[User, Depends(get_admin_user)],
+    category: Annotated[Literal[CATEGORIES], Path(description='kind of requested keys')],
+    redis: Annotated[Redis, Depends(get_redis)],
+    hot_keys: Annotated[HotKeys | None, Depends(get_hot_keys)],
+    limit: Annotated[int, Query(description='number of keys', ge=1, le=1000)] = 20,
+    worker: Annotated[bool, Query(description='count requests to this worker only')] = False,
+) -> List[HotKey]:
+    """
+    Get the most requested films, persons, search queries or list pages
+    """
+    if worker:
+        if hot_keys is None:
+            raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='hot keys are not tracked')
+        return hot_keys.top(category, limit)
+    try:
+        return await aggregated_top(redis, category, limit)
+    except RedisError:
+        raise HTTPException(status_code=HTTPStatus.SERVICE_UNAVAILABLE, detail='cache is unavailable')
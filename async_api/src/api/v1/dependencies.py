@@ -1,12 +1,14 @@
-from typing import Annotated
+from typing import Annotated, List, Literal
 from http import HTTPStatus
+from uuid import UUID
 
 from fastapi import Query, HTTPException, Request, Depends
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
+from db.data_storage import FilmFilters
 from services.token import TokenService, get_token_service
-from models.user import User
+from models.user import User, Role
 
 
 class JWTBearer(HTTPBearer):
@@ -24,6 +26,8 @@ class JWTBearer(HTTPBearer):
 
 security_jwt = JWTBearer()
 
+_ADMIN_ROLES = {Role.ADMIN, Role.SUPERUSER}
+
 
 class PaginationParams(BaseModel):
     limit: int
@@ -38,6 +42,24 @@ def get_pagination_params(
     return PaginationParams(limit=limit, offset=offset)
 
 
+def get_film_filters(
+    genre: List[UUID] = Query(default=[], description='genre ids'),
+    genre_match: Literal['any', 'all'] = Query(default='any', description='whether films need any or all genres'),
+    rating_from: float | None = Query(default=None, ge=0, le=10),
+    rating_to: float | None = Query(default=None, ge=0, le=10),
+    actor: List[UUID] = Query(default=[], description='actor ids'),
+    director: List[UUID] = Query(default=[], description='director ids'),
+) -> FilmFilters:
+    try:
+        return FilmFilters(
+            genre_ids=genre, genres_match=genre_match, rating_from=rating_from, rating_to=rating_to,
+            actor_ids=actor, director_ids=director,
+        )
+    except ValidationError as e:
+        errors = e.errors(include_url=False, include_context=False, include_input=False)
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=errors)
+
+
 def get_authenticated_user(
     token: Annotated[str, Depends(security_jwt)],
     token_service: Annotated[TokenService, Depends(get_token_service)]
@@ -46,3 +68,9 @@ def get_authenticated_user(
     if not user:
         raise HTTPException(status_code=HTTPStatus.UNAUTHORIZED, detail='Invalid token')
     return user
+
+
+def get_admin_user(user: Annotated[User, Depends(get_authenticated_user)]) -> User:
+    if not set(user.roles) & _ADMIN_ROLES:
+        raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='Admin role required')
+    return user
@@ -0,0 +1,42 @@
+from contextlib import aclosing
+from http import HTTPStatus
+from typing import AsyncIterator, List
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from services.export import ExportFieldsError, ExportService, ExportServiceError
+
+_NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+
+async def export_response(
+    request: Request, export_service: ExportService, fields: List[str], after: str | None
+) -> StreamingResponse:
+    """Stream an export, compressed with gzip if the client accepts it."""
+    compress = _accepts_gzip(request.headers.get('accept-encoding', ''))
+    chunks = export_service.export(fields, after, compress)
+    # Failures before anything is sent still get a status, later ones cut the response short
+    try:
+        first = await anext(chunks, b'')
+    except ExportFieldsError as e:
+        raise HTTPException(status_code=HTTPStatus.UNPROCESSABLE_ENTITY, detail=str(e))
+    except ExportServiceError:
+        raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+    headers = {'Vary': 'Accept-Encoding', **({'Content-Encoding': 'gzip'} if compress else {})}
+    return StreamingResponse(_chain(first, chunks), media_type=_NDJSON_MEDIA_TYPE, headers=headers)
+
+
+async def _chain(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    async with aclosing(rest):
+        yield first
+        async for chunk in rest:
+            yield chunk
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    for coding in accept_encoding.split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() == 'gzip':
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
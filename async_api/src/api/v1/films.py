@@ -2,34 +2,40 @@ from http import HTTPStatus
 from uuid import UUID
 from typing import List, Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
+from fastapi.responses import StreamingResponse
 
-from services.film import FilmService, get_film_service, FilmServiceError
+from services.film import FilmService, get_film_service, FilmQueryError, FilmServiceError
+from services.export import ExportService, get_film_export_service
 from services.user import UserService, get_user_service
 from models.user import User
 from api.v1.schemas import Film, FilmDetailed
-from api.v1.dependencies import get_authenticated_user, get_pagination_params, PaginationParams
+from api.v1.dependencies import get_authenticated_user, get_film_filters, get_pagination_params, PaginationParams
+from api.v1.export import export_response
+from db.data_storage import FilmFilters
 
 router = APIRouter()
 
 
 _SUBSCRIPTION_RATING_THRESHOLD = 8.0
+# Cached films are stored response-shaped and sent without re-serialization
+_JSON_MEDIA_TYPE = 'application/json'
 
 
 @router.get('/', response_model=List[Film], response_model_by_alias=False)
 async def films(
-    genre: Annotated[UUID | None, Query(description='genre id')] = None,
+    filters: FilmFilters = Depends(get_film_filters),
     pagination_params: PaginationParams = Depends(get_pagination_params),
     film_service: FilmService = Depends(get_film_service)
-) -> List[Film]:
+) -> Response:
     """
-    Get list with all films
+    Get list with all films, optionally filtered by genres, rating, actors and directors
     """
     try:
-        films = await film_service.get_films(genre, pagination_params.limit, pagination_params.offset)
+        films = await film_service.get_films(filters, pagination_params.limit, pagination_params.offset)
     except FilmServiceError:
         raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
-    return [Film.from_orm(f) for f in films]
+    return Response(content=films, media_type=_JSON_MEDIA_TYPE)
 
 
 @router.get('/search', response_model=List[Film], response_model_by_alias=False)
@@ -43,27 +49,66 @@ async def search(
     """
     try:
         films = await film_service.get_films_by_query(query, pagination_params.limit, pagination_params.offset)
+    except FilmQueryError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
     except FilmServiceError:
         raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
     return [Film.from_orm(f) for f in films]
 
 
+@router.get('/export', response_class=StreamingResponse)
+async def export_films(
+    request: Request,
+    user: Annotated[User, Depends(get_authenticated_user)],
+    user_service: Annotated[UserService, Depends(get_user_service)],
+    export_service: Annotated[ExportService, Depends(get_film_export_service)],
+    fields: Annotated[List[str], Query(description='fields to export, all by default')] = [],
+    after: Annotated[str | None, Query(description='id of the last exported film, to resume an export')] = None,
+) -> StreamingResponse:
+    """
+    Stream all films as NDJSON in id order, compressed with gzip if the client accepts it
+    """
+    # The export includes films above the subscription threshold, so it is for subscribers only
+    if not await user_service.is_subscriber(user):
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN, detail='film export is not available without subscription'
+        )
+    return await export_response(request, export_service, fields, after)
+
+
 @router.get('/{film_id}', response_model=FilmDetailed, response_model_by_alias=False)
 async def film_details(
     film_id: Annotated[UUID, Path(description='film id')],
     user: Annotated[User, Depends(get_authenticated_user)],
     film_service: Annotated[FilmService, Depends(get_film_service)],
     user_service: Annotated[UserService, Depends(get_user_service)]
-) -> FilmDetailed:
+) -> Response:
     """
     Get film by id
     """
     try:
-        film = await film_service.get_film_by_id(film_id)
+        film = await film_service.get_raw_film(film_id)
     except FilmServiceError:
         raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
     if not film:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
-    if film.imdb_rating > _SUBSCRIPTION_RATING_THRESHOLD and not await user_service.is_subscriber(user):
+    if film.access.imdb_rating > _SUBSCRIPTION_RATING_THRESHOLD and not await user_service.is_subscriber(user):
         raise HTTPException(status_code=HTTPStatus.FORBIDDEN, detail='film is not available without subscription')
-    return FilmDetailed.from_orm(film)
+    return Response(content=film.content, media_type=_JSON_MEDIA_TYPE)
+
+
+@router.get('/{film_id}/similar', response_model=List[Film], response_model_by_alias=False)
+async def similar_films(
+    film_id: Annotated[UUID, Path(description='film id')],
+    film_service: FilmService = Depends(get_film_service)
+) -> Response:
+    """
+    Get films similar to a film by genres and persons, most similar first
+    """
+    try:
+        films = await film_service.get_similar_films(film_id)
+    except FilmServiceError:
+        raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+    if films is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='film not found')
+    return Response(content=films, media_type=_JSON_MEDIA_TYPE)
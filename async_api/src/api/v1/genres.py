@@ -5,11 +5,23 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, Path
 
 from services.genre import GenreService, get_genre_service
-from api.v1.schemas import Genre
+from api.v1.schemas import Genre, GenreStats
 
 router = APIRouter()
 
 
+# Declared before /{genre_id}, which would match it first
+@router.get('/stats', response_model=List[GenreStats], response_model_by_alias=False)
+async def genre_stats(genre_service: GenreService = Depends(get_genre_service)) -> List[GenreStats]:
+    """
+    Get all genres with the number of films of each
+    """
+    genres = await genre_service.get_genre_stats()
+    if not genres:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='genres not found')
+    return [GenreStats(id=g.id, name=g.name, films_count=g.films_count) for g in genres]
+
+
 @router.get('/{genre_id}', response_model=Genre, response_model_by_alias=False)
 async def genre_details(
     genre_id: Annotated[UUID, Path(description='genre id')],
@@ -0,0 +1,89 @@
+from http import HTTPStatus
+from typing import Annotated, Dict, List
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+from pydantic import BaseModel
+from redis import RedisError
+from redis.asyncio import Redis
+
+from db.hot_keys import FILMS, PAGES, PERSONS, HotKeys, aggregated_top, get_hot_keys
+from db.prefix_cache import PrefixCache, get_suggest_cache
+from db.redis import get_redis
+from db.refresh_ahead import RefreshAhead, get_refresh_ahead
+from services.warmup import CacheWarmer, WarmupProgress, get_cache_warmer
+
+router = APIRouter()
+
+_METRICS_HOT_KEYS = 20
+# The metrics are public, searches are user input and are only listed to administrators
+_METRICS_HOT_KEY_CATEGORIES = (FILMS, PERSONS, PAGES)
+
+
+class Readiness(BaseModel):
+    ready: bool
+    warmup: WarmupProgress | None = None
+
+
+@router.get('/live')
+async def live() -> Dict[str, str]:
+    """
+    Check that the worker is running
+    """
+    return {'status': 'ok'}
+
+
+@router.get('/ready', response_model=Readiness, responses={HTTPStatus.SERVICE_UNAVAILABLE: {'model': Readiness}})
+async def ready(cache_warmer: Annotated[CacheWarmer | None, Depends(get_cache_warmer)]) -> ORJSONResponse:
+    """
+    Check that the worker has warmed the cache up enough to take traffic
+    """
+    if cache_warmer is None:
+        return ORJSONResponse(Readiness(ready=True).model_dump())
+    is_ready = cache_warmer.is_ready()
+    return ORJSONResponse(
+        Readiness(ready=is_ready, warmup=cache_warmer.progress).model_dump(),
+        status_code=HTTPStatus.OK if is_ready else HTTPStatus.SERVICE_UNAVAILABLE,
+    )
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def metrics(
+    redis: Annotated[Redis, Depends(get_redis)],
+    hot_keys: Annotated[HotKeys | None, Depends(get_hot_keys)],
+    refresh_ahead: Annotated[RefreshAhead | None, Depends(get_refresh_ahead)],
+    suggest_cache: Annotated[PrefixCache | None, Depends(get_suggest_cache)],
+) -> str:
+    """
+    Get cache metrics in Prometheus text format
+    """
+    lines: List[str] = []
+    if refresh_ahead is not None:
+        lines += [
+            '# TYPE cache_refresh_ahead_refreshed_total counter',
+            f'cache_refresh_ahead_refreshed_total {refresh_ahead.refreshed}',
+            '# TYPE cache_refresh_ahead_hot_keys gauge',
+            f'cache_refresh_ahead_hot_keys {len(refresh_ahead.hot_keys())}',
+        ]
+    if suggest_cache is not None:
+        lines += [
+            '# TYPE suggest_cache_hits_total counter',
+            f'suggest_cache_hits_total {suggest_cache.hits}',
+            '# TYPE suggest_cache_misses_total counter',
+            f'suggest_cache_misses_total {suggest_cache.misses}',
+            '# TYPE suggest_cache_entries gauge',
+            f'suggest_cache_entries {len(suggest_cache)}',
+        ]
+    if hot_keys is not None:
+        lines.append('# TYPE hot_key_requests gauge')
+        for category in _METRICS_HOT_KEY_CATEGORIES:
+            try:
+                top = await aggregated_top(redis, category, _METRICS_HOT_KEYS)
+            except RedisError:
+                break
+            lines += [f'hot_key_requests{{category="{category}",key="{_label(h.key)}"}} {h.count}' for h in top]
+    return '\n'.join(lines) + '\n'
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
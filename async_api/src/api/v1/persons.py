@@ -2,11 +2,15 @@ from http import HTTPStatus
 from typing import List, Annotated
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, Request, Response
+from fastapi.responses import StreamingResponse
 
-from services.person import PersonService, get_person_service
+from services.export import ExportService, get_person_export_service
+from services.person import PersonQueryError, PersonService, get_person_service
+from models.user import User
 from api.v1.schemas import Film, PersonWithFilms
-from api.v1.dependencies import get_pagination_params, PaginationParams
+from api.v1.dependencies import get_authenticated_user, get_pagination_params, PaginationParams
+from api.v1.export import export_response
 
 router = APIRouter()
 
@@ -20,35 +24,52 @@ async def person_search(
     """
     Search by name of person
     """
-    persons = await person_service.search(query, pagination_params.limit, pagination_params.offset)
+    try:
+        persons = await person_service.search(query, pagination_params.limit, pagination_params.offset)
+    except PersonQueryError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
     if not persons:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='persons not found')
     return [PersonWithFilms(id=p.id, name=p.name, films=p.films) for p in persons]
 
 
+@router.get('/export', response_class=StreamingResponse)
+async def export_persons(
+    request: Request,
+    _: Annotated[User, Depends(get_authenticated_user)],
+    export_service: Annotated[ExportService, Depends(get_person_export_service)],
+    fields: Annotated[List[str], Query(description='fields to export, all by default')] = [],
+    after: Annotated[str | None, Query(description='id of the last exported person, to resume an export')] = None,
+) -> StreamingResponse:
+    """
+    Stream all persons as NDJSON in id order, compressed with gzip if the client accepts it
+    """
+    return await export_response(request, export_service, fields, after)
+
+
 @router.get('/{person_id}/film', response_model=List[Film], response_model_by_alias=False)
 async def person_films(
     person_id: Annotated[UUID, Path(description='person id')],
     person_service: PersonService = Depends(get_person_service)
-) -> List[Film]:
+) -> Response:
     """
-    Get list with all films with such person
+    Get list with all films with such person, sorted by rating
     """
-    films = await person_service.get_films(person_id)
+    films = await person_service.get_raw_films(person_id)
     if not films:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='films not found')
-    return [Film(id=f.id, title=f.title, imdb_rating=f.imdb_rating) for f in films]
+    return Response(content=films, media_type='application/json')
 
 
 @router.get('/{person_id}', response_model=PersonWithFilms, response_model_by_alias=False)
 async def person_details(
     person_id: Annotated[UUID, Path(description='person id')],
     person_service: PersonService = Depends(get_person_service)
-) -> PersonWithFilms:
+) -> Response:
     """
     Get person by id
     """
-    person = await person_service.get_by_id(person_id)
+    person = await person_service.get_raw_person(person_id)
     if not person:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='person not found')
-    return PersonWithFilms(id=person.id, name=person.name, films=person.films)
+    return Response(content=person, media_type='application/json')
@@ -20,6 +20,10 @@ class Genre(BaseModel):
     name: str
 
 
+class GenreStats(Genre):
+    films_count: int
+
+
 class Person(BaseModel):
     full_name: str = Field(alias='name')
 
@@ -40,3 +44,17 @@ class PersonFilm(BaseModel):
 
 class PersonWithFilms(Person):
     films: List[PersonFilm]
+
+
+class FilmSuggestion(BaseModel):
+    title: str
+    imdb_rating: float | None = None
+
+
+class PersonSuggestion(BaseModel):
+    full_name: str
+
+
+class Suggestions(PydanticBaseModel):
+    films: List[FilmSuggestion]
+    persons: List[PersonSuggestion]
@@ -0,0 +1,25 @@
+from http import HTTPStatus
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+
+from services.suggest import SuggestService, SuggestServiceError, get_suggest_service
+from api.v1.schemas import Suggestions
+
+router = APIRouter()
+
+
+@router.get('', response_model=Suggestions, response_model_by_alias=False)
+async def suggest(
+    query: Annotated[str, Query(description='text typed into the search box so far', max_length=100)],
+    limit: Annotated[int, Query(ge=1, le=20)] = 10,
+    suggest_service: SuggestService = Depends(get_suggest_service)
+) -> Response:
+    """
+    Suggest films and persons while the search query is typed
+    """
+    try:
+        suggestions = await suggest_service.get_suggestions(query, limit)
+    except SuggestServiceError:
+        raise HTTPException(status_code=HTTPStatus.INTERNAL_SERVER_ERROR)
+    return Response(content=suggestions, media_type='application/json')
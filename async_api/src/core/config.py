@@ -1,4 +1,5 @@
 from logging import config as logging_config
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -14,8 +15,13 @@ class Settings(BaseSettings):
     project_name: str = 'movies'
     redis_host: str = '127.0.0.1'
     redis_port: int = 6379
+    redis_db: int = 0
     elastic_host: str = '127.0.0.1'
     elastic_port: int = 9200
+    # Read aliases of the versioned indices, see jobs.indices
+    movies_index: str = 'movies'
+    persons_index: str = 'personas'
+    genres_index: str = 'genres'
 
     service_login: str
     service_password: str
@@ -24,5 +30,86 @@ class Settings(BaseSettings):
     auth_service_port: int = 80
     jwt_public_key: bytes
 
+    # Off by default: a profiled request slows down every request the worker serves meanwhile
+    profiling_enabled: bool = False
+    profiling_secret: str | None = None
+    profiling_max_seconds: int = 60
+    profiling_sampling_interval: float = 0.001
+
+    es_slow_query_threshold_ms: float = 200
+    es_slow_query_log_size: int = 100
+    es_profile_sample_rate: float = 0.0
+
+    cache_compression_enabled: bool = True
+    cache_compression_threshold: int = 256
+    cache_compression_level: int = 3
+
+    warmup_enabled: bool = True
+    warmup_concurrency: int = 8
+    warmup_list_pages: int = 3
+    warmup_top_films: int = 100
+    warmup_top_films_per_genre: int = 20
+    warmup_persons: int = 200
+    # Share of warm-up tasks to succeed before the worker reports ready
+    warmup_ready_threshold: float = 0.9
+    # Pause before warming up again when a warm-up left the worker unready
+    warmup_retry_seconds: float = 30
+
+    refresh_ahead_enabled: bool = True
+    # Accesses within a window a key needs to be refreshed ahead of expiry
+    refresh_ahead_min_hits: int = 5
+    refresh_ahead_window_seconds: float = 60
+    refresh_ahead_before_seconds: float = 30
+    # Refreshes per second and worker
+    refresh_ahead_rate: float = 20
+    refresh_ahead_max_keys: int = 10000
+
+    hot_keys_enabled: bool = True
+    # Keys tracked per category and worker
+    hot_keys_top_k: int = 100
+    hot_keys_window_seconds: float = 3600
+    hot_keys_flush_interval_seconds: float = 10
+    hot_keys_sketch_width: int = 2048
+    hot_keys_sketch_depth: int = 4
+
+    id_filter_enabled: bool = True
+    id_filter_error_rate: float = 0.001
+    # Filters are rebuilt on releases, and this often for documents written without one
+    id_filter_refresh_seconds: float = 600
+    # Shared by the workers of a host, one of them builds the filters and the others map them
+    id_filter_path: str = '/tmp/id_filters'
+
+    # Full-text queries expand to a clause per word and searched field
+    search_max_clauses: int = 100
+
+    suggest_cache_enabled: bool = True
+    # Responses kept per worker
+    suggest_cache_size: int = 10000
+    suggest_cache_ttl_seconds: float = 60
+
+    # Documents read per page of a catalog export
+    export_batch_size: int = 1000
+
+    # Off by default: the snapshot serves documents written without a release only once it is rebuilt
+    catalog_snapshot_enabled: bool = False
+    # Shared by the workers of a host, written by jobs.catalog_snapshot
+    catalog_snapshot_path: str = '/tmp/catalog.snapshot'
+    catalog_snapshot_refresh_seconds: float = 10
+    # Documents written without a release only reach the snapshot when it is rebuilt, the watching job rebuilds
+    # it this often, and workers stop using a snapshot older than the max age, which is no more than the cache TTL
+    catalog_snapshot_rebuild_seconds: float = 120
+    catalog_snapshot_max_age_seconds: float = 300
+
+    # Storage the services read: Elasticsearch, or the embedded catalog for development and benchmarks
+    data_storage_backend: Literal['elastic', 'embedded'] = 'elastic'
+    # Read the embedded catalog while Elasticsearch is unavailable. Every worker then holds the whole catalog in
+    # memory, so it is opt-in
+    data_storage_failover: bool = False
+    # How long to read the embedded catalog after Elasticsearch failed before trying it again
+    data_storage_failover_seconds: float = 30
+    # Directory of Elasticsearch dumps or a catalog snapshot file, the catalog snapshot if not set
+    embedded_catalog_path: str | None = None
+    embedded_catalog_refresh_seconds: float = 60
+
 
 settings = Settings()
@@ -0,0 +1,244 @@
+import asyncio
+import cProfile
+import hmac
+import logging
+import marshal
+import sys
+import threading
+from collections import Counter
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List, MutableMapping, Tuple
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+PROFILE_HEADER = b'x-profile'
+PROFILE_MODE_HEADER = b'x-profile-mode'
+
+
+class ProfilerBusyError(Exception):
+    pass
+
+
+class ProfileMode(str, Enum):
+    DETERMINISTIC = 'deterministic'
+    SAMPLING = 'sampling'
+
+
+class _DeterministicCollector:
+    media_type = 'application/octet-stream'
+    extension = 'pstats'
+
+    def __init__(self) -> None:
+        self._profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self._profile.enable()
+
+    def stop(self) -> None:
+        self._profile.disable()
+
+    def dump(self) -> bytes:
+        # Same format as cProfile.Profile.dump_stats, loadable with pstats.Stats(path)
+        self._profile.create_stats()
+        return marshal.dumps(self._profile.stats)
+
+
+class _SamplingCollector:
+    media_type = 'text/plain'
+    extension = 'collapsed'
+
+    def __init__(self, interval: float) -> None:
+        self._interval = interval
+        self._thread_id = threading.get_ident()
+        self._stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='profiler-sampler', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def dump(self) -> bytes:
+        # Collapsed stacks, as consumed by flamegraph.pl and speedscope
+        return ''.join(f'{stack} {count}\n' for stack, count in self._stacks.most_common()).encode()
+
+    def _sample(self) -> None:
+        while not self._stopped.wait(self._interval):
+            frame = sys._current_frames().get(self._thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if frames:
+                self._stacks[';'.join(reversed(frames))] += 1
+
+
+class ProfilingSession:
+    def __init__(self, mode: ProfileMode, sampling_interval: float, max_requests: int | None = None) -> None:
+        self.mode = mode
+        self.requests = 0
+        self._max_requests = max_requests
+        self._done = asyncio.Event()
+        if mode == ProfileMode.SAMPLING:
+            self._collector = _SamplingCollector(sampling_interval)
+        else:
+            self._collector = _DeterministicCollector()
+
+    @property
+    def media_type(self) -> str:
+        return self._collector.media_type
+
+    @property
+    def extension(self) -> str:
+        return self._collector.extension
+
+    def start(self) -> None:
+        self._collector.start()
+
+    def stop(self) -> None:
+        self._collector.stop()
+
+    def dump(self) -> bytes:
+        return self._collector.dump()
+
+    def request_finished(self) -> None:
+        self.requests += 1
+        if self._max_requests and self.requests >= self._max_requests:
+            self._done.set()
+
+    async def wait(self, seconds: float) -> None:
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+class Profiler:
+    """Profiles the current worker on demand; only one session may run at a time."""
+
+    def __init__(self, sampling_interval: float = 0.001) -> None:
+        self.sampling_interval = sampling_interval
+        self._session: ProfilingSession | None = None
+
+    @property
+    def active(self) -> bool:
+        return self._session is not None
+
+    async def profile(self, mode: ProfileMode, seconds: float, requests: int | None = None) -> ProfilingSession:
+        session = self.start(mode, requests)
+        logger.info('Profiling worker in %s mode for %s seconds, %s requests', mode.value, seconds, requests)
+        try:
+            await session.wait(seconds)
+        finally:
+            self.stop()
+        return session
+
+    def request_finished(self) -> None:
+        if self._session:
+            self._session.request_finished()
+
+    def start(self, mode: ProfileMode, requests: int | None = None) -> ProfilingSession:
+        if self._session:
+            raise ProfilerBusyError
+        self._session = ProfilingSession(mode, self.sampling_interval, requests)
+        self._session.start()
+        return self._session
+
+    def stop(self) -> None:
+        self._session.stop()
+        self._session = None
+
+
+class ProfilingMiddleware:
+    """
+    Counts requests for an active profiling session and profiles single requests carrying
+    the `X-Profile: <secret>` header, replacing their response with the profile.
+
+    The profiler sees the whole event loop, not just the request: other requests and background tasks
+    the worker runs meanwhile are in the profile too, and deterministic mode slows all of them down.
+    """
+
+    def __init__(self, app: ASGIApp, profiler: Profiler, secret: str | None = None) -> None:
+        self._app = app
+        self._profiler = profiler
+        self._secret = secret.encode() if secret else None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self._app(scope, receive, send)
+            return
+        if self._secret:
+            mode = self._requested_mode(scope['headers'])
+            if mode:
+                await self._profile_request(mode, scope, receive, send)
+                return
+        if not self._profiler.active:
+            await self._app(scope, receive, send)
+            return
+        try:
+            await self._app(scope, receive, send)
+        finally:
+            self._profiler.request_finished()
+
+    def _requested_mode(self, headers: List[Tuple[bytes, bytes]]) -> ProfileMode | None:
+        secret, mode = None, ProfileMode.DETERMINISTIC.value
+        for name, value in headers:
+            if name == PROFILE_HEADER:
+                secret = value
+            elif name == PROFILE_MODE_HEADER:
+                mode = value.decode('latin-1')
+        if secret is None or not hmac.compare_digest(secret, self._secret):
+            return None
+        try:
+            return ProfileMode(mode)
+        except ValueError:
+            return ProfileMode.DETERMINISTIC
+
+    async def _profile_request(self, mode: ProfileMode, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            session = self._profiler.start(mode)
+        except ProfilerBusyError:
+            await self._app(scope, receive, send)
+            return
+
+        status: Dict[str, int] = {}
+
+        async def discard(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+
+        try:
+            await self._app(scope, receive, discard)
+        finally:
+            self._profiler.stop()
+
+        body = session.dump()
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', session.media_type.encode()),
+                (b'content-length', str(len(body)).encode()),
+                (b'x-profiled-status', str(status.get('code', 0)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+profiler = Profiler(settings.profiling_sampling_interval)
+
+
+def get_profiler() -> Profiler:
+    return profiler
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+from pydantic import BaseModel
+from redis import RedisError
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+GENERATIONS_KEY = 'cache:generations'
+GENERATIONS_CHANNEL = 'cache:generations'
+_RESERVED_GENERATIONS_KEY = 'cache:generations:reserved'
+_RESUBSCRIBE_DELAY_SECONDS = 1
+
+Listener = Callable[[str, int], Awaitable[None]]
+
+
+class CacheGeneration(BaseModel):
+    index: str
+    generation: int
+
+
+class CacheGenerations:
+    """
+    Per-index cache generations.
+
+    Cache keys of an index embed its generation, so bumping the generation in Redis invalidates all entries
+    of the index at once, old entries just expire. Workers keep a snapshot of the generations which is updated
+    through pub/sub. Generation 0 keeps the key layout used before generations were introduced.
+    """
+
+    def __init__(self, generations: Dict[str, int] | None = None) -> None:
+        self._generations = dict(generations or {})
+        self._listeners: List[Listener] = []
+
+    def get(self, index: str) -> int:
+        return self._generations.get(index, 0)
+
+    def all(self) -> Dict[str, int]:
+        return dict(self._generations)
+
+    def key(self, index: str, key: str) -> str:
+        generation = self.get(index)
+        return f'g{generation}:{key}' if generation else key
+
+    def pinned(self, generations: Dict[str, int]) -> 'CacheGenerations':
+        """Copy of the generations with the given indices switched, used to fill namespaces before activating them."""
+        return CacheGenerations({**self._generations, **generations})
+
+    def add_listener(self, listener: Listener) -> None:
+        """Call listener with the index and its new generation whenever a generation changes in this worker."""
+        self._listeners.append(listener)
+
+    async def load(self, redis: Redis) -> None:
+        generations = await redis.hgetall(GENERATIONS_KEY)
+        for index, generation in generations.items():
+            await self._set(index.decode(), int(generation))
+
+    async def bump(
+        self, redis: Redis, index: str, prewarm: Callable[['CacheGenerations'], Awaitable[None]] | None = None
+    ) -> int:
+        """Switch the index to a new generation, optionally filling its namespace before the switch."""
+        generation = await self.reserve(redis, index)
+        if prewarm:
+            logger.info('Prewarming generation %s of %s cache', generation, index)
+            await prewarm(self.pinned({index: generation}))
+        await self.activate(redis, {index: generation})
+        return generation
+
+    async def reserve(self, redis: Redis, index: str) -> int:
+        """A generation of the index newer than any in use or reserved before, to fill before activating it."""
+        generation = await redis.hincrby(_RESERVED_GENERATIONS_KEY, index, 1)
+        current = int(await redis.hget(GENERATIONS_KEY, index) or 0)
+        if generation <= current:
+            generation = current + 1
+            await redis.hset(_RESERVED_GENERATIONS_KEY, index, generation)
+        return generation
+
+    async def activate(self, redis: Redis, generations: Dict[str, int]) -> None:
+        """Switch indices to reserved generations in one transaction, workers see them change together."""
+        async with redis.pipeline(transaction=True) as pipe:
+            for index, generation in generations.items():
+                pipe.hset(GENERATIONS_KEY, index, generation)
+                pipe.publish(GENERATIONS_CHANNEL, f'{index}:{generation}')
+            await pipe.execute()
+        for index, generation in generations.items():
+            logger.info('Switched %s cache to generation %s', index, generation)
+            await self._set(index, generation)
+
+    async def listen(self, redis: Redis) -> None:
+        """Follow generation changes made by other workers until cancelled."""
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(GENERATIONS_CHANNEL)
+                    # Changes made while not subscribed are only visible in the hash
+                    await self.load(redis)
+                    async for message in pubsub.listen():
+                        if message['type'] != 'message':
+                            continue
+                        index, generation = message['data'].decode().rsplit(':', 1)
+                        await self._set(index, int(generation))
+            except RedisError as e:
+                logger.error('Lost cache generations subscription: %s', e)
+                await asyncio.sleep(_RESUBSCRIBE_DELAY_SECONDS)
+
+    async def _set(self, index: str, generation: int) -> None:
+        if self._generations.get(index, 0) == generation:
+            return
+        logger.info('Cache generation of %s is now %s', index, generation)
+        self._generations[index] = generation
+        for listener in self._listeners:
+            try:
+                await listener(index, generation)
+            except Exception:
+                logger.exception('Cache generation listener failed for %s', index)
+
+
+cache_generations = CacheGenerations()
+
+
+def get_cache_generations() -> CacheGenerations:
+    return cache_generations
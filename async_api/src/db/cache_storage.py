@@ -1,11 +1,78 @@
+import logging
+import math
+import time
 from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
 
+import orjson
+import zstandard
+from pydantic import BaseModel
 from redis.asyncio import Redis
 from redis import RedisError
 
 from backoff import backoff
+from core.config import settings
 
 CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 minutes
+NEGATIVE_CACHE_EXPIRE_IN_SECONDS = 30
+
+# Cached for ids missing from storage. Values of real entries are JSON and never empty
+NEGATIVE_ENTRY = b''
+
+# First byte of an encoded entry. Entries written before the codec was introduced are plain JSON text
+# and never start with these bytes, so they are still readable
+_FORMAT_RAW = 0x01
+_FORMAT_ZSTD = 0x02
+
+logger = logging.getLogger(__name__)
+
+
+class CacheCodecError(Exception):
+    pass
+
+
+class CacheCodec:
+    """
+    Turns cache values into compact bytes and back.
+
+    Values are serialized to JSON with orjson (pydantic models with their own serializer), entries larger than
+    the compression threshold are compressed with zstd. Decoding always returns JSON bytes, so they can be
+    parsed or sent in a response as is.
+    """
+
+    def __init__(self, compression_threshold: int | None = 256, compression_level: int = 3) -> None:
+        self.compression_threshold = compression_threshold
+        self._compressor = zstandard.ZstdCompressor(level=compression_level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def encode(self, value: Any) -> bytes:
+        data = self.serialize(value)
+        if self.compression_threshold is not None and len(data) >= self.compression_threshold:
+            return bytes((_FORMAT_ZSTD,)) + self._compressor.compress(data)
+        return bytes((_FORMAT_RAW,)) + data
+
+    def decode(self, data: bytes) -> bytes:
+        if not data:
+            return data
+        entry_format = data[0]
+        if entry_format == _FORMAT_RAW:
+            return data[1:]
+        if entry_format == _FORMAT_ZSTD:
+            try:
+                return self._decompressor.decompress(data[1:])
+            except zstandard.ZstdError as e:
+                raise CacheCodecError(f'Failed to decompress cache entry: {e}') from e
+        return data
+
+    @staticmethod
+    def serialize(value: Any) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        if isinstance(value, str):
+            return value.encode()
+        if isinstance(value, BaseModel):
+            return value.model_dump_json().encode()
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
 
 
 class AbstractCacheStorage(ABC):
@@ -17,15 +84,141 @@ class AbstractCacheStorage(ABC):
     def get(self, key):
         pass
 
+    @abstractmethod
+    async def get_many(self, keys: Sequence[str]) -> List[bytes | None]:
+        """Get values of several keys at once, None for missing ones, in the order of keys."""
+
+    @abstractmethod
+    async def set_many(self, items: Mapping[str, Any], expire_in: int | Mapping[str, int] = CACHE_EXPIRE_IN_SECONDS):
+        """Set several keys at once, expire_in is either common or given per key."""
+
+    @abstractmethod
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        """Delete keys, returning how many of them existed."""
+
+    @abstractmethod
+    async def touch(self, key: str, expire_in: int = CACHE_EXPIRE_IN_SECONDS) -> bool:
+        """Restart expiration of a key, returning whether it exists."""
+
+    @abstractmethod
+    async def ttl_many(self, keys: Sequence[str]) -> List[float | None]:
+        """Get seconds left until keys expire, None for missing ones and infinity for persistent ones."""
+
 
 class RedisCacheStorage(AbstractCacheStorage):
-    def __init__(self, redis: Redis):
+    def __init__(self, redis: Redis, codec: CacheCodec | None = None):
         self.redis = redis
+        self.codec = codec or cache_codec
+
+    @backoff(exceptions=(RedisError,))
+    async def set(self, key: str, value: Any, expire_in: int = CACHE_EXPIRE_IN_SECONDS):
+        await self.redis.set(key, self.codec.encode(value), expire_in)
 
     @backoff(exceptions=(RedisError,))
-    async def set(self, key: str, value: str, expire_in: int = CACHE_EXPIRE_IN_SECONDS):
-        await self.redis.set(key, value, expire_in)
+    async def get(self, key: str) -> bytes | None:
+        return self._decode(key, await self.redis.get(key))
 
     @backoff(exceptions=(RedisError,))
-    async def get(self, key: str):
-        return await self.redis.get(key)
+    async def get_many(self, keys: Sequence[str]) -> List[bytes | None]:
+        if not keys:
+            return []
+        return [self._decode(key, data) for key, data in zip(keys, await self.redis.mget(keys))]
+
+    @backoff(exceptions=(RedisError,))
+    async def set_many(self, items: Mapping[str, Any], expire_in: int | Mapping[str, int] = CACHE_EXPIRE_IN_SECONDS):
+        if not items:
+            return
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key, value in items.items():
+                pipe.set(key, self.codec.encode(value), _expire_in(key, expire_in))
+            await pipe.execute()
+
+    @backoff(exceptions=(RedisError,))
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        if not keys:
+            return 0
+        return await self.redis.delete(*keys)
+
+    @backoff(exceptions=(RedisError,))
+    async def touch(self, key: str, expire_in: int = CACHE_EXPIRE_IN_SECONDS) -> bool:
+        return bool(await self.redis.expire(key, expire_in))
+
+    @backoff(exceptions=(RedisError,))
+    async def ttl_many(self, keys: Sequence[str]) -> List[float | None]:
+        if not keys:
+            return []
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.pttl(key)
+            ttls = await pipe.execute()
+        return [None if ttl == -2 else math.inf if ttl == -1 else ttl / 1000 for ttl in ttls]
+
+    def _decode(self, key: str, data: bytes | None) -> bytes | None:
+        if data is None:
+            return None
+        try:
+            return self.codec.decode(data)
+        except CacheCodecError as e:
+            logger.warning('Ignoring unreadable cache entry %s: %s', key, e)
+            return None
+
+
+class InMemoryCacheStorage(AbstractCacheStorage):
+    """Process local cache storage with the same semantics as RedisCacheStorage, for tests and benchmarks."""
+
+    def __init__(self, codec: CacheCodec | None = None):
+        self.codec = codec or cache_codec
+        self._entries: Dict[str, Tuple[bytes, float]] = {}
+
+    async def set(self, key: str, value: Any, expire_in: int = CACHE_EXPIRE_IN_SECONDS):
+        self._entries[key] = (self.codec.encode(value), time.monotonic() + expire_in)
+
+    async def get(self, key: str) -> bytes | None:
+        data = self._get_alive(key)
+        return self.codec.decode(data) if data is not None else None
+
+    async def get_many(self, keys: Sequence[str]) -> List[bytes | None]:
+        return [await self.get(key) for key in keys]
+
+    async def set_many(self, items: Mapping[str, Any], expire_in: int | Mapping[str, int] = CACHE_EXPIRE_IN_SECONDS):
+        for key, value in items.items():
+            await self.set(key, value, _expire_in(key, expire_in))
+
+    async def delete_many(self, keys: Sequence[str]) -> int:
+        deleted = 0
+        for key in keys:
+            if self._get_alive(key) is not None:
+                del self._entries[key]
+                deleted += 1
+        return deleted
+
+    async def touch(self, key: str, expire_in: int = CACHE_EXPIRE_IN_SECONDS) -> bool:
+        data = self._get_alive(key)
+        if data is None:
+            return False
+        self._entries[key] = (data, time.monotonic() + expire_in)
+        return True
+
+    async def ttl_many(self, keys: Sequence[str]) -> List[float | None]:
+        now = time.monotonic()
+        return [self._entries[key][1] - now if self._get_alive(key) is not None else None for key in keys]
+
+    def _get_alive(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        return data
+
+
+def _expire_in(key: str, expire_in: int | Mapping[str, int]) -> int:
+    return expire_in if isinstance(expire_in, int) else expire_in.get(key, CACHE_EXPIRE_IN_SECONDS)
+
+
+cache_codec = CacheCodec(
+    compression_threshold=settings.cache_compression_threshold if settings.cache_compression_enabled else None,
+    compression_level=settings.cache_compression_level,
+)
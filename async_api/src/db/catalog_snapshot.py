@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+import orjson
+
+from core.config import settings
+from db.cache_generations import CacheGenerations, cache_generations
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b'PXSNAP01'
+# Magic and the length of the JSON header that follows it
+_PREAMBLE = struct.Struct('<8sQ')
+_ALIGNMENT = 8
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class SnapshotFilm(NamedTuple):
+    id: str
+    # Response-shaped JSON of the film and of the film in a list
+    details: bytes
+    summary: bytes
+    # Films without a rating are not listed
+    rating: float | None
+    genre_ids: Sequence[str]
+
+
+class SnapshotDocument(NamedTuple):
+    id: str
+    details: bytes
+    # Response-shaped JSON of the films of a person, empty if there are none
+    films: bytes = b''
+
+
+class _Column:
+    """Byte strings stored back to back, the i-th one between offsets i and i + 1."""
+
+    def __init__(self, buffer: mmap.mmap, offsets: np.ndarray, start: int) -> None:
+        self._buffer = buffer
+        self._offsets = offsets
+        self._start = start
+
+    def __getitem__(self, row: int) -> bytes:
+        return self._buffer[self._start + int(self._offsets[row]):self._start + int(self._offsets[row + 1])]
+
+
+class _Table:
+    """Rows sorted by id, found by a binary search over the first 8 bytes of the ids."""
+
+    def __init__(self, keys: np.ndarray, ids: np.ndarray) -> None:
+        self._keys = keys
+        self._ids = ids
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def row(self, id: UUID | str) -> int | None:
+        try:
+            raw = id.bytes if isinstance(id, UUID) else UUID(id).bytes
+        except ValueError:
+            return None
+        key = int.from_bytes(raw[:8], 'big')
+        row = int(np.searchsorted(self._keys, key))
+        while row < len(self._keys) and self._keys[row] == key:
+            if self._ids[row].tobytes() == raw:
+                return row
+            row += 1
+        return None
+
+
+class CatalogSnapshot:
+    """
+    Read-only catalog in a memory-mapped file: response-shaped films, persons and genres by id, and films
+    by rating, overall and per genre.
+
+    Workers of a host map the same file, so the catalog takes memory once per host rather than once per worker
+    and stays in the page cache between restarts. Index arrays are used in place, nothing is parsed when the
+    file is opened. Films, persons and genres are as they were when the snapshot was built, it is only used
+    while the cache generations of their indices stay the same.
+    """
+
+    def __init__(self, path: Path) -> None:
+        with open(path, 'rb') as f:
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._buffer) < _PREAMBLE.size:
+            raise SnapshotError(f'{path} is not a catalog snapshot')
+        magic, header_size = _PREAMBLE.unpack_from(self._buffer)
+        if magic != _MAGIC:
+            raise SnapshotError(f'{path} is not a catalog snapshot')
+        header = orjson.loads(self._buffer[_PREAMBLE.size:_PREAMBLE.size + header_size])
+        self.generations: Dict[str, int] = header['generations']
+        self.built_at: float = header['built_at']
+        self._sections: Dict[str, Tuple[int, str, int]] = header['sections']
+
+        self._films = self._table('films')
+        self._film_details = self._column('films.details')
+        self._film_summaries = self._column('films.summaries')
+        self._films_by_rating = self._array('films.by_rating')
+        self._persons = self._table('persons')
+        self._person_details = self._column('persons.details')
+        self._person_films = self._column('persons.films')
+        self._genres = self._table('genres')
+        self._genre_details = self._column('genres.details')
+        self._genre_films = self._array('genres.films')
+        self._genre_films_offsets = self._array('genres.films.offsets')
+        self._all_genres = self._bytes('genres.all')
+
+    def film(self, film_id: UUID | str) -> bytes | None:
+        row = self._films.row(film_id)
+        return self._film_details[row] if row is not None else None
+
+    def films_page(self, genre_id: UUID | str | None, limit: int, offset: int) -> bytes | None:
+        """
+        Response-shaped JSON list of films with the best rating, of a genre if given, None for unknown genres
+        and if the snapshot has no films to list.
+        """
+        if not len(self._films_by_rating):
+            return None
+        if genre_id is None:
+            rows = self._films_by_rating
+        else:
+            genre = self._genres.row(genre_id)
+            if genre is None:
+                return None
+            rows = self._genre_films[self._genre_films_offsets[genre]:self._genre_films_offsets[genre + 1]]
+        return b'[' + b','.join(self._film_summaries[row] for row in rows[offset:offset + limit]) + b']'
+
+    def person(self, person_id: UUID | str) -> bytes | None:
+        row = self._persons.row(person_id)
+        return self._person_details[row] if row is not None else None
+
+    def person_films(self, person_id: UUID | str) -> bytes | None:
+        """Response-shaped JSON list of films of a person, None if there are none or the person is unknown."""
+        row = self._persons.row(person_id)
+        return (self._person_films[row] or None) if row is not None else None
+
+    def genre(self, genre_id: UUID | str) -> bytes | None:
+        row = self._genres.row(genre_id)
+        return self._genre_details[row] if row is not None else None
+
+    def genres(self) -> bytes:
+        return self._all_genres
+
+    def documents(self, table: str) -> Iterator[bytes]:
+        """Response-shaped JSON of every film, person or genre in id order."""
+        column = {'films': self._film_details, 'persons': self._person_details, 'genres': self._genre_details}[table]
+        for row in range(self.counts()[table]):
+            yield column[row]
+
+    def counts(self) -> Dict[str, int]:
+        return {'films': len(self._films), 'persons': len(self._persons), 'genres': len(self._genres)}
+
+    def _array(self, name: str) -> np.ndarray:
+        offset, dtype, count = self._sections[name]
+        return np.frombuffer(self._buffer, dtype=dtype, count=count, offset=offset)
+
+    def _bytes(self, name: str) -> bytes:
+        offset, _, count = self._sections[name]
+        return self._buffer[offset:offset + count]
+
+    def _table(self, name: str) -> _Table:
+        return _Table(self._array(f'{name}.keys'), self._array(f'{name}.ids').reshape(-1, 16))
+
+    def _column(self, name: str) -> _Column:
+        return _Column(self._buffer, self._array(f'{name}.offsets'), self._sections[f'{name}.blob'][0])
+
+
+def write_snapshot(
+    path: Path,
+    generations: Dict[str, int],
+    films: Iterable[SnapshotFilm],
+    persons: Iterable[SnapshotDocument],
+    genres: Iterable[SnapshotDocument],
+    all_genres: bytes,
+) -> None:
+    """
+    Write a snapshot next to the path and rename it over the path, so readers see either file as a whole.
+
+    Workers that mapped the previous file keep reading it until they switch.
+    """
+    films, persons, genres = _by_id(films), _by_id(persons), _by_id(genres)
+    sections: Dict[str, np.ndarray] = {}
+    film_rows = {film.id: row for row, film in enumerate(films)}
+    # Rows are in id order, so rating ties go by id as in Elasticsearch listings
+    rated = sorted(
+        (film for film in films if film.rating is not None), key=lambda film: (-film.rating, film_rows[film.id]))
+    genre_films: Dict[str, List[int]] = {genre.id: [] for genre in genres}
+    for film in rated:
+        for genre_id in dict.fromkeys(film.genre_ids):
+            if genre_id in genre_films:
+                genre_films[genre_id].append(film_rows[film.id])
+
+    _add_table(sections, 'films', [film.id for film in films])
+    _add_column(sections, 'films.details', [film.details for film in films])
+    _add_column(sections, 'films.summaries', [film.summary for film in films])
+    sections['films.by_rating'] = np.array([film_rows[film.id] for film in rated], dtype='<u4')
+    _add_table(sections, 'persons', [person.id for person in persons])
+    _add_column(sections, 'persons.details', [person.details for person in persons])
+    _add_column(sections, 'persons.films', [person.films for person in persons])
+    _add_table(sections, 'genres', [genre.id for genre in genres])
+    _add_column(sections, 'genres.details', [genre.details for genre in genres])
+    sections['genres.films'] = np.array([row for rows in genre_films.values() for row in rows], dtype='<u4')
+    sections['genres.films.offsets'] = _offsets([len(rows) for rows in genre_films.values()])
+    sections['genres.all'] = np.frombuffer(all_genres, dtype='u1')
+
+    # Offsets depend on the header size, which depends on the offsets, so the header gets room to spare
+    layout, header = {}, b''
+    for _ in range(2):
+        offset = _align(_PREAMBLE.size + len(header) + 64)
+        for name, array in sections.items():
+            layout[name] = (offset, array.dtype.str, len(array))
+            offset = _align(offset + array.nbytes)
+        header = orjson.dumps({'generations': generations, 'built_at': time.time(), 'sections': layout})
+
+    temporary = path.with_name(f'.{path.name}.{os.getpid()}')
+    try:
+        with open(temporary, 'wb') as f:
+            f.write(_PREAMBLE.pack(_MAGIC, len(header)))
+            f.write(header)
+            for name, array in sections.items():
+                f.seek(layout[name][0])
+                f.write(array.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    finally:
+        temporary.unlink(missing_ok=True)
+    logger.info('Wrote catalog snapshot of %s films, %s persons and %s genres to %s',
+                len(films), len(persons), len(genres), path)
+
+
+class CatalogSnapshotFile:
+    """
+    The snapshot at a path, mapped again whenever the file is replaced.
+
+    Every worker checks the file every refresh interval. A snapshot is handed out for indices only while
+    they are in the cache generations the snapshot was built in, so data released after the snapshot is
+    read from the caches and storage until the snapshot is built again. Documents written without a release
+    don't change generations, a snapshot older than max_age isn't handed out either.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        generations: CacheGenerations = cache_generations,
+        refresh_interval: float = settings.catalog_snapshot_refresh_seconds,
+        max_age: float = settings.catalog_snapshot_max_age_seconds,
+    ) -> None:
+        self.path = path
+        self.generations = generations
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._snapshot: CatalogSnapshot | None = None
+        self._stat: Tuple[int, int, int] | None = None
+
+    def get(self, *indices: str) -> CatalogSnapshot | None:
+        """The snapshot if it is up to date with all the indices and not older than the max age."""
+        snapshot = self._snapshot
+        if snapshot is None or time.time() - snapshot.built_at > self.max_age or any(
+            snapshot.generations.get(index, 0) != self.generations.get(index) for index in indices
+        ):
+            return None
+        return snapshot
+
+    def reload(self) -> bool:
+        """Map the file if it has been replaced since it was last mapped, returns whether it was."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if key == self._stat:
+            return False
+        # The previous mapping is unmapped once requests reading it are done with it
+        self._snapshot = CatalogSnapshot(self.path)
+        self._stat = key
+        logger.info('Mapped catalog snapshot %s, %s, generations %s',
+                    self.path, self._snapshot.counts(), self._snapshot.generations)
+        return True
+
+    async def run(self) -> None:
+        """Keep the snapshot mapped and up to date until cancelled."""
+        while True:
+            try:
+                self.reload()
+            except (OSError, ValueError, KeyError, SnapshotError) as e:
+                logger.error('Failed to map catalog snapshot %s: %s', self.path, e)
+            await asyncio.sleep(self.refresh_interval)
+
+
+def _by_id(documents):
+    return sorted(documents, key=lambda document: UUID(document.id).bytes)
+
+
+def _add_table(sections: Dict[str, np.ndarray], name: str, ids: List[str]) -> None:
+    raw = np.frombuffer(b''.join(UUID(id).bytes for id in ids), dtype='u1')
+    sections[f'{name}.ids'] = raw
+    sections[f'{name}.keys'] = raw.reshape(-1, 16)[:, :8].copy().view('>u8').ravel().astype('<u8')
+
+
+def _add_column(sections: Dict[str, np.ndarray], name: str, values: List[bytes]) -> None:
+    sections[f'{name}.offsets'] = _offsets([len(value) for value in values])
+    sections[f'{name}.blob'] = np.frombuffer(b''.join(values), dtype='u1')
+
+
+def _offsets(sizes: List[int]) -> np.ndarray:
+    return np.concatenate(([0], np.cumsum(sizes, dtype='<u8'))).astype('<u8')
+
+
+def _align(offset: int) -> int:
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+snapshot_file: CatalogSnapshotFile | None = None
+
+
+def get_snapshot_file() -> CatalogSnapshotFile | None:
+    return snapshot_file
@@ -1,31 +1,42 @@
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Sequence, Set
+import asyncio
 import logging
+import time
+from functools import partial
 from uuid import UUID
 
-from pydantic import BaseModel
-from elasticsearch import AsyncElasticsearch, ConnectionError
+from elasticsearch import ApiError, AsyncElasticsearch, BadRequestError, ConnectionError, NotFoundError
 
 from backoff import backoff
+from db.query_builder import FilmFilters, Filters, build_film_query
+from db.query_log import QueryLog, SlowQuery, query_log, summarize_profile
+from db.search import SEARCH_TEMPLATES, SUGGESTERS, SearchQueryError, SearchTemplate, suggest_prefix
 
 logger = logging.getLogger(__name__)
 
 
-class DataStorageError(Exception):
-    pass
+FILM_PERSON_ROLES = ('actors', 'writers', 'directors')
+# Upper bound of distinct genres, terms aggregations return at most this many buckets
+_MAX_GENRES = 1000
+# How long a point in time outlives the last page read from it
+_PIT_KEEP_ALIVE = '1m'
 
 
-class Filters(BaseModel):
+class DataStorageError(Exception):
     pass
 
 
-class FilmFilters(Filters):
-    genre_id: UUID | None
+class InvalidQueryError(DataStorageError):
+    """The query was rejected, asking again won't help."""
 
 
 class DataStorage:
-    def __init__(self, elastic: AsyncElasticsearch, index: str):
+    _profiling_tasks: Set[asyncio.Task] = set()
+
+    def __init__(self, elastic: AsyncElasticsearch, index: str, slow_query_log: QueryLog = query_log):
         self._elastic = elastic
         self._index = index
+        self._slow_query_log = slow_query_log
 
     async def get(self, id: UUID) -> Dict[str, Any] | None:
         logger.info('Getting %s by id %s', self._index, id)
@@ -33,39 +44,195 @@ class DataStorage:
         films = await self._make_request(query_body)
         return films[0] if films else None
 
+    async def get_many(self, ids: Sequence[UUID | str]) -> Dict[str, Dict[str, Any]]:
+        """Documents with the given ids by id, in one request, missing ones are left out."""
+        if not ids:
+            return {}
+        logger.info('Getting %s %s by ids', len(ids), self._index)
+        query_body = {'query': {'terms': {'id': [str(i) for i in ids]}}, 'size': len(ids), 'track_total_hits': False}
+        return {doc['id']: doc for doc in await self._make_request(query_body)}
+
     async def list(
-        self, limit: int = 50, offset: int = 0, sort_by: str = 'id', filters: Filters | None = None
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        sort_by: str = 'id',
+        filters: Filters | None = None,
+        track_total_hits: bool | int = False,
     ) -> List[Dict[str, Any]]:
+        """List documents, counting total hits only when track_total_hits asks for it, listings don't need it."""
         query_body = {
             **self._get_sort_field(sort_by),
             **self._get_elastic_pagination_fields(limit, offset),
             **self._apply_filters(filters),
+            'track_total_hits': track_total_hits,
         }
         return await self._make_request(query_body)
 
     async def search(
         self, query: str, limit: int = 50, offset: int = 0
     ) -> List[Dict[str, Any]]:
+        """Full-text search with the search template of the index, a query without words finds nothing."""
         logger.info('Searching in %s by query: %s', self._index, query)
-        query_body = {
-            'query': {'query_string': {'query': query}},
-            **self._get_elastic_pagination_fields(limit, offset),
+        template = SEARCH_TEMPLATES[self._index]
+        try:
+            params = template.params(query, limit, offset)
+        except SearchQueryError as e:
+            raise InvalidQueryError(e)
+        if params is None:
+            return []
+        # The rendered body is what the slow query log shows and what gets profiled
+        return await self._make_request(
+            template.render(params), partial(self._make_template_request, template, params))
+
+    async def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Documents whose words start with the words of the query, with just the fields to show them."""
+        prefix = suggest_prefix(query)
+        if not prefix:
+            return []
+        return await self._make_request(SUGGESTERS[self._index].body(prefix, limit))
+
+    async def count(self) -> int:
+        try:
+            response = await self._make_count_request()
+        except ConnectionError as e:
+            logger.error('Failed to count documents of %s', self._index)
+            raise DataStorageError(e)
+        return response['count']
+
+    async def ids(self, batch_size: int = 5000) -> AsyncIterator[str]:
+        """Iterate over ids of all documents."""
+        async for doc in self.scan(['id'], batch_size):
+            yield doc['id']
+
+    async def scan(self, fields: List[str], batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over the given fields of all documents, paging with search_after on the id field."""
+        query_body: Dict[str, Any] = {'size': batch_size, 'sort': [{'id': 'asc'}], '_source': fields}
+        while True:
+            try:
+                response = await self._make_search_request(query_body)
+            except ConnectionError as e:
+                logger.error('Failed to scan %s', self._index)
+                raise DataStorageError(e)
+            hits = response['hits']['hits']
+            for hit in hits:
+                yield hit['_source']
+            if len(hits) < batch_size:
+                return
+            query_body['search_after'] = hits[-1]['sort']
+
+    async def export(
+        self, fields: List[str] | None = None, after: str | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Iterate over batches of documents in id order starting after the given id, reading only the given fields.
+
+        Pages are read from a point in time of the index, so they are consistent with each other while the index
+        changes. The point in time is kept alive only between pages and closed as soon as iteration stops.
+        """
+        pit_id = await self._open_point_in_time()
+        query_body: Dict[str, Any] = {
+            'size': batch_size, 'sort': [{'id': 'asc'}], '_source': fields or True, 'track_total_hits': False,
         }
-        return await self._make_request(query_body)
+        if after is not None:
+            # A point in time adds an implicit tiebreaker to the sort, so a bare id is not a valid search_after
+            query_body['query'] = {'range': {'id': {'gt': after}}}
+        try:
+            while True:
+                query_body['pit'] = {'id': pit_id, 'keep_alive': _PIT_KEEP_ALIVE}
+                response = await self._make_logged_request(
+                    query_body, partial(self._make_pit_search_request, query_body))
+                # Elasticsearch may hand out a new id of the same point in time with every page
+                pit_id = response.get('pit_id', pit_id)
+                hits = response['hits']['hits']
+                if hits:
+                    yield [hit['_source'] for hit in hits]
+                if len(hits) < batch_size:
+                    return
+                query_body['search_after'] = hits[-1]['sort']
+        finally:
+            await self._close_point_in_time(pit_id)
+
+    async def _make_request(
+        self, query_body: Dict[str, Any], request: Callable[[], Awaitable[Dict[str, Any]]] | None = None
+    ) -> List[Dict[str, Any]]:
+        response = await self._make_logged_request(query_body, request)
+        return [f['_source'] for f in ((response.get('hits') or {}).get('hits') or [])]
 
-    async def _make_request(self, query_body: Dict[str, Any]) -> List[Dict[str, Any]]:
+    async def _make_logged_request(
+        self, query_body: Dict[str, Any], request: Callable[[], Awaitable[Dict[str, Any]]] | None = None
+    ) -> Dict[str, Any]:
         logger.info('Requesting %s with query body: %s', self._index, query_body)
+        started = time.perf_counter()
         try:
-            response = await self._make_search_request(query_body)
+            response = await (request() if request else self._make_search_request(query_body))
         except ConnectionError as e:
             logger.error('Failed to request %s with query body: %s', self._index, query_body)
             raise DataStorageError(e)
-        return [f['_source'] for f in ((response.get('hits') or {}).get('hits') or [])]
+        except BadRequestError as e:
+            logger.warning('Query to %s was rejected: %s, query body: %s', self._index, e, query_body)
+            raise InvalidQueryError(e)
+        took_ms = (time.perf_counter() - started) * 1000
+        if self._slow_query_log.is_slow(took_ms):
+            self._log_slow_query(query_body, took_ms, response)
+        return response
+
+    def _log_slow_query(self, query_body: Dict[str, Any], took_ms: float, response: Dict[str, Any]) -> None:
+        entry = self._slow_query_log.record(self._index, query_body, took_ms, response)
+        if self._slow_query_log.should_profile():
+            task = asyncio.create_task(self._profile_slow_query(entry, query_body))
+            self._profiling_tasks.add(task)
+            task.add_done_callback(self._profiling_tasks.discard)
+
+    async def _profile_slow_query(self, entry: SlowQuery, query_body: Dict[str, Any]) -> None:
+        logger.info('Profiling slow query to %s', self._index)
+        try:
+            response = await self._elastic.search(index=self._index, body={**query_body, 'profile': True})
+        except (ConnectionError, ApiError) as e:
+            logger.error('Failed to profile slow query to %s: %s', self._index, e)
+            return
+        entry.profile = summarize_profile(response)
 
     @backoff(exceptions=(ConnectionError,))
     async def _make_search_request(self, query_body: Dict[str, Any]) -> Dict[str, Any]:
         return await self._elastic.search(index=self._index, body=query_body)
 
+    @backoff(exceptions=(ConnectionError,))
+    async def _make_template_request(self, template: SearchTemplate, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            return await self._elastic.search_template(index=self._index, id=template.id, params=params)
+        except NotFoundError as e:
+            if e.error != 'resource_not_found_exception':
+                raise
+        # The template is stored on first use, and again if Elasticsearch lost it
+        logger.info('Storing search template %s', template.id)
+        await template.store(self._elastic)
+        return await self._elastic.search_template(index=self._index, id=template.id, params=params)
+
+    @backoff(exceptions=(ConnectionError,))
+    async def _make_pit_search_request(self, query_body: Dict[str, Any]) -> Dict[str, Any]:
+        # A point in time names its index, searches on it must not
+        return await self._elastic.search(body=query_body)
+
+    async def _open_point_in_time(self) -> str:
+        try:
+            response = await self._elastic.open_point_in_time(index=self._index, keep_alive=_PIT_KEEP_ALIVE)
+        except ConnectionError as e:
+            logger.error('Failed to open a point in time of %s', self._index)
+            raise DataStorageError(e)
+        return response['id']
+
+    async def _close_point_in_time(self, pit_id: str) -> None:
+        try:
+            await self._elastic.close_point_in_time(id=pit_id)
+        except (ConnectionError, ApiError) as e:
+            # It expires after the keep alive anyway
+            logger.warning('Failed to close a point in time of %s: %s', self._index, e)
+
+    @backoff(exceptions=(ConnectionError,))
+    async def _make_count_request(self) -> Dict[str, Any]:
+        return await self._elastic.count(index=self._index)
+
     @staticmethod
     def _get_elastic_pagination_fields(limit: int, offset: int) -> Dict[str, int]:
         return {
@@ -80,9 +247,11 @@ class DataStorage:
             sort_direction = 'desc'
         else:
             sort_direction = 'asc'
-        return {
-            'sort': {sort_by: sort_direction},
-        }
+        sort: List[Dict[str, str]] = [{sort_by: sort_direction}]
+        if sort_by != 'id':
+            # Ties are broken by id, like in the catalog snapshot and the embedded catalog, so pages don't overlap
+            sort.append({'id': 'asc'})
+        return {'sort': sort}
 
     @staticmethod
     def _apply_filters(filters: Filters | None) -> Dict[str, Any]:
@@ -90,14 +259,47 @@ class DataStorage:
 
 
 class FilmDataStorage(DataStorage):
+    async def list_by_persons(
+        self, person_ids: List[UUID], fields: List[str], batch_size: int = 1000
+    ) -> List[Dict[str, Any]]:
+        """All films any of the persons took part in, in any role, read in pages of batch_size in id order."""
+        query_body: Dict[str, Any] = {
+            'query': {'bool': {'should': [
+                {'nested': {'path': role, 'query': {'terms': {f'{role}.id': [str(p) for p in person_ids]}}}}
+                for role in FILM_PERSON_ROLES
+            ]}},
+            '_source': fields,
+            'size': batch_size,
+            'sort': [{'id': 'asc'}],
+            'track_total_hits': False,
+        }
+        films: List[Dict[str, Any]] = []
+        while True:
+            response = await self._make_logged_request(query_body)
+            hits = response['hits']['hits']
+            films.extend(hit['_source'] for hit in hits)
+            if len(hits) < batch_size:
+                return films
+            query_body['search_after'] = hits[-1]['sort']
+
+    async def count_by_genre(self) -> Dict[str, int]:
+        """Number of films of every genre, by genre id, genres without films are missing."""
+        query_body = {
+            'size': 0,
+            'track_total_hits': False,
+            'aggs': {'genres': {
+                'nested': {'path': 'genres'},
+                'aggs': {'ids': {
+                    'terms': {'field': 'genres.id', 'size': _MAX_GENRES},
+                    # Buckets count nested genre entries, films are counted back on the parent documents
+                    'aggs': {'films': {'reverse_nested': {}}},
+                }},
+            }},
+        }
+        response = await self._make_logged_request(query_body)
+        buckets = response['aggregations']['genres']['ids']['buckets']
+        return {bucket['key']: bucket['films']['doc_count'] for bucket in buckets}
+
     @staticmethod
     def _apply_filters(filters: FilmFilters | None) -> Dict[str, Any]:
-        if not filters:
-            return {}
-        if filters.genre_id:
-            return {
-                'query': {
-                    'nested': {
-                        'path': 'genres',
-                        'query': {'match': {'genres.id': {'query': filters.genre_id}}}}}}
-        return {}
+        return build_film_query(filters)
@@ -0,0 +1,396 @@
+import asyncio
+import bisect
+import logging
+import math
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+import orjson
+
+from core.config import settings
+from db.catalog_snapshot import CatalogSnapshot
+from db.data_storage import FILM_PERSON_ROLES, DataStorage, DataStorageError, FilmDataStorage, InvalidQueryError
+from db.query_builder import FilmFilters, Filters
+from db.search import SEARCH_TEMPLATES, SUGGESTERS, SearchQueryError, query_terms, suggest_prefix
+
+logger = logging.getLogger(__name__)
+
+# Indices by the names of their dumps, see jobs.load_es
+_DUMPS = {
+    'movies': settings.movies_index,
+    'personas': settings.persons_index,
+    'genres': settings.genres_index,
+}
+_NAME_FIELDS = {role: f'{role}_names' for role in FILM_PERSON_ROLES}
+_NO_ROWS = np.empty(0, dtype=np.int64)
+
+
+class _Index:
+    """
+    Documents of an index in id order, addressed by row, with an id to row hash and an inverted index
+    over the words of the fields searched and suggested in the index.
+    """
+
+    def __init__(self, documents: Iterable[Dict[str, Any]], text_fields: Iterable[str]) -> None:
+        self.documents = sorted(documents, key=lambda doc: doc['id'])
+        self.ids = [doc['id'] for doc in self.documents]
+        self.rows = {id: row for row, id in enumerate(self.ids)}
+        self.postings: Dict[str, Dict[str, np.ndarray]] = {}
+        # Sorted words of every field, words starting with a prefix are next to each other
+        self.vocabulary: Dict[str, List[str]] = {}
+        for field in set(text_fields):
+            rows: Dict[str, List[int]] = defaultdict(list)
+            for row, doc in enumerate(self.documents):
+                for term in dict.fromkeys(_terms(doc.get(field))):
+                    rows[term].append(row)
+            self.postings[field] = {term: np.array(r, dtype=np.int64) for term, r in rows.items()}
+            self.vocabulary[field] = sorted(rows)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def search(self, terms: List[str], fields: List[str], tie_breaker: float) -> np.ndarray:
+        """Rows matching any of the terms in any field, best first, scored the way multi_match best_fields does."""
+        field_scores = []
+        for field, boost in (_field_boost(field) for field in fields):
+            scores = np.zeros(len(self))
+            postings = self.postings[field]
+            for term in terms:
+                rows = postings.get(term, _NO_ROWS)
+                # Rarer words weigh more, as in BM25
+                scores[rows] += boost * math.log(1 + (len(self) - len(rows) + 0.5) / (len(rows) + 0.5))
+            field_scores.append(scores)
+        scores = np.vstack(field_scores)
+        best = scores.max(axis=0)
+        combined = best + tie_breaker * (scores.sum(axis=0) - best)
+        rows = np.flatnonzero(combined)
+        return rows[np.argsort(-combined[rows], kind='stable')]
+
+    def prefix_rows(self, field: str, prefix: str) -> np.ndarray:
+        """Rows with a word in the field that starts with every word of the prefix."""
+        vocabulary, postings = self.vocabulary[field], self.postings[field]
+        matched = None
+        for word in prefix.split():
+            start = bisect.bisect_left(vocabulary, word)
+            end = bisect.bisect_left(vocabulary, word + '\uffff', start)
+            rows = np.unique(np.concatenate([postings[term] for term in vocabulary[start:end]] or [_NO_ROWS]))
+            matched = rows if matched is None else np.intersect1d(matched, rows, assume_unique=True)
+        return matched if matched is not None else _NO_ROWS
+
+
+class _FilmIndex(_Index):
+    """Films with rows sorted by rating, overall and per genre, and rows of every genre and person."""
+
+    def __init__(self, documents: Iterable[Dict[str, Any]], text_fields: Iterable[str]) -> None:
+        super().__init__(documents, text_fields)
+        self.ratings = np.array(
+            [doc['imdb_rating'] if doc.get('imdb_rating') is not None else np.nan for doc in self.documents])
+        # Films without a rating go last, as they do in Elasticsearch
+        self.by_rating = np.lexsort((np.arange(len(self)), np.isnan(self.ratings), -np.nan_to_num(self.ratings)))
+        self.genres = _rows_by_id(self.documents, ['genres'])
+        self.genres_by_rating = {
+            genre: self.by_rating[np.isin(self.by_rating, rows, assume_unique=True)]
+            for genre, rows in self.genres.items()
+        }
+        self.persons = {role: _rows_by_id(self.documents, [role]) for role in FILM_PERSON_ROLES}
+
+    def filtered(self, filters: FilmFilters | None) -> np.ndarray:
+        """Rows of films matching the filters, by rating."""
+        if not filters:
+            return self.by_rating
+        genre_ids = [str(genre_id) for genre_id in filters.genre_ids]
+        has_rating = filters.rating_from is not None or filters.rating_to is not None
+        if len(genre_ids) == 1 and not (has_rating or filters.actor_ids or filters.director_ids):
+            return self.genres_by_rating.get(genre_ids[0], _NO_ROWS)
+        mask = np.ones(len(self), dtype=bool)
+        if genre_ids:
+            rows = [self.genres.get(genre_id, _NO_ROWS) for genre_id in genre_ids]
+            if filters.genres_match == 'all':
+                for genre_rows in rows:
+                    mask &= _mask(len(self), genre_rows)
+            else:
+                mask &= _mask(len(self), np.concatenate(rows))
+        if has_rating:
+            # Comparisons with a missing rating are false, so films without one are left out
+            with np.errstate(invalid='ignore'):
+                if filters.rating_from is not None:
+                    mask &= self.ratings >= filters.rating_from
+                if filters.rating_to is not None:
+                    mask &= self.ratings <= filters.rating_to
+        if filters.actor_ids:
+            mask &= _mask(len(self), self.person_rows(filters.actor_ids, ['actors']))
+        if filters.director_ids:
+            mask &= _mask(len(self), self.person_rows(filters.director_ids, ['directors']))
+        return self.by_rating[mask[self.by_rating]]
+
+    def person_rows(self, person_ids: Iterable[UUID | str], roles: Iterable[str] = FILM_PERSON_ROLES) -> np.ndarray:
+        rows = [self.persons[role].get(str(person_id), _NO_ROWS) for role in roles for person_id in person_ids]
+        return np.unique(np.concatenate(rows or [_NO_ROWS]))
+
+
+class EmbeddedCatalog:
+    """
+    Read-only copy of the catalog held by the worker, indexed to answer what the services ask Elasticsearch.
+
+    Documents are found by id through a hash, listings by rating are precomputed overall and per genre, other
+    film filters are evaluated as masks over film rows. Search and suggestions use inverted indices over
+    the words of the searched fields, scoring is simpler than in Elasticsearch, but the same documents match.
+    """
+
+    def __init__(self, documents: Dict[str, Iterable[Dict[str, Any]]]) -> None:
+        self.indices: Dict[str, _Index] = {}
+        for index, docs in documents.items():
+            fields = [_field_boost(field)[0] for field in _search_fields(index)]
+            if index in SUGGESTERS:
+                fields.append(SUGGESTERS[index].field.split('.')[0])
+            index_class = _FilmIndex if index == settings.movies_index else _Index
+            self.indices[index] = index_class(docs, fields)
+
+    @classmethod
+    def from_dumps(cls, data_dir: Path) -> 'EmbeddedCatalog':
+        """Catalog of the elasticdump data dumps of the indices, see jobs.load_es."""
+        documents = {}
+        for dump, index in _DUMPS.items():
+            with open(data_dir / f'{dump}_data.json', 'rb') as f:
+                documents[index] = [orjson.loads(line)['_source'] for line in f if line.strip()]
+        return cls(documents)
+
+    @classmethod
+    def from_snapshot(cls, path: Path) -> 'EmbeddedCatalog':
+        """Catalog of a catalog snapshot, which holds films with a rating only, see db.catalog_snapshot."""
+        snapshot = CatalogSnapshot(path)
+        return cls({
+            settings.movies_index: [_film_source(orjson.loads(data)) for data in snapshot.documents('films')],
+            settings.persons_index: [_person_source(orjson.loads(data)) for data in snapshot.documents('persons')],
+            settings.genres_index: [orjson.loads(data) for data in snapshot.documents('genres')],
+        })
+
+    @classmethod
+    def load(cls, path: Path) -> 'EmbeddedCatalog':
+        """Catalog of a directory of dumps or of a snapshot file."""
+        return cls.from_dumps(path) if path.is_dir() else cls.from_snapshot(path)
+
+    def counts(self) -> Dict[str, int]:
+        return {index: len(documents) for index, documents in self.indices.items()}
+
+
+class EmbeddedCatalogFile:
+    """The embedded catalog of a path, loaded again whenever the dumps or the snapshot there change."""
+
+    def __init__(self, path: Path, refresh_interval: float = settings.embedded_catalog_refresh_seconds) -> None:
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.catalog: EmbeddedCatalog | None = None
+        self._fingerprint: Tuple[Tuple[int, int, int], ...] | None = None
+
+    def index(self, index: str) -> _Index:
+        if self.catalog is None:
+            raise DataStorageError(f'Embedded catalog {self.path} is not loaded')
+        return self.catalog.indices[index]
+
+    async def reload(self) -> bool:
+        """Load the catalog if it has changed since it was last loaded, returns whether it was."""
+        fingerprint = _fingerprint(self.path)
+        if not fingerprint or fingerprint == self._fingerprint:
+            return False
+        # Indexing a large catalog takes a while, requests are served meanwhile
+        self.catalog = await asyncio.to_thread(EmbeddedCatalog.load, self.path)
+        self._fingerprint = fingerprint
+        logger.info('Loaded embedded catalog %s, %s', self.path, self.catalog.counts())
+        return True
+
+    async def run(self) -> None:
+        """Keep the catalog loaded and up to date until cancelled."""
+        while True:
+            try:
+                await self.reload()
+            except (OSError, ValueError, KeyError) as e:
+                logger.error('Failed to load embedded catalog %s: %s', self.path, e)
+            await asyncio.sleep(self.refresh_interval)
+
+
+class EmbeddedDataStorage(DataStorage):
+    """DataStorage reading the embedded catalog instead of Elasticsearch."""
+
+    def __init__(self, catalog: EmbeddedCatalogFile, index: str) -> None:
+        self._catalog = catalog
+        self._index = index
+
+    async def get(self, id: UUID) -> Dict[str, Any] | None:
+        index = self._catalog.index(self._index)
+        row = index.rows.get(str(id))
+        return index.documents[row] if row is not None else None
+
+    async def get_many(self, ids: Sequence[UUID | str]) -> Dict[str, Dict[str, Any]]:
+        index = self._catalog.index(self._index)
+        rows = (index.rows.get(str(id)) for id in ids)
+        return {index.ids[row]: index.documents[row] for row in rows if row is not None}
+
+    async def list(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        sort_by: str = 'id',
+        filters: Filters | None = None,
+        track_total_hits: bool | int = False,
+    ) -> List[Dict[str, Any]]:
+        index = self._catalog.index(self._index)
+        rows = self._sorted(index, sort_by, self._filtered(index, filters))
+        return [index.documents[row] for row in rows[offset:offset + limit]]
+
+    async def search(self, query: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        index = self._catalog.index(self._index)
+        template = SEARCH_TEMPLATES[self._index]
+        try:
+            params = template.params(query, limit, offset)
+        except SearchQueryError as e:
+            raise InvalidQueryError(e)
+        if params is None:
+            return []
+        rows = index.search(params['query'].split(), template.fields, template.tie_breaker)
+        return [index.documents[row] for row in rows[offset:offset + limit]]
+
+    async def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        prefix = suggest_prefix(query)
+        if not prefix:
+            return []
+        index = self._catalog.index(self._index)
+        suggester = SUGGESTERS[self._index]
+        rows = index.prefix_rows(suggester.field.split('.')[0], prefix)
+        for sort in reversed(suggester.sort):
+            ((field, order),) = sort.items()
+            rows = self._sorted(index, f'-{field}' if order['order'] == 'desc' else field, rows)
+        return [_project(index.documents[row], suggester.source) for row in rows[:limit]]
+
+    async def count(self) -> int:
+        return len(self._catalog.index(self._index))
+
+    async def scan(self, fields: List[str], batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        for doc in self._catalog.index(self._index).documents:
+            yield _project(doc, fields)
+
+    async def export(
+        self, fields: List[str] | None = None, after: str | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        # A reloaded catalog does not affect an export in progress, like a point in time
+        index = self._catalog.index(self._index)
+        start = bisect.bisect_right(index.ids, after) if after is not None else 0
+        for batch_start in range(start, len(index), batch_size):
+            yield [_project(doc, fields) for doc in index.documents[batch_start:batch_start + batch_size]]
+
+    def _filtered(self, index: _Index, filters: Filters | None) -> np.ndarray:
+        return np.arange(len(index))
+
+    @staticmethod
+    def _sorted(index: _Index, sort_by: str, rows: np.ndarray) -> np.ndarray:
+        """Rows sorted by a field, documents without it go last either way, ties stay in their order."""
+        field, descending = (sort_by[1:], True) if sort_by.startswith('-') else (sort_by, False)
+        if field == 'id':
+            return rows[::-1] if descending else rows
+        present = [row for row in rows if index.documents[row].get(field) is not None]
+        present.sort(key=lambda row: index.documents[row][field], reverse=descending)
+        missing = [row for row in rows if index.documents[row].get(field) is None]
+        return np.array(present + missing, dtype=np.int64)
+
+
+class EmbeddedFilmDataStorage(EmbeddedDataStorage, FilmDataStorage):
+    async def list(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        sort_by: str = 'id',
+        filters: Filters | None = None,
+        track_total_hits: bool | int = False,
+    ) -> List[Dict[str, Any]]:
+        index = self._catalog.index(self._index)
+        if sort_by != '-imdb_rating':
+            return await super().list(limit, offset, sort_by, filters, track_total_hits)
+        # Listings by rating read the precomputed order
+        return [index.documents[row] for row in index.filtered(filters)[offset:offset + limit]]
+
+    async def list_by_persons(
+        self, person_ids: List[UUID], fields: List[str], batch_size: int = 1000
+    ) -> List[Dict[str, Any]]:
+        index = self._catalog.index(self._index)
+        return [_project(index.documents[row], fields) for row in index.person_rows(person_ids)]
+
+    async def count_by_genre(self) -> Dict[str, int]:
+        return {genre: len(rows) for genre, rows in self._catalog.index(self._index).genres.items()}
+
+    def _filtered(self, index: _FilmIndex, filters: FilmFilters | None) -> np.ndarray:
+        return np.sort(index.filtered(filters))
+
+
+def _search_fields(index: str) -> List[str]:
+    return SEARCH_TEMPLATES[index].fields if index in SEARCH_TEMPLATES else []
+
+
+def _field_boost(field: str) -> Tuple[str, float]:
+    name, _, boost = field.partition('^')
+    return name, float(boost or 1)
+
+
+def _terms(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [term for item in value for term in _terms(item)]
+    return query_terms(value) if isinstance(value, str) else []
+
+
+def _rows_by_id(documents: List[Dict[str, Any]], fields: List[str]) -> Dict[str, np.ndarray]:
+    rows: Dict[str, List[int]] = defaultdict(list)
+    for row, doc in enumerate(documents):
+        for id in dict.fromkeys(item['id'] for field in fields for item in doc.get(field) or []):
+            rows[id].append(row)
+    return {id: np.array(r, dtype=np.int64) for id, r in rows.items()}
+
+
+def _mask(size: int, rows: np.ndarray) -> np.ndarray:
+    mask = np.zeros(size, dtype=bool)
+    mask[rows] = True
+    return mask
+
+
+def _project(doc: Dict[str, Any], fields: List[str] | None) -> Dict[str, Any]:
+    return {field: doc[field] for field in fields if field in doc} if fields else doc
+
+
+def _fingerprint(path: Path) -> Tuple[Tuple[int, int, int], ...] | None:
+    try:
+        files = [path / f'{dump}_data.json' for dump in _DUMPS] if path.is_dir() else [path]
+        return tuple((s.st_ino, s.st_mtime_ns, s.st_size) for s in map(os.stat, files))
+    except FileNotFoundError:
+        return None
+
+
+def _film_source(film: Dict[str, Any]) -> Dict[str, Any]:
+    """Film the way it is indexed, from its response."""
+    persons = {role: [{'id': p['uuid'], 'name': p['full_name']} for p in film[role]] for role in FILM_PERSON_ROLES}
+    return {
+        'id': film['uuid'],
+        'title': film['title'],
+        'imdb_rating': film['imdb_rating'],
+        'description': film['description'],
+        'genres': [{'id': genre['uuid'], 'name': genre['name']} for genre in film['genres']],
+        **persons,
+        **{_NAME_FIELDS[role]: [p['name'] for p in people] for role, people in persons.items()},
+    }
+
+
+def _person_source(person: Dict[str, Any]) -> Dict[str, Any]:
+    """Person the way it is indexed, from its response."""
+    return {
+        'id': person['uuid'],
+        'full_name': person['full_name'],
+        'films': [{'id': film['uuid'], 'roles': film['roles']} for film in person['films']],
+    }
+
+
+embedded_catalog: EmbeddedCatalogFile | None = None
+
+
+def get_embedded_catalog() -> EmbeddedCatalogFile | None:
+    return embedded_catalog
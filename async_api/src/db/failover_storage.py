@@ -0,0 +1,154 @@
+import logging
+import time
+from typing import Any, AsyncIterator, Dict, List, Sequence
+from uuid import UUID
+
+from elasticsearch import AsyncElasticsearch
+
+from core.config import settings
+from db.data_storage import DataStorage, DataStorageError, FilmDataStorage, InvalidQueryError
+from db.embedded_storage import EmbeddedCatalogFile, EmbeddedDataStorage, EmbeddedFilmDataStorage
+from db.query_builder import Filters
+
+logger = logging.getLogger(__name__)
+
+
+class Outage:
+    """
+    Whether a storage is to be skipped after it failed, shared by the storages of one cluster, so a request
+    to any of its indices doesn't wait for the cluster to fail again. It is tried again after retry_after.
+    """
+
+    def __init__(self, retry_after: float = settings.data_storage_failover_seconds) -> None:
+        self.retry_after = retry_after
+        self._failed_at: float | None = None
+
+    def available(self) -> bool:
+        if self._failed_at is None:
+            return True
+        if time.monotonic() - self._failed_at < self.retry_after:
+            return False
+        logger.info('Trying the storage again after failing over')
+        self._failed_at = None
+        return True
+
+    def fail(self) -> None:
+        self._failed_at = time.monotonic()
+
+
+class FailoverDataStorage(DataStorage):
+    """
+    DataStorage reading the primary storage, and the fallback one while the primary is unavailable.
+
+    Rejected queries are not failures of the primary. Iterations switch to the fallback only if the primary
+    fails before yielding anything.
+    """
+
+    def __init__(self, primary: DataStorage, fallback: DataStorage, outage: Outage | None = None) -> None:
+        self._primary = primary
+        self._fallback = fallback
+        self._index = primary._index
+        self._outage = outage or Outage()
+
+    async def get(self, id: UUID) -> Dict[str, Any] | None:
+        return await self._call('get', id=id)
+
+    async def get_many(self, ids: Sequence[UUID | str]) -> Dict[str, Dict[str, Any]]:
+        return await self._call('get_many', ids)
+
+    async def list(
+        self,
+        limit: int = 50,
+        offset: int = 0,
+        sort_by: str = 'id',
+        filters: Filters | None = None,
+        track_total_hits: bool | int = False,
+    ) -> List[Dict[str, Any]]:
+        return await self._call('list', limit, offset, sort_by, filters, track_total_hits)
+
+    async def search(self, query: str, limit: int = 50, offset: int = 0) -> List[Dict[str, Any]]:
+        return await self._call('search', query, limit, offset)
+
+    async def suggest(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        return await self._call('suggest', query, limit)
+
+    async def count(self) -> int:
+        return await self._call('count')
+
+    async def scan(self, fields: List[str], batch_size: int = 1000) -> AsyncIterator[Dict[str, Any]]:
+        async for doc in self._iterate('scan', fields, batch_size):
+            yield doc
+
+    async def export(
+        self, fields: List[str] | None = None, after: str | None = None, batch_size: int = 1000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        async for batch in self._iterate('export', fields, after, batch_size):
+            yield batch
+
+    async def _call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        if self._outage.available():
+            try:
+                return await getattr(self._primary, method)(*args, **kwargs)
+            except InvalidQueryError:
+                raise
+            except DataStorageError as e:
+                self._fail(method, e)
+        return await getattr(self._fallback, method)(*args, **kwargs)
+
+    async def _iterate(self, method: str, *args: Any) -> AsyncIterator[Any]:
+        if self._outage.available():
+            started = False
+            try:
+                async for item in getattr(self._primary, method)(*args):
+                    started = True
+                    yield item
+                return
+            except InvalidQueryError:
+                raise
+            except DataStorageError as e:
+                if started:
+                    raise
+                self._fail(method, e)
+        async for item in getattr(self._fallback, method)(*args):
+            yield item
+
+    def _fail(self, method: str, e: DataStorageError) -> None:
+        logger.warning('%s of %s failed, reading the fallback storage for %s s: %s',
+                       method, self._index, self._outage.retry_after, e)
+        self._outage.fail()
+
+
+class FailoverFilmDataStorage(FailoverDataStorage, FilmDataStorage):
+    async def list_by_persons(
+        self, person_ids: List[UUID], fields: List[str], batch_size: int = 1000
+    ) -> List[Dict[str, Any]]:
+        return await self._call('list_by_persons', person_ids, fields, batch_size)
+
+    async def count_by_genre(self) -> Dict[str, int]:
+        return await self._call('count_by_genre')
+
+
+# Indices of the cluster fail together
+_elastic_outage = Outage()
+
+
+def make_data_storage(
+    elastic: AsyncElasticsearch, index: str, embedded: EmbeddedCatalogFile | None = None
+) -> DataStorage:
+    """Storage of an index on the configured backend, failing over to the embedded catalog if there is one."""
+    if settings.data_storage_backend == 'embedded':
+        return EmbeddedDataStorage(embedded, index)
+    if embedded and settings.data_storage_failover:
+        return FailoverDataStorage(DataStorage(elastic, index), EmbeddedDataStorage(embedded, index), _elastic_outage)
+    return DataStorage(elastic, index)
+
+
+def make_film_data_storage(
+    elastic: AsyncElasticsearch, index: str, embedded: EmbeddedCatalogFile | None = None
+) -> FilmDataStorage:
+    if settings.data_storage_backend == 'embedded':
+        return EmbeddedFilmDataStorage(embedded, index)
+    if embedded and settings.data_storage_failover:
+        return FailoverFilmDataStorage(
+            FilmDataStorage(elastic, index), EmbeddedFilmDataStorage(embedded, index), _elastic_outage)
+    return FilmDataStorage(elastic, index)
@@ -0,0 +1,152 @@
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set
+from uuid import UUID
+
+import orjson
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+
+from core.config import settings
+from db.cache_generations import CacheGenerations, cache_generations
+from db.data_storage import FILM_PERSON_ROLES, FilmDataStorage
+
+logger = logging.getLogger(__name__)
+
+_PERSON_KEY_PREFIX = 'filmography:person:'
+_FILM_KEY_PREFIX = 'filmography:film:'
+_FILM_FIELDS = ['id', 'title', 'imdb_rating', *FILM_PERSON_ROLES]
+_WRITE_BATCH = 500
+
+
+class FilmographyView:
+    """
+    Films of every person with their titles and ratings, so a filmography is read from Redis at once
+    instead of joining persons with movies.
+
+    Each person has a hash of film id to the response-shaped film and each film a set of its persons,
+    so a changed film only touches filmographies of its old and new persons. The view is built from
+    the movies index and kept up to date by jobs.filmography. Filmographies missing from the view are
+    filled on request and kept up to date the same way. Films without a rating are left out, they can't
+    be listed in a response.
+
+    Keys embed the cache generation of the movies index, so reloaded movies are not read from the view built
+    before. Keys don't expire: jobs that switch movies to a new generation build the view of it before
+    the switch and delete the view of the replaced generation after it.
+    """
+
+    def __init__(self, redis: Redis, generations: CacheGenerations = cache_generations) -> None:
+        self.redis = redis
+        self.generations = generations
+
+    async def get(self, person_id: UUID) -> List[Dict[str, Any]] | None:
+        """Films of the person sorted by rating, None if the person is not in the view."""
+        films = await self.redis.hgetall(self._person_key(person_id))
+        if not films:
+            return None
+        return sort_films([orjson.loads(film) for film in films.values()])
+
+    async def put(self, person_id: UUID, films: List[Dict[str, Any]]) -> None:
+        """Fill in a filmography missing from the view."""
+        if not films:
+            return
+        async with self.redis.pipeline(transaction=True) as pipe:
+            self._write_person(pipe, person_id, films)
+            await pipe.execute()
+
+    async def build(self, film_storage: FilmDataStorage) -> int:
+        """Rebuild the whole view of its generation from the movies index, returning the number of persons in it."""
+        # Persons of films are collected anew, stale members of the sets would only cause extra updates
+        await self._delete_keys(self._film_key('*'))
+        filmographies: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        async for film in film_storage.scan(_FILM_FIELDS):
+            if film.get('imdb_rating') is None:
+                continue
+            entry = _film_entry(film)
+            for person_id in _person_ids(film):
+                filmographies[person_id].append(entry)
+
+        person_ids = list(filmographies)
+        for start in range(0, len(person_ids), _WRITE_BATCH):
+            # Transactions, so readers never see a half written filmography
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for person_id in person_ids[start:start + _WRITE_BATCH]:
+                    self._write_person(pipe, person_id, filmographies[person_id])
+                await pipe.execute()
+        # Filmographies of persons who no longer have rated films are left
+        await self._delete_keys(self._person_key('*'), keep={self._person_key(person_id) for person_id in person_ids})
+        logger.info('Built filmography view of %s persons', len(person_ids))
+        return len(person_ids)
+
+    async def delete(self) -> None:
+        """Delete the view of its generation, once movies are switched to another one."""
+        await self._delete_keys(self._person_key('*'))
+        await self._delete_keys(self._film_key('*'))
+        logger.info('Deleted filmography view of movies generation %s', self.generations.get(settings.movies_index))
+
+    async def update_films(self, film_storage: FilmDataStorage, film_ids: Iterable[UUID]) -> int:
+        """Rebuild filmographies of everyone who took part in the films before or after they changed."""
+        film_ids = [str(film_id) for film_id in film_ids]
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for film_id in film_ids:
+                pipe.smembers(self._film_key(film_id))
+            previous = await pipe.execute()
+        person_ids: Set[str] = {p.decode() for persons in previous for p in persons}
+        for film_id in film_ids:
+            film = await film_storage.get(id=film_id)
+            person_ids.update(_person_ids(film) if film else ())
+        return await self.update_persons(film_storage, person_ids)
+
+    async def update_persons(self, film_storage: FilmDataStorage, person_ids: Iterable[UUID | str]) -> int:
+        """Rebuild filmographies of the persons from the movies index."""
+        person_ids = [str(person_id) for person_id in person_ids]
+        for start in range(0, len(person_ids), _WRITE_BATCH):
+            batch = person_ids[start:start + _WRITE_BATCH]
+            films = await film_storage.list_by_persons(batch, _FILM_FIELDS)
+            filmographies: Dict[str, List[Dict[str, Any]]] = {person_id: [] for person_id in batch}
+            for film in films:
+                if film.get('imdb_rating') is None:
+                    continue
+                for person_id in _person_ids(film) & filmographies.keys():
+                    filmographies[person_id].append(_film_entry(film))
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for person_id, person_films in filmographies.items():
+                    self._write_person(pipe, person_id, person_films)
+                await pipe.execute()
+        logger.info('Updated filmographies of %s persons', len(person_ids))
+        return len(person_ids)
+
+    def _write_person(self, pipe: Pipeline, person_id: UUID | str, films: List[Dict[str, Any]]) -> None:
+        key = self._person_key(person_id)
+        pipe.delete(key)
+        if films:
+            pipe.hset(key, mapping={film['uuid']: orjson.dumps(film) for film in films})
+        for film in films:
+            pipe.sadd(self._film_key(film['uuid']), str(person_id))
+
+    async def _delete_keys(self, match: str, keep: Set[str] = frozenset()) -> None:
+        """Delete keys matching the pattern but the kept ones."""
+        stale = [
+            key async for key in self.redis.scan_iter(match=match, count=_WRITE_BATCH)
+            if key.decode() not in keep
+        ]
+        for start in range(0, len(stale), _WRITE_BATCH):
+            await self.redis.delete(*stale[start:start + _WRITE_BATCH])
+
+    def _person_key(self, person_id: UUID | str) -> str:
+        return self.generations.key(settings.movies_index, f'{_PERSON_KEY_PREFIX}{person_id}')
+
+    def _film_key(self, film_id: UUID | str) -> str:
+        return self.generations.key(settings.movies_index, f'{_FILM_KEY_PREFIX}{film_id}')
+
+
+def sort_films(films: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return sorted(films, key=lambda film: (-film['imdb_rating'], film['title']))
+
+
+def _film_entry(film: Dict[str, Any]) -> Dict[str, Any]:
+    return {'uuid': film['id'], 'title': film['title'], 'imdb_rating': film['imdb_rating']}
+
+
+def _person_ids(film: Dict[str, Any]) -> Set[str]:
+    return {person['id'] for role in FILM_PERSON_ROLES for person in film.get(role) or []}
@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import heapq
+import logging
+import time
+from array import array
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from pydantic import BaseModel
+from redis import RedisError
+from redis.asyncio import Redis
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+FILMS = 'films'
+PERSONS = 'persons'
+SEARCHES = 'searches'
+PAGES = 'pages'
+CATEGORIES = (FILMS, PERSONS, SEARCHES, PAGES)
+
+_HOT_KEYS_KEY_PREFIX = 'hot_keys'
+# Aggregated sorted sets keep more members than a worker tracks, so keys hot in different workers are not lost
+_AGGREGATED_SIZE_FACTOR = 4
+
+
+class HotKey(BaseModel):
+    key: str
+    count: int
+
+
+class CountMinSketch:
+    """
+    Approximate counter of keys in constant memory.
+
+    Every key increments one counter per row, the estimate is the smallest of them, so it never undercounts
+    and overcounts by about total / width with probability 1 - 2 ** -depth.
+
+    Columns come from a stable hash rather than the salted hash(), so a key lands in the same counters in every
+    worker and sketches of the same width and depth can be added up. HotKeys only merges top-k counts for now.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4) -> None:
+        self.width = width
+        self.depth = depth
+        self._rows = [array('Q', bytes(8 * width)) for _ in range(depth)]
+
+    def add(self, key: str, count: int = 1) -> int:
+        estimate = None
+        for row, column in zip(self._rows, self._columns(key)):
+            row[column] += count
+            estimate = row[column] if estimate is None else min(estimate, row[column])
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[column] for row, column in zip(self._rows, self._columns(key)))
+
+    def _columns(self, key: str) -> List[int]:
+        # Double hashing over the halves of one digest, an odd step visits distinct columns of a power of two width
+        digest = _digest(key)
+        first, second = digest & 0xFFFFFFFF, digest >> 32 | 1
+        return [(first + i * second) % self.width for i in range(self.depth)]
+
+
+class TopK:
+    """The k most frequent keys of a stream, counted with a count-min sketch."""
+
+    def __init__(self, k: int, width: int = 2048, depth: int = 4) -> None:
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self._counts: Dict[str, int] = {}
+        # Min-heap over _counts, entries with an outdated count are skipped and cleaned up lazily
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, key: str) -> int:
+        count = self.sketch.add(key)
+        if key not in self._counts and len(self._counts) >= self.k:
+            if count <= self._min_count():
+                return count
+            _, evicted = heapq.heappop(self._heap)
+            del self._counts[evicted]
+        self._counts[key] = count
+        heapq.heappush(self._heap, (count, key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(c, k) for k, c in self._counts.items()]
+            heapq.heapify(self._heap)
+        return count
+
+    def estimate(self, key: str) -> int:
+        return self.sketch.estimate(key)
+
+    def top(self, limit: int | None = None) -> List[HotKey]:
+        top = sorted(self._counts.items(), key=lambda item: -item[1])[:limit]
+        return [HotKey(key=key, count=count) for key, count in top]
+
+    def _min_count(self) -> int:
+        while self._heap[0][0] != self._counts.get(self._heap[0][1]):
+            heapq.heappop(self._heap)
+        return self._heap[0][0]
+
+
+class HotKeys:
+    """
+    Most requested films, persons, search queries and list pages.
+
+    Each worker counts accesses reported by the services in per-category TopK trackers and periodically adds
+    the growth of its top-k counts to sorted sets in Redis, the sketches themselves stay in the worker. Counting
+    happens in windows: local trackers are reset and a new set is started every window, see aggregated_top for
+    reading the totals.
+    """
+
+    def __init__(
+        self,
+        k: int = settings.hot_keys_top_k,
+        window: float = settings.hot_keys_window_seconds,
+        width: int = settings.hot_keys_sketch_width,
+        depth: int = settings.hot_keys_sketch_depth,
+    ) -> None:
+        self.k = k
+        self.window = window
+        self.width = width
+        self.depth = depth
+        self._window = self._current_window()
+        self._trackers = self._new_trackers()
+        self._flushed: Dict[str, Dict[str, int]] = {category: {} for category in CATEGORIES}
+
+    def add(self, category: str, key: str) -> int:
+        return self._trackers[category].add(key)
+
+    def estimate(self, category: str, key: str) -> int:
+        """Approximate number of accesses to the key in this worker during the current window."""
+        return self._trackers[category].estimate(key)
+
+    def top(self, category: str, limit: int | None = None) -> List[HotKey]:
+        """Most requested keys of the category in this worker during the current window."""
+        return self._trackers[category].top(limit)
+
+    async def flush(self, redis: Redis) -> None:
+        """Add counts grown since the previous flush to the aggregated top."""
+        window = self._window
+        async with redis.pipeline(transaction=False) as pipe:
+            for category, tracker in self._trackers.items():
+                flushed = self._flushed[category]
+                key = _redis_key(category, window)
+                for hot_key in tracker.top():
+                    delta = hot_key.count - flushed.get(hot_key.key, 0)
+                    if delta > 0:
+                        pipe.zincrby(key, delta, hot_key.key)
+                    flushed[hot_key.key] = hot_key.count
+                pipe.zremrangebyrank(key, 0, -self.k * _AGGREGATED_SIZE_FACTOR - 1)
+                pipe.expire(key, int(2 * self.window) + 1)
+            await pipe.execute()
+        if self._current_window() != window:
+            self._window = self._current_window()
+            self._trackers = self._new_trackers()
+            self._flushed = {category: {} for category in CATEGORIES}
+
+    async def run(self, redis: Redis, interval: float = settings.hot_keys_flush_interval_seconds) -> None:
+        """Flush counts until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush(redis)
+            except RedisError as e:
+                logger.error('Failed to flush hot keys: %s', e)
+
+    def _new_trackers(self) -> Dict[str, TopK]:
+        return {category: TopK(self.k, self.width, self.depth) for category in CATEGORIES}
+
+    def _current_window(self) -> int:
+        return _current_window(self.window)
+
+
+async def aggregated_top(
+    redis: Redis, category: str, limit: int | None = None, window: float = settings.hot_keys_window_seconds
+) -> List[HotKey]:
+    """Most requested keys of the category in all workers during the current and previous window."""
+    current = _current_window(window)
+    top = await redis.zunion([_redis_key(category, current), _redis_key(category, current - 1)], withscores=True)
+    top.sort(key=lambda item: -item[1])
+    return [HotKey(key=key.decode(), count=int(count)) for key, count in top[:limit]]
+
+
+@lru_cache(maxsize=4096)
+def _digest(key: str) -> int:
+    # Cached since traffic is skewed: the same few keys are hashed over and over
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+def _current_window(window: float) -> int:
+    return int(time.time() // window)
+
+
+def _redis_key(category: str, window: int) -> str:
+    return f'{_HOT_KEYS_KEY_PREFIX}:{category}:{window}'
+
+
+hot_keys: HotKeys | None = None
+
+
+def get_hot_keys() -> HotKeys | None:
+    return hot_keys
@@ -0,0 +1,210 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Dict, Set, Tuple
+from uuid import UUID
+
+from elasticsearch import ApiError
+
+from core.config import settings
+from db.cache_generations import CacheGenerations, cache_generations
+from db.data_storage import DataStorage, DataStorageError
+
+logger = logging.getLogger(__name__)
+
+# Room for documents added until the next rebuild, so the error rate does not grow in between
+_CAPACITY_HEADROOM = 1.2
+_MIN_CAPACITY = 1000
+# Filter files start with the generation and build time of the filter, its size in bits and number of hashes
+_HEADER = struct.Struct('<qdqq')
+_LOCK_POLL_SECONDS = 0.1
+# Pause before building filters that failed to build again
+_RETRY_SECONDS = 10
+
+
+class BloomFilter:
+    """
+    Set membership with false positives at the given rate and no false negatives.
+
+    Takes about 1.2 bytes per item at a 1% error rate and 1.8 bytes at 0.1%, regardless of the item size.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001) -> None:
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    @classmethod
+    def from_bits(cls, size: int, hashes: int, bits: bytearray | memoryview) -> 'BloomFilter':
+        """Filter over the bits of another one, e.g. mapped from a file."""
+        bloom = cls.__new__(cls)
+        bloom.size, bloom.hashes, bloom._bits = size, hashes, bits
+        return bloom
+
+    @property
+    def bits(self) -> bytes:
+        return bytes(self._bits)
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+
+class IdFilters:
+    """
+    Bloom filters of document ids per index, used to answer lookups of unknown ids without querying storage.
+
+    The workers of a host share the filters through files in a directory: the worker holding the lock of an
+    index builds its filter from storage and writes it, the others map that file. A filter only answers for
+    the documents it was built from: it is dropped when the cache generation of its index changes and built
+    again for the new generation. Documents written without a release are covered once the filter is older
+    than the refresh interval and rebuilt. Until the filter of an index is there every id is assumed to exist
+    and looked up in storage.
+    """
+
+    def __init__(
+        self,
+        storages: Dict[str, DataStorage],
+        directory: Path = Path(settings.id_filter_path),
+        generations: CacheGenerations = cache_generations,
+        error_rate: float = settings.id_filter_error_rate,
+        refresh_interval: float = settings.id_filter_refresh_seconds,
+    ) -> None:
+        self.storages = storages
+        self.directory = directory
+        self.generations = generations
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self._filters: Dict[str, BloomFilter] = {}
+        # Generations and build times of the filters
+        self._built: Dict[str, Tuple[int, float]] = {}
+        self._rebuilds: Set[asyncio.Task] = set()
+
+    def might_contain(self, index: str, id: UUID | str) -> bool:
+        bloom = self._filters.get(index)
+        return bloom is None or str(id) in bloom
+
+    async def update(self, index: str, generation: int | None = None) -> None:
+        """Map the filter of the index for the generation, building it first unless another worker has."""
+        generation = self.generations.get(index) if generation is None else generation
+        path = self.directory / f'{index}.bloom'
+        async with _file_lock(path.with_suffix('.lock')):
+            if not self._map(index, path, generation):
+                await self._build(index, path, generation)
+                self._map(index, path, generation)
+
+    async def update_all(self) -> None:
+        for index in self.storages:
+            try:
+                await self.update(index)
+            except (DataStorageError, ApiError, OSError) as e:
+                logger.error('Failed to update id filter of %s: %s', index, e)
+
+    async def on_generation(self, index: str, generation: int) -> None:
+        """Cache generations listener, the data of an index has changed."""
+        if index not in self.storages:
+            return
+        # Ids missing from a filter that doesn't cover the index are looked up in storage until it is rebuilt
+        self._filters.pop(index, None)
+        self._built.pop(index, None)
+        # Building takes a while, the generations listener must not wait for it
+        task = asyncio.create_task(self._update(index, generation))
+        self._rebuilds.add(task)
+        task.add_done_callback(self._rebuilds.discard)
+
+    async def run(self) -> None:
+        """Keep the filters up to date until cancelled."""
+        while True:
+            await self.update_all()
+            if len(self._built) < len(self.storages):
+                await asyncio.sleep(_RETRY_SECONDS)
+                continue
+            # A filter mapped from another worker's file expires with that file
+            built_at = min(built_at for _, built_at in self._built.values())
+            await asyncio.sleep(max(_RETRY_SECONDS, built_at + self.refresh_interval - time.time()))
+
+    async def _update(self, index: str, generation: int) -> None:
+        try:
+            await self.update(index, generation)
+        except (DataStorageError, ApiError, OSError) as e:
+            logger.error('Failed to rebuild id filter of %s: %s', index, e)
+
+    async def _build(self, index: str, path: Path, generation: int) -> None:
+        storage = self.storages[index]
+        count = await storage.count()
+        bloom = BloomFilter(max(_MIN_CAPACITY, math.ceil(count * _CAPACITY_HEADROOM)), self.error_rate)
+        added = 0
+        async for id in storage.ids():
+            bloom.add(id)
+            added += 1
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(_HEADER.pack(generation, time.time(), bloom.size, bloom.hashes))
+                f.write(bloom.bits)
+            os.replace(temporary, path)
+        finally:
+            temporary.unlink(missing_ok=True)
+        logger.info('Built id filter of %s, generation %s, %s ids, %s bytes', index, generation, added, len(bloom.bits))
+
+    def _map(self, index: str, path: Path, generation: int) -> bool:
+        """Map the file of the filter if it is of the generation and not due a rebuild, returns whether it was."""
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            return False
+        try:
+            file_generation, built_at, size, hashes = _HEADER.unpack_from(mapped)
+        except struct.error:
+            return False
+        if file_generation != generation or time.time() - built_at > self.refresh_interval:
+            return False
+        if self._built.get(index) != (generation, built_at):
+            # A previous mapping is unmapped once lookups in it are done
+            self._filters[index] = BloomFilter.from_bits(size, hashes, memoryview(mapped)[_HEADER.size:])
+            self._built[index] = (generation, built_at)
+            logger.info('Mapped id filter of %s, generation %s', index, generation)
+        return True
+
+
+@asynccontextmanager
+async def _file_lock(path: Path) -> AsyncIterator[None]:
+    """Exclusive lock of the workers of a host, polled so that waiting for it can be cancelled."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as f:
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                await asyncio.sleep(_LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+id_filters: IdFilters | None = None
+
+
+def get_id_filters() -> IdFilters | None:
+    return id_filters
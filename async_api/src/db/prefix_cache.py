@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Tuple
+
+from core.config import settings
+
+
+class PrefixCache:
+    """
+    In-process LRU of responses to search box prefixes.
+
+    A few short prefixes get most of the typing traffic, so even a small cache answers most of it without
+    leaving the worker. Entries belong to a generation, e.g. the cache generations of the indices they were
+    read from: when it changes the whole cache is dropped. Entries also expire after ttl seconds, to bound
+    staleness when data changes without a generation bump.
+    """
+
+    def __init__(
+        self, max_size: int = settings.suggest_cache_size, ttl: float = settings.suggest_cache_ttl_seconds
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._generation: Hashable = None
+        self._entries: OrderedDict[Hashable, Tuple[float, bytes]] = OrderedDict()
+
+    def get(self, generation: Hashable, key: Hashable) -> bytes | None:
+        self._roll_over(generation)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, generation: Hashable, key: Hashable, value: bytes) -> None:
+        self._roll_over(generation)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _roll_over(self, generation: Hashable) -> None:
+        if generation != self._generation:
+            self._entries.clear()
+            self._generation = generation
+
+
+suggest_cache = PrefixCache()
+
+
+def get_suggest_cache() -> PrefixCache | None:
+    return suggest_cache if settings.suggest_cache_enabled else None
@@ -0,0 +1,85 @@
+from typing import Any, Dict, List, Literal
+from uuid import UUID
+
+from pydantic import BaseModel, model_validator
+
+
+class Filters(BaseModel):
+    def cache_key(self) -> str:
+        return ''
+
+
+class FilmFilters(Filters):
+    genre_ids: List[UUID] = []
+    # Whether a film needs any or all of the genres
+    genres_match: Literal['any', 'all'] = 'any'
+    rating_from: float | None = None
+    rating_to: float | None = None
+    # A film needs any of the actors and any of the directors
+    actor_ids: List[UUID] = []
+    director_ids: List[UUID] = []
+
+    @model_validator(mode='after')
+    def check_rating_range(self) -> 'FilmFilters':
+        if self.rating_from is not None and self.rating_to is not None and self.rating_from > self.rating_to:
+            raise ValueError('rating_from must not be greater than rating_to')
+        return self
+
+    def cache_key(self) -> str:
+        """Canonical representation of the filters, a lone genre is keyed by its id only."""
+        has_rating = self.rating_from is not None or self.rating_to is not None
+        if len(self.genre_ids) <= 1 and not (has_rating or self.actor_ids or self.director_ids):
+            return str(self.genre_ids[0]) if self.genre_ids else ''
+        parts = []
+        if self.genre_ids:
+            parts.append(f'genres={self.genres_match}.{_ids_key(self.genre_ids)}')
+        if has_rating:
+            parts.append(f'rating={_number_key(self.rating_from)}-{_number_key(self.rating_to)}')
+        if self.actor_ids:
+            parts.append(f'actors={_ids_key(self.actor_ids)}')
+        if self.director_ids:
+            parts.append(f'directors={_ids_key(self.director_ids)}')
+        return '&'.join(parts)
+
+
+def build_query(clauses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Query matching documents that satisfy all clauses.
+
+    Clauses go to the filter context: they are not scored, and Elasticsearch caches their results per segment,
+    so repeated listings with the same filters don't re-evaluate them.
+    """
+    if not clauses:
+        return {}
+    return {'query': {'bool': {'filter': clauses}}}
+
+
+def build_film_query(filters: FilmFilters | None) -> Dict[str, Any]:
+    if not filters:
+        return {}
+    clauses = []
+    if filters.genre_ids:
+        if filters.genres_match == 'all':
+            clauses.extend(_nested_ids('genres', [genre_id]) for genre_id in filters.genre_ids)
+        else:
+            clauses.append(_nested_ids('genres', filters.genre_ids))
+    if filters.rating_from is not None or filters.rating_to is not None:
+        bounds = {'gte': filters.rating_from, 'lte': filters.rating_to}
+        clauses.append({'range': {'imdb_rating': {k: v for k, v in bounds.items() if v is not None}}})
+    if filters.actor_ids:
+        clauses.append(_nested_ids('actors', filters.actor_ids))
+    if filters.director_ids:
+        clauses.append(_nested_ids('directors', filters.director_ids))
+    return build_query(clauses)
+
+
+def _nested_ids(path: str, ids: List[UUID]) -> Dict[str, Any]:
+    return {'nested': {'path': path, 'query': {'terms': {f'{path}.id': [str(i) for i in ids]}}}}
+
+
+def _ids_key(ids: List[UUID]) -> str:
+    return ','.join(sorted({str(i) for i in ids}))
+
+
+def _number_key(value: float | None) -> str:
+    return '' if value is None else f'{value:g}'
@@ -0,0 +1,123 @@
+import logging
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Values under these keys describe the query structure rather than user input
+_STRUCTURAL_KEYS = {
+    'path', 'fields', 'type', 'operator', 'order', 'mode', 'score_mode', 'sort', '_source', 'from', 'size',
+}
+_PLACEHOLDER = '?'
+
+
+class SlowQuery(BaseModel):
+    index: str
+    shape: Dict[str, Any]
+    took_ms: float
+    es_took_ms: int | None = None
+    hits: int | None = None
+    timestamp: datetime
+    profile: List[Dict[str, Any]] | None = None
+
+
+class QueryLog:
+    def __init__(self, threshold_ms: float, size: int, profile_sample_rate: float = 0.0) -> None:
+        self.threshold_ms = threshold_ms
+        self.profile_sample_rate = profile_sample_rate
+        self._entries: deque[SlowQuery] = deque(maxlen=size)
+
+    def is_slow(self, took_ms: float) -> bool:
+        return took_ms >= self.threshold_ms
+
+    def should_profile(self) -> bool:
+        return self.profile_sample_rate > 0 and random.random() < self.profile_sample_rate
+
+    def record(
+        self, index: str, query_body: Dict[str, Any], took_ms: float, response: Dict[str, Any] | None
+    ) -> SlowQuery:
+        response = response or {}
+        total = (response.get('hits') or {}).get('total')
+        entry = SlowQuery(
+            index=index,
+            shape=normalize_query(query_body),
+            took_ms=round(took_ms, 3),
+            es_took_ms=response.get('took'),
+            hits=total.get('value') if isinstance(total, dict) else total,
+            timestamp=datetime.now(timezone.utc),
+        )
+        self._entries.append(entry)
+        logger.warning('Slow query to %s took %.1f ms (es %s ms, hits %s): %s',
+                       index, entry.took_ms, entry.es_took_ms, entry.hits, entry.shape)
+        return entry
+
+    def entries(self, limit: int | None = None) -> List[SlowQuery]:
+        entries = list(reversed(self._entries))
+        return entries[:limit] if limit else entries
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def normalize_query(query_body: Any, key: str | None = None) -> Any:
+    """Replace user supplied values of a query body with placeholders, keeping its structure."""
+    if key in _STRUCTURAL_KEYS:
+        return query_body
+    if isinstance(query_body, dict):
+        return {k: normalize_query(v, k) for k, v in query_body.items()}
+    if isinstance(query_body, list):
+        # Values of terms queries and the like vary in number, clauses are part of the structure
+        if all(not isinstance(v, (dict, list)) for v in query_body):
+            return [normalize_query(v, key) for v in query_body[:1]]
+        return [normalize_query(v, key) for v in query_body]
+    if isinstance(query_body, bool) or query_body is None:
+        return query_body
+    return _PLACEHOLDER
+
+
+def summarize_profile(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Keep per-shard timing breakdowns of a profiled search, dropping query descriptions."""
+    return [
+        {
+            'id': shard.get('id'),
+            'searches': [
+                {
+                    'query': [_summarize_profile_node(q) for q in search.get('query', [])],
+                    'rewrite_time': search.get('rewrite_time'),
+                    'collector': [_summarize_profile_node(c) for c in search.get('collector', [])],
+                }
+                for search in shard.get('searches', [])
+            ],
+        }
+        for shard in (response.get('profile') or {}).get('shards', [])
+    ]
+
+
+def _summarize_profile_node(node: Dict[str, Any]) -> Dict[str, Any]:
+    summary = {
+        'type': node.get('type') or node.get('name'),
+        'time_in_nanos': node.get('time_in_nanos'),
+    }
+    if node.get('reason'):
+        summary['reason'] = node['reason']
+    children = node.get('children')
+    if children:
+        summary['children'] = [_summarize_profile_node(c) for c in children]
+    return summary
+
+
+query_log = QueryLog(
+    threshold_ms=settings.es_slow_query_threshold_ms,
+    size=settings.es_slow_query_log_size,
+    profile_sample_rate=settings.es_profile_sample_rate,
+)
+
+
+def get_query_log() -> QueryLog:
+    return query_log
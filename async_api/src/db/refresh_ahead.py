@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+from redis import RedisError
+
+from core.config import settings
+from db.cache_generations import CacheGenerations, cache_generations
+from db.cache_storage import NEGATIVE_ENTRY, AbstractCacheStorage
+
+logger = logging.getLogger(__name__)
+
+_SCAN_INTERVAL_SECONDS = 5
+
+Loader = Callable[[], Awaitable[object]]
+
+
+class _TrackedKey:
+    __slots__ = ('loader', 'index', 'generation', 'hits')
+
+    def __init__(self, loader: Loader, index: str, generation: int) -> None:
+        self.loader = loader
+        self.index = index
+        self.generation = generation
+        self.hits = 0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated_at = time.monotonic()
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RefreshAhead:
+    """
+    Reloads frequently requested cache entries shortly before they expire.
+
+    Services report every access to a cached key together with a loader that fetches the entry from storage
+    and puts it back to the cache. Access counts are halved every window, so keys that stop being requested
+    are forgotten and expire as usual. Keys with enough hits are reloaded once their TTL drops below
+    refresh_before seconds, at most rate reloads per second. Because the TTL is read from the cache, a key
+    refreshed by one worker is skipped by the others.
+
+    Keys that are gone from the cache or belong to a previous cache generation of their index are forgotten,
+    they are tracked again when requested. Cached misses are left to expire.
+    """
+
+    def __init__(
+        self,
+        cache_storage: AbstractCacheStorage,
+        generations: CacheGenerations = cache_generations,
+        min_hits: int = settings.refresh_ahead_min_hits,
+        window: float = settings.refresh_ahead_window_seconds,
+        refresh_before: float = settings.refresh_ahead_before_seconds,
+        rate: float = settings.refresh_ahead_rate,
+        max_keys: int = settings.refresh_ahead_max_keys,
+    ) -> None:
+        self.cache_storage = cache_storage
+        self.generations = generations
+        self.min_hits = min_hits
+        self.window = window
+        self.refresh_before = refresh_before
+        self.max_keys = max_keys
+        self.refreshed = 0
+        self._bucket = TokenBucket(rate, burst=max(rate, 1))
+        self._keys: Dict[str, _TrackedKey] = {}
+        self._decayed_at = time.monotonic()
+
+    def track(self, key: str, loader: Loader, index: str) -> None:
+        """Count an access to a key of the index in its current cache generation."""
+        tracked = self._keys.get(key)
+        if tracked is None:
+            if len(self._keys) >= self.max_keys:
+                return
+            tracked = self._keys[key] = _TrackedKey(loader, index, self.generations.get(index))
+        tracked.hits += 1
+
+    def hot_keys(self) -> Dict[str, int]:
+        return {key: t.hits for key, t in self._keys.items() if t.hits >= self.min_hits}
+
+    async def run(self) -> None:
+        """Refresh hot keys until cancelled."""
+        while True:
+            await asyncio.sleep(_SCAN_INTERVAL_SECONDS)
+            try:
+                await self.refresh_due()
+            except RedisError as e:
+                logger.error('Failed to check hot cache keys: %s', e)
+
+    async def refresh_due(self) -> int:
+        self._decay()
+        self._forget_previous_generations()
+        hot = sorted(self.hot_keys().items(), key=lambda item: -item[1])
+        if not hot:
+            return 0
+        keys = [key for key, _ in hot]
+        due = []
+        for key, ttl in zip(keys, await self.cache_storage.ttl_many(keys)):
+            if ttl is None:
+                # Expired or evicted, the next request loads it
+                self._keys.pop(key, None)
+            elif ttl <= self.refresh_before:
+                due.append(key)
+        if not due:
+            return 0
+        refreshed = 0
+        for key, data in zip(due, await self.cache_storage.get_many(due)):
+            if data is None:
+                self._keys.pop(key, None)
+                continue
+            tracked = self._keys.get(key)
+            if tracked is None or data == NEGATIVE_ENTRY:
+                continue
+            await self._bucket.acquire()
+            try:
+                await tracked.loader()
+            except Exception as e:
+                logger.warning('Failed to refresh cache key %s: %r', key, e)
+                continue
+            refreshed += 1
+        self.refreshed += refreshed
+        if refreshed:
+            logger.info('Refreshed %s hot cache keys', refreshed)
+        return refreshed
+
+    def _forget_previous_generations(self) -> None:
+        for key, tracked in list(self._keys.items()):
+            if tracked.generation != self.generations.get(tracked.index):
+                del self._keys[key]
+
+    def _decay(self) -> None:
+        now = time.monotonic()
+        while now - self._decayed_at >= self.window:
+            self._decayed_at += self.window
+            for key, tracked in list(self._keys.items()):
+                tracked.hits //= 2
+                if not tracked.hits:
+                    del self._keys[key]
+
+
+refresh_ahead: RefreshAhead | None = None
+
+
+def get_refresh_ahead() -> RefreshAhead | None:
+    return refresh_ahead
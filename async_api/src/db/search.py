@@ -0,0 +1,115 @@
+import hashlib
+import json
+import re
+from typing import Any, Dict, List
+
+from elasticsearch import AsyncElasticsearch
+
+from core.config import settings
+
+_TERM_PATTERN = re.compile(r'\w+')
+_PLACEHOLDER_PATTERN = re.compile(r'{{(\w+)}}')
+# Suggestions are for the first words typed, later ones rarely narrow them down
+_MAX_SUGGEST_TERMS = 5
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+class SearchTemplate:
+    """
+    Full-text search over boosted fields of an index, stored in Elasticsearch as a mustache search template.
+
+    Stored templates are compiled once and cached by Elasticsearch, requests only send their parameters.
+    The template id includes a hash of its source, so a changed template is stored under a new id instead
+    of altering the one used by workers still running the previous version.
+
+    User input is reduced to its words before it is sent: multi_match does not interpret query syntax
+    anyway, and this way wildcards, quotes and operators can't make it to any other query type.
+    Queries expanding to more clauses than max_clauses are rejected.
+    """
+
+    def __init__(
+        self, name: str, fields: List[str], max_clauses: int = settings.search_max_clauses, tie_breaker: float = 0.3
+    ) -> None:
+        self.fields = fields
+        self.max_clauses = max_clauses
+        self.tie_breaker = tie_breaker
+        query = {
+            'multi_match': {
+                'query': '{{query}}', 'fields': fields, 'type': 'best_fields', 'tie_breaker': tie_breaker,
+            },
+        }
+        # Pagination values are numbers, so they are substituted without quotes
+        self.source = f'{{"query": {json.dumps(query)}, "from": {{{{from}}}}, "size": {{{{size}}}}}}'
+        self.id = f'{name}-{hashlib.sha1(self.source.encode()).hexdigest()[:8]}'
+
+    def params(self, query: str, limit: int, offset: int) -> Dict[str, Any] | None:
+        """Template parameters of a user query, None if it has no words to search for."""
+        terms = query_terms(query)
+        if not terms:
+            return None
+        if len(terms) * len(self.fields) > self.max_clauses:
+            raise SearchQueryError(f'Query is too long, at most {self.max_clauses // len(self.fields)} words allowed')
+        return {'query': ' '.join(terms), 'from': offset, 'size': limit}
+
+    def render(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """The query body the template expands to, as Elasticsearch renders it."""
+        return json.loads(_render(self.source, params))
+
+    async def store(self, elastic: AsyncElasticsearch) -> None:
+        await elastic.put_script(id=self.id, script={'lang': 'mustache', 'source': self.source})
+
+
+class Suggester:
+    """
+    Search-as-you-type over a sub-field indexed with an edge n-gram analyzer, so every word typed so far,
+    the last one possibly incomplete, is matched as a prefix of a word. Only the fields needed to show
+    a suggestion are fetched.
+    """
+
+    def __init__(self, field: str, source: List[str], sort: List[Dict[str, Any]] | None = None) -> None:
+        self.field = field
+        self.source = source
+        self.sort = sort or []
+
+    def body(self, prefix: str, limit: int) -> Dict[str, Any]:
+        return {
+            'query': {'match': {self.field: {'query': prefix, 'operator': 'and'}}},
+            '_source': self.source,
+            'sort': ['_score', *self.sort],
+            'size': limit,
+            'track_total_hits': False,
+        }
+
+
+def query_terms(text: str) -> List[str]:
+    """Words of user input, anything else there is not meant as query syntax."""
+    return _TERM_PATTERN.findall(text.lower())
+
+
+def suggest_prefix(text: str) -> str:
+    """Canonical form of text typed into a search box, empty if there is nothing to suggest for."""
+    return ' '.join(query_terms(text)[:_MAX_SUGGEST_TERMS])
+
+
+def _render(source: str, params: Dict[str, Any]) -> str:
+    # Elasticsearch escapes values substituted into JSON templates
+    def value(match: re.Match) -> str:
+        param = params.get(match.group(1), '')
+        return json.dumps(param)[1:-1] if isinstance(param, str) else json.dumps(param)
+    return _PLACEHOLDER_PATTERN.sub(value, source)
+
+
+SEARCH_TEMPLATES = {
+    settings.movies_index: SearchTemplate(
+        'movies_search', ['title^3', 'actors_names^2', 'directors_names^2', 'writers_names', 'description']),
+    settings.persons_index: SearchTemplate('personas_search', ['full_name']),
+}
+
+SUGGESTERS = {
+    settings.movies_index: Suggester(
+        'title.suggest', ['id', 'title', 'imdb_rating'], [{'imdb_rating': {'order': 'desc', 'missing': '_last'}}]),
+    settings.persons_index: Suggester('full_name.suggest', ['id', 'full_name']),
+}
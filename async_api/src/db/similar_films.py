@@ -0,0 +1,54 @@
+import logging
+from typing import Dict, List, Set
+from uuid import UUID
+
+import orjson
+from redis.asyncio import Redis
+
+logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = 'similar:film:'
+_WRITE_BATCH = 500
+
+
+class SimilarFilmsView:
+    """
+    Ids of the films most similar to every film, best first, so "more like this" is a single read
+    instead of an overlap query per page view.
+
+    The lists are computed offline from genres and persons of the films by jobs.similar_films and don't
+    expire, a rebuild overwrites them and deletes lists of films that are gone. Films without a rating are
+    left out, they can't be listed in a response.
+    """
+
+    def __init__(self, redis: Redis) -> None:
+        self.redis = redis
+
+    async def get(self, film_id: UUID) -> List[str] | None:
+        """Ids of films similar to the film, None if the film is not in the view."""
+        data = await self.redis.get(_key(film_id))
+        return orjson.loads(data) if data is not None else None
+
+    async def write(self, neighbors: Dict[str, List[str]]) -> int:
+        """Replace the whole view with the given lists, returning the number of films in it."""
+        film_ids = list(neighbors)
+        for start in range(0, len(film_ids), _WRITE_BATCH):
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for film_id in film_ids[start:start + _WRITE_BATCH]:
+                    pipe.set(_key(film_id), orjson.dumps(neighbors[film_id]))
+                await pipe.execute()
+        await self._delete_stale(set(film_ids))
+        logger.info('Wrote similar films of %s films', len(film_ids))
+        return len(film_ids)
+
+    async def _delete_stale(self, keep: Set[str]) -> None:
+        stale = [
+            key async for key in self.redis.scan_iter(match=f'{_KEY_PREFIX}*', count=_WRITE_BATCH)
+            if key.decode()[len(_KEY_PREFIX):] not in keep
+        ]
+        for start in range(0, len(stale), _WRITE_BATCH):
+            await self.redis.delete(*stale[start:start + _WRITE_BATCH])
+
+
+def _key(film_id: UUID | str) -> str:
+    return f'{_KEY_PREFIX}{film_id}'
@@ -0,0 +1,80 @@
+"""
+Switch indices to new cache generations, e.g. after reloading Elasticsearch data.
+
+A new generation of movies gets its person filmography view built, see jobs.filmography.
+
+    cd src
+    python -m jobs.cache_generations movies personas genres --prewarm
+"""
+import argparse
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List
+
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.cache_generations import CacheGenerations
+from db.data_storage import FilmDataStorage
+from db.filmography import FilmographyView
+from services.film import MOVIES_INDEX
+from services.genre import GENRES_INDEX
+from services.person import PERSONS_INDEX
+from services.warmup import build_cache_warmer
+
+logger = logging.getLogger(__name__)
+
+
+async def bump_generations(
+    indices: List[str],
+    prewarm: bool,
+    sources: Dict[str, str] | None = None,
+    switch: Callable[[], Awaitable[None]] | None = None,
+) -> Dict[str, int]:
+    """
+    Switch the indices to new cache generations together, returns the generation of every index.
+
+    With prewarm the new generations are filled before the switch. The filmography view of a new generation of
+    movies is always built before it. Both read the Elasticsearch indices of sources instead of the ones
+    the service reads. A release passes its alias switch as switch: it runs after the generations are filled,
+    and they are activated right after it.
+    """
+    redis = Redis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db)
+    elastic = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
+    generations = CacheGenerations()
+    try:
+        await generations.load(redis)
+        replaced = CacheGenerations(generations.all())
+        reserved = {index: await generations.reserve(redis, index) for index in indices}
+        if prewarm:
+            logger.info('Prewarming cache generations %s', reserved)
+            await build_cache_warmer(redis, elastic, generations.pinned(reserved), indices=sources).warm()
+        view = FilmographyView(redis, generations.pinned(reserved))
+        try:
+            if MOVIES_INDEX in indices:
+                # Filmographies are read in the generation of movies, so the new one is served with its view built
+                await view.build(FilmDataStorage(elastic, (sources or {}).get(MOVIES_INDEX, MOVIES_INDEX)))
+            if switch:
+                await switch()
+            await generations.activate(redis, reserved)
+        except Exception:
+            if MOVIES_INDEX in indices:
+                # The view of a generation that is never activated doesn't expire either
+                await view.delete()
+            raise
+        if MOVIES_INDEX in indices:
+            # The view of the replaced generation doesn't expire
+            await FilmographyView(redis, replaced).delete()
+    finally:
+        await redis.aclose()
+        await elastic.close()
+    return reserved
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('indices', nargs='+', choices=(MOVIES_INDEX, PERSONS_INDEX, GENRES_INDEX))
+    parser.add_argument('--prewarm', action='store_true', help='fill the new generation before switching to it')
+    arguments = parser.parse_args()
+    asyncio.run(bump_generations(arguments.indices, arguments.prewarm))
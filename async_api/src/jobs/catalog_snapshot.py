@@ -0,0 +1,173 @@
+"""
+Build the catalog snapshot workers map to serve films, persons and genres by id and top-rated listings
+without requests to Redis or Elasticsearch, see db.catalog_snapshot.
+
+The snapshot is written to a new file renamed over the previous one, workers switch to it within their refresh
+interval. With --watch the job keeps running and builds the snapshot again whenever an index moves to a new
+cache generation, and every CATALOG_SNAPSHOT_REBUILD_SECONDS for documents written without a release, the
+gunicorn master starts it this way.
+
+    cd src
+    python -m jobs.catalog_snapshot
+    python -m jobs.catalog_snapshot --path /dev/shm/catalog.snapshot --watch
+"""
+import argparse
+import asyncio
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, List, NamedTuple
+
+import orjson
+from elasticsearch import ApiError, AsyncElasticsearch
+from pydantic import ValidationError
+from redis import RedisError
+from redis.asyncio import Redis
+
+from api.v1 import schemas
+from core.config import settings
+from db.cache_generations import CacheGenerations
+from db.catalog_snapshot import SnapshotDocument, SnapshotFilm, write_snapshot
+from db.data_storage import DataStorage, DataStorageError
+from db.filmography import sort_films
+from models.film import Film
+from models.genre import Genre, Genres
+from models.person import Person
+from services.film import MOVIES_INDEX
+from services.genre import GENRES_INDEX
+from services.person import PERSONS_INDEX
+
+logger = logging.getLogger(__name__)
+
+
+class Catalog(NamedTuple):
+    films: List[SnapshotFilm]
+    persons: List[SnapshotDocument]
+    genres: List[SnapshotDocument]
+    all_genres: bytes
+
+
+class CatalogRenderer:
+    """
+    Renders documents of the indices the way the services respond with them, a batch at a time.
+
+    Films go first, the filmographies of persons are made of their summaries.
+    """
+
+    def __init__(self) -> None:
+        self.films: List[SnapshotFilm] = []
+        self.persons: List[SnapshotDocument] = []
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+
+    def add_films(self, films: Iterable[Dict[str, Any]]) -> None:
+        for doc in films:
+            try:
+                film = Film(**doc)
+            except ValidationError:
+                # Films without a rating can't be rendered, the services don't respond with them either
+                continue
+            summary = schemas.Film.from_orm(film)
+            self._summaries[film.id] = summary.model_dump(mode='json')
+            self.films.append(SnapshotFilm(
+                film.id,
+                schemas.FilmDetailed.from_orm(film).model_dump_json().encode(),
+                summary.model_dump_json().encode(),
+                film.imdb_rating,
+                [genre.id for genre in film.genres],
+            ))
+
+    def add_persons(self, persons: Iterable[Dict[str, Any]]) -> None:
+        for doc in persons:
+            person = Person(**doc)
+            person_films = sort_films(
+                [self._summaries[str(f.id)] for f in person.films if str(f.id) in self._summaries])
+            self.persons.append(SnapshotDocument(
+                str(person.id),
+                schemas.PersonWithFilms(id=person.id, name=person.name, films=person.films).model_dump_json().encode(),
+                orjson.dumps(person_films) if person_films else b'',
+            ))
+
+    def catalog(self, genres: Iterable[Dict[str, Any]]) -> Catalog:
+        all_genres = sorted((Genre(**doc) for doc in genres), key=lambda genre: genre.id)
+        rendered_genres = [SnapshotDocument(genre.id, genre.model_dump_json().encode()) for genre in all_genres]
+        return Catalog(self.films, self.persons, rendered_genres, Genres(genres=all_genres).model_dump_json().encode())
+
+
+def render_catalog(
+    films: Iterable[Dict[str, Any]], persons: Iterable[Dict[str, Any]], genres: Iterable[Dict[str, Any]]
+) -> Catalog:
+    """Render documents of the indices the way the services respond with them."""
+    renderer = CatalogRenderer()
+    renderer.add_films(films)
+    renderer.add_persons(persons)
+    return renderer.catalog(genres)
+
+
+def _batches(storage: DataStorage) -> AsyncIterator[List[Dict[str, Any]]]:
+    return storage.export(batch_size=settings.export_batch_size)
+
+
+async def build_snapshot(redis: Redis, elastic: AsyncElasticsearch, path: Path) -> None:
+    generations = CacheGenerations()
+    # Generations are read first, a release during the build leaves the snapshot in the previous generation
+    await generations.load(redis)
+    # Documents are rendered as they are read, only the rendered catalog is held in full
+    renderer = CatalogRenderer()
+    async for batch in _batches(DataStorage(elastic, MOVIES_INDEX)):
+        renderer.add_films(batch)
+    async for batch in _batches(DataStorage(elastic, PERSONS_INDEX)):
+        renderer.add_persons(batch)
+    catalog = renderer.catalog([doc async for batch in _batches(DataStorage(elastic, GENRES_INDEX)) for doc in batch])
+    write_snapshot(path, generations.all(), catalog.films, catalog.persons, catalog.genres, catalog.all_genres)
+
+
+async def run(path: Path, watch: bool) -> None:
+    redis = Redis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db)
+    elastic = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
+    try:
+        if not watch:
+            await build_snapshot(redis, elastic, path)
+            return
+        if not settings.catalog_snapshot_enabled:
+            logger.info('Catalog snapshot is disabled')
+            return
+        changed = asyncio.Event()
+
+        async def on_generation(index: str, generation: int) -> None:
+            logger.info('%s moved to cache generation %s, rebuilding catalog snapshot', index, generation)
+            changed.set()
+
+        generations = CacheGenerations()
+        try:
+            # Known generations don't call for a rebuild once the listener subscribes
+            await generations.load(redis)
+        except RedisError as e:
+            logger.error('Failed to load cache generations: %s', e)
+        generations.add_listener(on_generation)
+        listener = asyncio.create_task(generations.listen(redis))
+        try:
+            while True:
+                changed.clear()
+                try:
+                    await build_snapshot(redis, elastic, path)
+                except (DataStorageError, RedisError, ApiError) as e:
+                    logger.error('Failed to build catalog snapshot: %s', e)
+                    await asyncio.sleep(settings.catalog_snapshot_refresh_seconds)
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), settings.catalog_snapshot_rebuild_seconds)
+                except asyncio.TimeoutError:
+                    logger.info('Rebuilding catalog snapshot built %s s ago',
+                                settings.catalog_snapshot_rebuild_seconds)
+        finally:
+            listener.cancel()
+    finally:
+        await redis.aclose()
+        await elastic.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', type=Path, default=Path(settings.catalog_snapshot_path))
+    parser.add_argument('--watch', action='store_true', help='rebuild on cache generation changes and periodically')
+    arguments = parser.parse_args()
+    asyncio.run(run(arguments.path, arguments.watch))
@@ -0,0 +1,51 @@
+"""
+Build the person filmography view from the movies index, or update it after some films changed.
+
+The view is written in the current cache generation of movies. Jobs that switch movies to a new generation,
+jobs.cache_generations, jobs.load_es and jobs.indices, build it themselves.
+
+    cd src
+    python -m jobs.filmography
+    python -m jobs.filmography --films 3d8d9bf5-0d90-4353-88ba-4ccc5d2c07ff ...
+"""
+import argparse
+import asyncio
+import logging
+from typing import List
+from uuid import UUID
+
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.cache_generations import CacheGenerations
+from db.data_storage import FilmDataStorage
+from db.filmography import FilmographyView
+from services.film import MOVIES_INDEX
+
+logger = logging.getLogger(__name__)
+
+
+async def update_filmography(film_ids: List[UUID]) -> None:
+    redis = Redis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db)
+    elastic = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
+    generations = CacheGenerations()
+    film_storage = FilmDataStorage(elastic, MOVIES_INDEX)
+    try:
+        await generations.load(redis)
+        view = FilmographyView(redis, generations)
+        if film_ids:
+            persons = await view.update_films(film_storage, film_ids)
+        else:
+            persons = await view.build(film_storage)
+        logger.info('Filmographies of %s persons written', persons)
+    finally:
+        await redis.aclose()
+        await elastic.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--films', nargs='+', type=UUID, default=[], help='update persons of these films only')
+    arguments = parser.parse_args()
+    asyncio.run(update_filmography(arguments.films))
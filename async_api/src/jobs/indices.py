@@ -0,0 +1,139 @@
+"""
+Release a new version of indices: load the dumps into versioned indices, e.g. movies_v3, switch the read aliases
+the service queries to them in one atomic request, and move the caches of the indices to new generations
+right after it. --prewarm fills the new generations from the new versions before the switch.
+
+The movies index is sorted by rating and id, the order of listings and top films, so those queries stop early instead
+of collecting every matching film. The previous versions are kept for a rollback, older ones are deleted.
+An alias name still taken by an index loaded before aliases were used replaces that index.
+
+    cd src
+    python -m jobs.indices ../../infra/es_data
+    python -m jobs.indices /data --indices movies --prewarm --keep 2
+"""
+import argparse
+import asyncio
+import logging
+import re
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple
+
+from elasticsearch import AsyncElasticsearch
+
+from core.config import settings
+from jobs.cache_generations import bump_generations
+from jobs.load_es import CHUNK_SIZE, CONCURRENCY, gather_or_cancel, load_index
+
+logger = logging.getLogger(__name__)
+
+# Read aliases by the names of the dumps
+_ALIASES = {
+    'movies': settings.movies_index,
+    'personas': settings.persons_index,
+    'genres': settings.genres_index,
+}
+_INDEX_SORT = {
+    # Listings break rating ties by id, see DataStorage._get_sort_field
+    'movies': {'sort.field': ['imdb_rating', 'id'], 'sort.order': ['desc', 'asc'], 'sort.missing': ['_last', '_last']},
+}
+# Previous versions kept to switch back to
+_KEEP = 1
+
+
+class IndexVersion(NamedTuple):
+    name: str
+    version: int
+    aliased: bool
+
+
+def version_name(alias: str, version: int) -> str:
+    return f'{alias}_v{version}'
+
+
+async def index_versions(elastic: AsyncElasticsearch, alias: str) -> List[IndexVersion]:
+    """Versioned indices of the alias, oldest first."""
+    pattern = re.compile(rf'{re.escape(alias)}_v(\d+)')
+    response = await elastic.indices.get_alias(index=f'{alias}_v*')
+    versions = [
+        IndexVersion(name, int(match.group(1)), alias in info.get('aliases', {}))
+        for name, info in response.items()
+        if (match := pattern.fullmatch(name))
+    ]
+    return sorted(versions, key=lambda v: v.version)
+
+
+async def switch_aliases(elastic: AsyncElasticsearch, targets: Dict[str, str]) -> None:
+    """Point every alias at its target index, all at once, so no search sees a mix of versions."""
+    actions: List[Dict[str, Any]] = []
+    for alias, target in targets.items():
+        if await elastic.indices.exists_alias(name=alias):
+            actions.extend(
+                {'remove': {'index': v.name, 'alias': alias}}
+                for v in await index_versions(elastic, alias) if v.aliased
+            )
+        elif await elastic.indices.exists(index=alias):
+            logger.info('Replacing index %s with an alias', alias)
+            actions.append({'remove_index': {'index': alias}})
+        actions.append({'add': {'index': target, 'alias': alias}})
+    await elastic.indices.update_aliases(actions=actions)
+    for alias, target in targets.items():
+        logger.info('Alias %s points at %s', alias, target)
+
+
+async def _prune(elastic: AsyncElasticsearch, alias: str, keep: int) -> None:
+    previous = [v for v in await index_versions(elastic, alias) if not v.aliased]
+    for version in previous[:max(len(previous) - keep, 0)]:
+        await elastic.indices.delete(index=version.name)
+        logger.info('Deleted %s', version.name)
+
+
+async def release(
+    data_dir: Path,
+    dumps: List[str],
+    chunk_size: int = CHUNK_SIZE,
+    concurrency: int = CONCURRENCY,
+    sort: bool = True,
+    prewarm: bool = False,
+    keep: int = _KEEP,
+) -> Dict[str, str]:
+    """Load new versions of the indices of the dumps and switch to them, returns the new index of every alias."""
+    elastic = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
+    try:
+        targets = {}
+        for dump in dumps:
+            alias = _ALIASES[dump]
+            versions = await index_versions(elastic, alias)
+            targets[alias] = version_name(alias, versions[-1].version + 1 if versions else 1)
+        try:
+            await gather_or_cancel(*(
+                load_index(elastic, data_dir, dump, chunk_size, concurrency,
+                           target=targets[_ALIASES[dump]], overrides=_INDEX_SORT.get(dump) if sort else None)
+                for dump in dumps
+            ))
+        except Exception:
+            # Nothing reads the new indices yet, a half-loaded version is not worth keeping
+            await elastic.indices.delete(index=','.join(targets.values()), ignore_unavailable=True)
+            raise
+        # New generations are filled from the new versions first, and all of them are activated right after
+        # the switch, so cached responses of the previous versions are not served any longer
+        await bump_generations(list(targets), prewarm, targets, partial(switch_aliases, elastic, targets))
+        for alias in targets:
+            await _prune(elastic, alias, keep)
+    finally:
+        await elastic.close()
+    return targets
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_dir', type=Path, help='directory with the dumps')
+    parser.add_argument('--indices', nargs='+', default=list(_ALIASES), choices=list(_ALIASES))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='documents per bulk request')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='bulk requests in flight per index')
+    parser.add_argument('--no-sort', dest='sort', action='store_false', help='do not sort the new indices')
+    parser.add_argument('--prewarm', action='store_true', help='fill the new cache generations before switching')
+    parser.add_argument('--keep', type=int, default=_KEEP, help='previous versions to keep for a rollback')
+    arguments = parser.parse_args()
+    asyncio.run(release(arguments.data_dir, arguments.indices, arguments.chunk_size, arguments.concurrency,
+                        arguments.sort, arguments.prewarm, arguments.keep))
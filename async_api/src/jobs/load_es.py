@@ -0,0 +1,184 @@
+"""
+Load elasticdump dumps of the indices, <index>_settings.json, <index>_mapping.json and <index>_data.json,
+into Elasticsearch with the bulk API.
+
+Indices are loaded concurrently, each by several bulk requests in flight, with refreshes and replicas turned
+off until the index is loaded. Documents are streamed from the dumps, they are never read into memory at once.
+A document Elasticsearch rejects aborts the whole load: the bulk helper raises on errors (raise_on_error),
+the other loads are cancelled, and every index gets its settings back.
+Loaded indices the service reads then move to new cache generations, so workers stop serving cached responses
+of the previous data and rebuild their id filters. Indices already released as versions behind aliases, see
+jobs.indices, are not loaded, a new version is released instead.
+
+    cd src
+    python -m jobs.load_es ../../infra/es_data
+    python -m jobs.load_es /data --indices movies personas --chunk-size 2000 --concurrency 8 --recreate
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Dict, Iterator, List, NamedTuple
+
+from elasticsearch import AsyncElasticsearch
+from elasticsearch.helpers import async_streaming_bulk
+
+from core.config import settings
+from jobs.cache_generations import bump_generations
+
+logger = logging.getLogger(__name__)
+
+_INDICES = ('movies', 'personas', 'genres')
+CHUNK_SIZE = 1000
+CONCURRENCY = 4
+# Settings of the dumps that describe an existing index rather than configure a new one
+_READ_ONLY_SETTINGS = ('creation_date', 'provided_name', 'uuid', 'version')
+# Index settings while loading: no refreshes and nothing to replicate, both are restored afterwards
+_LOAD_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+
+
+class AliasedIndexError(Exception):
+    pass
+
+
+class LoadStats(NamedTuple):
+    index: str
+    docs: int
+    seconds: float
+
+    @property
+    def docs_per_second(self) -> float:
+        return self.docs / self.seconds if self.seconds else 0.0
+
+
+def _read_dump_json(path: Path) -> Dict[str, Any]:
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # elasticdump may write settings and mappings as a JSON string
+    return json.loads(data) if isinstance(data, str) else data
+
+
+def _index_settings(data_dir: Path, index: str) -> Dict[str, Any]:
+    (dump,) = _read_dump_json(data_dir / f'{index}_settings.json').values()
+    return {k: v for k, v in dump['settings']['index'].items() if k not in _READ_ONLY_SETTINGS}
+
+
+def _index_mappings(data_dir: Path, index: str) -> Dict[str, Any]:
+    (dump,) = _read_dump_json(data_dir / f'{index}_mapping.json').values()
+    return dump['mappings']
+
+
+def _actions(data_dir: Path, index: str, target: str) -> Iterator[Dict[str, Any]]:
+    """Bulk index actions of the documents of a data dump, one line at a time."""
+    with open(data_dir / f'{index}_data.json', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                hit = json.loads(line)
+                yield {'_index': target, '_id': hit['_id'], '_source': hit['_source']}
+
+
+async def gather_or_cancel(*aws: Awaitable[Any]) -> List[Any]:
+    """Like asyncio.gather, but the first failure cancels the rest and waits for them to clean up."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _bulk(elastic: AsyncElasticsearch, actions: Iterator[Dict[str, Any]], chunk_size: int) -> int:
+    # raise_on_error is left on: a rejected document raises BulkIndexError rather than being skipped
+    docs = 0
+    async for _ in async_streaming_bulk(elastic, actions, chunk_size=chunk_size, max_retries=3, yield_ok=True):
+        docs += 1
+    return docs
+
+
+async def load_index(
+    elastic: AsyncElasticsearch,
+    data_dir: Path,
+    index: str,
+    chunk_size: int = CHUNK_SIZE,
+    concurrency: int = CONCURRENCY,
+    recreate: bool = False,
+    target: str | None = None,
+    overrides: Dict[str, Any] | None = None,
+) -> LoadStats:
+    """
+    Create the index from its dumps, or reuse an existing one, and index all documents of its data dump.
+
+    The documents go to the target index if given rather than the one named after the dumps, a new index gets
+    the settings of the dump updated with overrides.
+    """
+    target = target or index
+    index_settings = {**_index_settings(data_dir, index), **(overrides or {})}
+    if recreate:
+        await elastic.indices.delete(index=target, ignore_unavailable=True)
+    if await elastic.indices.exists(index=target):
+        await elastic.indices.put_settings(index=target, settings=_LOAD_SETTINGS)
+    else:
+        await elastic.indices.create(
+            index=target, settings={**index_settings, **_LOAD_SETTINGS}, mappings=_index_mappings(data_dir, index))
+
+    started = time.perf_counter()
+    try:
+        # Consumers take turns pulling from one generator, so every document is sent once
+        actions = _actions(data_dir, index, target)
+        docs = sum(await gather_or_cancel(*(_bulk(elastic, actions, chunk_size) for _ in range(concurrency))))
+    finally:
+        await elastic.indices.put_settings(index=target, settings={
+            'refresh_interval': index_settings.get('refresh_interval', '1s'),
+            'number_of_replicas': index_settings.get('number_of_replicas', 1),
+        })
+    await elastic.indices.refresh(index=target)
+    stats = LoadStats(target, docs, time.perf_counter() - started)
+    logger.info('Loaded %s documents into %s in %.1f s, %.0f docs/s',
+                stats.docs, target, stats.seconds, stats.docs_per_second)
+    return stats
+
+
+async def load(
+    data_dir: Path,
+    indices: List[str],
+    chunk_size: int = CHUNK_SIZE,
+    concurrency: int = CONCURRENCY,
+    recreate: bool = False,
+) -> List[LoadStats]:
+    elastic = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
+    started = time.perf_counter()
+    try:
+        # Writing through the alias of a released version would change it in place, under every reader
+        aliases = [index for index in indices if await elastic.indices.exists_alias(name=index)]
+        if aliases:
+            raise AliasedIndexError(f'{", ".join(aliases)} are aliases of released versions, use jobs.indices')
+        stats = await gather_or_cancel(*(
+            load_index(elastic, data_dir, index, chunk_size, concurrency, recreate) for index in indices
+        ))
+    finally:
+        await elastic.close()
+    seconds = time.perf_counter() - started
+    docs = sum(s.docs for s in stats)
+    logger.info('Loaded %s documents into %s indices in %.1f s, %.0f docs/s',
+                docs, len(indices), seconds, docs / seconds if seconds else 0.0)
+    served = [index for index in indices if index in (settings.movies_index, settings.persons_index,
+                                                      settings.genres_index)]
+    if served:
+        await bump_generations(served, prewarm=False)
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('data_dir', type=Path, help='directory with the dumps')
+    parser.add_argument('--indices', nargs='+', default=list(_INDICES))
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='documents per bulk request')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='bulk requests in flight per index')
+    parser.add_argument('--recreate', action='store_true', help='delete existing indices first')
+    arguments = parser.parse_args()
+    asyncio.run(load(arguments.data_dir, arguments.indices, arguments.chunk_size, arguments.concurrency,
+                     arguments.recreate))
@@ -0,0 +1,108 @@
+"""
+Compute the most similar films of every film from the movies index and write them to the similar films view.
+
+Films are similar when they share persons: candidates of a film are the films sharing a person with it, so
+the pairs scored come from a sparse product and grow with the filmographies rather than with the square of
+the catalog. The score of a pair is the weighted sum of the Jaccard similarity of their person sets and of
+their genre sets, genres only rank films that already share a person.
+
+    cd src
+    python -m jobs.similar_films
+    python -m jobs.similar_films --top 20 --genre-weight 0.5
+"""
+import argparse
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Tuple
+
+import numpy as np
+from elasticsearch import AsyncElasticsearch
+from redis.asyncio import Redis
+from scipy import sparse
+
+from core.config import settings
+from db.data_storage import FILM_PERSON_ROLES, FilmDataStorage
+from db.similar_films import SimilarFilmsView
+from services.film import MOVIES_INDEX
+
+logger = logging.getLogger(__name__)
+
+_FILM_FIELDS = ['id', 'imdb_rating', 'genres', *FILM_PERSON_ROLES]
+_TOP = 10
+# Shared persons say more about a film than shared genres, most films share a genre with many others
+_GENRE_WEIGHT = 0.3
+
+
+def nearest_films(
+    films: List[Dict[str, Any]], top: int = _TOP, genre_weight: float = _GENRE_WEIGHT
+) -> Dict[str, List[str]]:
+    """Ids of the top most similar films of every film, best first, films sharing no person are not listed."""
+    ids = [film['id'] for film in films]
+    genres, genre_counts = _incidence(({genre['id'] for genre in film.get('genres') or []} for film in films), len(ids))
+    persons, person_counts = _incidence(
+        ({person['id'] for role in FILM_PERSON_ROLES for person in film.get(role) or []} for film in films), len(ids))
+    ratings = np.array([film['imdb_rating'] for film in films], dtype=np.float32)
+
+    # Pairs of films sharing a person, with the number of persons they share; a film is not similar to itself
+    shared = sparse.triu(persons @ persons.T, k=1).tocoo()
+    rows, columns = np.concatenate([shared.row, shared.col]), np.concatenate([shared.col, shared.row])
+    shared_persons = np.concatenate([shared.data, shared.data])
+    shared_genres = np.asarray(genres[rows].multiply(genres[columns]).sum(axis=1), dtype=np.float32).ravel()
+    scores = (
+        (1 - genre_weight) * _jaccard(shared_persons, person_counts[rows], person_counts[columns])
+        + genre_weight * _jaccard(shared_genres, genre_counts[rows], genre_counts[columns])
+    )
+
+    # Candidates of every film, best first, films scoring the same by rating
+    order = np.lexsort((-ratings[columns], -scores, rows))
+    rows, columns = rows[order], columns[order]
+    starts = np.searchsorted(rows, np.arange(len(ids)))
+    ranks = np.arange(len(rows)) - starts[rows]
+    neighbors: Dict[str, List[str]] = {film_id: [] for film_id in ids}
+    for row, column in zip(rows[ranks < top], columns[ranks < top]):
+        neighbors[ids[row]].append(ids[column])
+    return neighbors
+
+
+def _incidence(id_sets: Iterable[Iterable[str]], films_count: int) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    """Films by ids matrix with ones where the film has the id, and the number of ids of every film."""
+    columns: Dict[str, int] = {}
+    indptr, indices = [0], []
+    for film_ids in id_sets:
+        indices.extend(columns.setdefault(i, len(columns)) for i in film_ids)
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    incidence = sparse.csr_matrix((data, indices, indptr), shape=(films_count, max(len(columns), 1)))
+    return incidence, np.diff(incidence.indptr).astype(np.float32)
+
+
+def _jaccard(shared: np.ndarray, sizes: np.ndarray, other_sizes: np.ndarray) -> np.ndarray:
+    """Jaccard similarity of pairs of id sets from the number of ids they share and their sizes."""
+    union = sizes + other_sizes - shared
+    return np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+
+async def _rated_films(film_storage: FilmDataStorage) -> List[Dict[str, Any]]:
+    return [film async for film in film_storage.scan(_FILM_FIELDS) if film.get('imdb_rating') is not None]
+
+
+async def update_similar_films(top: int = _TOP, genre_weight: float = _GENRE_WEIGHT) -> None:
+    redis = Redis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db)
+    elastic = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
+    try:
+        films = await _rated_films(FilmDataStorage(elastic, MOVIES_INDEX))
+        neighbors = nearest_films(films, top, genre_weight)
+        written = await SimilarFilmsView(redis).write(neighbors)
+        logger.info('Similar films of %s films written', written)
+    finally:
+        await redis.aclose()
+        await elastic.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=_TOP, help='similar films to keep per film')
+    parser.add_argument('--genre-weight', type=float, default=_GENRE_WEIGHT,
+                        help='weight of genre similarity, persons get the rest')
+    arguments = parser.parse_args()
+    asyncio.run(update_similar_films(arguments.top, arguments.genre_weight))
@@ -1,27 +1,84 @@
+import asyncio
+import contextlib
 import logging
 from contextlib import asynccontextmanager
+from pathlib import Path
 
 import uvicorn
 import aiohttp
 from elasticsearch import AsyncElasticsearch
 from fastapi import FastAPI
 from fastapi.responses import ORJSONResponse
+from redis import RedisError
 from redis.asyncio import Redis
 
-from api.v1 import films, genres, persons
+from api.v1 import admin, films, genres, health, persons, suggest
 from core.config import settings
 from core.logger import LOGGING
-from db import elastic, redis
+from core.profiler import ProfilingMiddleware, profiler
+from db import catalog_snapshot, elastic, embedded_storage, hot_keys, id_filter, redis, refresh_ahead
+from db.cache_generations import cache_generations
+from db.cache_storage import RedisCacheStorage
+from db.catalog_snapshot import CatalogSnapshotFile
+from db.embedded_storage import EmbeddedCatalogFile
+from db.failover_storage import make_data_storage, make_film_data_storage
+from db.hot_keys import HotKeys
+from db.id_filter import IdFilters
+from db.refresh_ahead import RefreshAhead
+from services import warmup
+from services.film import MOVIES_INDEX
+from services.genre import GENRES_INDEX
+from services.person import PERSONS_INDEX
+from services.warmup import build_cache_warmer
 import http_client
 
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    redis.redis = Redis(host=settings.redis_host, port=settings.redis_port)
+    redis.redis = Redis(host=settings.redis_host, port=settings.redis_port, db=settings.redis_db)
     elastic.es = AsyncElasticsearch(hosts=[f'http://{settings.elastic_host}:{settings.elastic_port}'])
     http_client.session = aiohttp.ClientSession()
+    try:
+        await cache_generations.load(redis.redis)
+    except RedisError as e:
+        logger.error('Failed to load cache generations: %s', e)
+    background_tasks = [asyncio.create_task(cache_generations.listen(redis.redis))]
+    if settings.data_storage_backend == 'embedded' or settings.data_storage_failover:
+        embedded_storage.embedded_catalog = EmbeddedCatalogFile(
+            Path(settings.embedded_catalog_path or settings.catalog_snapshot_path))
+        if settings.data_storage_backend == 'embedded':
+            # The only storage has to be there before the first request
+            await embedded_storage.embedded_catalog.reload()
+        background_tasks.append(asyncio.create_task(embedded_storage.embedded_catalog.run()))
+    embedded = embedded_storage.embedded_catalog
+    if settings.hot_keys_enabled:
+        hot_keys.hot_keys = HotKeys()
+        background_tasks.append(asyncio.create_task(hot_keys.hot_keys.run(redis.redis)))
+    if settings.id_filter_enabled:
+        id_filter.id_filters = IdFilters({
+            MOVIES_INDEX: make_film_data_storage(elastic.es, MOVIES_INDEX, embedded),
+            PERSONS_INDEX: make_data_storage(elastic.es, PERSONS_INDEX, embedded),
+            GENRES_INDEX: make_data_storage(elastic.es, GENRES_INDEX, embedded),
+        })
+        cache_generations.add_listener(id_filter.id_filters.on_generation)
+        background_tasks.append(asyncio.create_task(id_filter.id_filters.run()))
+    if settings.catalog_snapshot_enabled:
+        catalog_snapshot.snapshot_file = CatalogSnapshotFile(Path(settings.catalog_snapshot_path))
+        background_tasks.append(asyncio.create_task(catalog_snapshot.snapshot_file.run()))
+    if settings.warmup_enabled:
+        warmup.cache_warmer = build_cache_warmer(redis.redis, elastic.es, cache_generations, embedded)
+        background_tasks.append(asyncio.create_task(warmup.cache_warmer.run()))
+    if settings.refresh_ahead_enabled:
+        refresh_ahead.refresh_ahead = RefreshAhead(RedisCacheStorage(redis.redis))
+        background_tasks.append(asyncio.create_task(refresh_ahead.refresh_ahead.run()))
     yield
-    await redis.redis.close()
+    for task in background_tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await redis.redis.aclose()
     await elastic.es.close()
     await http_client.session.close()
 
@@ -34,10 +91,16 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler, secret=settings.profiling_secret)
+
 
 app.include_router(films.router, prefix='/api/v1/films', tags=['films'])
 app.include_router(genres.router, prefix='/api/v1/genres', tags=['genres'])
 app.include_router(persons.router, prefix='/api/v1/persons', tags=['persons'])
+app.include_router(suggest.router, prefix='/api/v1/suggest', tags=['suggest'])
+app.include_router(admin.router, prefix='/api/v1/admin', tags=['admin'])
+app.include_router(health.router, prefix='/api/v1/health', tags=['health'])
 
 
 if __name__ == '__main__':
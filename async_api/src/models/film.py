@@ -1,13 +1,13 @@
 from typing import Any, List
 
-from pydantic import BaseModel, field_validator
+from pydantic import AliasChoices, BaseModel, Field, field_validator
 
 from models.genre import Genre
 from models.person import PersonBase
 
 
 class Film(BaseModel):
-    id: str
+    id: str = Field(validation_alias=AliasChoices('id', 'uuid'))
     title: str
     description: str
     imdb_rating: float
@@ -20,3 +20,8 @@ class Film(BaseModel):
     @classmethod
     def apply_default_description_on_none(cls, v: Any) -> Any:
         return '' if v is None else v
+
+
+class FilmAccess(BaseModel):
+    """Part of a cached film response needed to decide whether a user may see it."""
+    imdb_rating: float
@@ -1,12 +1,20 @@
-from typing import List
+from typing import Dict, List
 
-from pydantic import BaseModel
+from pydantic import AliasChoices, BaseModel, Field
 
 
 class Genre(BaseModel):
-    id: str
+    id: str = Field(validation_alias=AliasChoices('id', 'uuid'))
     name: str
 
 
 class Genres(BaseModel):
     genres: List[Genre]
+
+
+class GenreStats(Genre):
+    films_count: int
+
+
+class GenreFilmCounts(BaseModel):
+    counts: Dict[str, int]
@@ -1,11 +1,11 @@
 from typing import Any, List, Dict
 from uuid import UUID
 
-from pydantic import BaseModel, root_validator
+from pydantic import AliasChoices, BaseModel, Field, root_validator
 
 
 class PersonBase(BaseModel):
-    id: UUID
+    id: UUID = Field(validation_alias=AliasChoices('id', 'uuid'))
     name: str
 
     @root_validator(pre=True)
@@ -15,5 +15,10 @@ class PersonBase(BaseModel):
         return values
 
 
+class PersonFilm(BaseModel):
+    id: UUID = Field(validation_alias=AliasChoices('id', 'uuid'))
+    roles: List[str] = []
+
+
 class Person(PersonBase):
-    films: List = []
+    films: List[PersonFilm] = []
@@ -0,0 +1,97 @@
+import logging
+import zlib
+from contextlib import aclosing
+from functools import lru_cache
+from typing import AsyncIterator, Collection, List
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+from fastapi import Depends
+
+from core.config import settings
+from db.data_storage import DataStorage, DataStorageError
+from db.elastic import get_elastic
+from db.embedded_storage import EmbeddedCatalogFile, get_embedded_catalog
+from db.failover_storage import make_data_storage
+from services.film import MOVIES_INDEX
+from services.person import PERSONS_INDEX
+
+logger = logging.getLogger(__name__)
+
+# Top-level fields of the index mappings
+MOVIES_FIELDS = (
+    'id', 'title', 'description', 'imdb_rating', 'genres', 'actors', 'writers', 'directors',
+    'actors_names', 'writers_names', 'directors_names',
+)
+PERSONS_FIELDS = ('id', 'full_name', 'films')
+# Window bits of zlib for the gzip container
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class ExportServiceError(Exception):
+    pass
+
+
+class ExportFieldsError(ExportServiceError):
+    pass
+
+
+class ExportService:
+    """
+    All documents of an index as NDJSON, a document per line in id order.
+
+    Documents are read a page at a time and every page is sent on as soon as it is encoded, so memory does not
+    grow with the index, and a slow client slows down reading instead of piling up pages. An interrupted export
+    is resumed after the id of the last complete line.
+    """
+
+    def __init__(
+        self,
+        data_storage: DataStorage,
+        index: str,
+        fields: Collection[str],
+        batch_size: int = settings.export_batch_size,
+    ) -> None:
+        self.data_storage = data_storage
+        self.index = index
+        self.fields = fields
+        self.batch_size = batch_size
+
+    async def export(self, fields: List[str], after: str | None = None, compress: bool = False) -> AsyncIterator[bytes]:
+        """Chunks of NDJSON with the given fields of documents, or all fields, optionally compressed with gzip."""
+        unknown = set(fields) - set(self.fields)
+        if unknown:
+            raise ExportFieldsError(f'Unknown fields: {", ".join(sorted(unknown))}')
+        # The id is always exported, exports are resumed by it
+        source = sorted({'id', *fields}) if fields else None
+        logger.info('Exporting %s, fields %s, after %s', self.index, source, after)
+
+        compressor = zlib.compressobj(wbits=_GZIP_WBITS) if compress else None
+        try:
+            # Closed right away when the client goes away, which releases the point in time being read
+            async with aclosing(self.data_storage.export(source, after, self.batch_size)) as batches:
+                async for docs in batches:
+                    chunk = b''.join(orjson.dumps(doc, option=orjson.OPT_APPEND_NEWLINE) for doc in docs)
+                    # Flushed with every page, so the client can decode what it has got so far
+                    yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH) if compressor else chunk
+        except DataStorageError as e:
+            logger.error('Failed to export %s after %s: %s', self.index, after, e)
+            raise ExportServiceError
+        if compressor:
+            yield compressor.flush()
+
+
+@lru_cache()
+def get_film_export_service(
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        embedded: EmbeddedCatalogFile | None = Depends(get_embedded_catalog),
+) -> ExportService:
+    return ExportService(make_data_storage(elastic, MOVIES_INDEX, embedded), MOVIES_INDEX, MOVIES_FIELDS)
+
+
+@lru_cache()
+def get_person_export_service(
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        embedded: EmbeddedCatalogFile | None = Depends(get_embedded_catalog),
+) -> ExportService:
+    return ExportService(make_data_storage(elastic, PERSONS_INDEX, embedded), PERSONS_INDEX, PERSONS_FIELDS)
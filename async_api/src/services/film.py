@@ -1,22 +1,34 @@
-from functools import lru_cache
-from typing import List
+from functools import lru_cache, partial
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Sequence
 from uuid import UUID
 import logging
-import orjson
 
 from fastapi import Depends
+from pydantic import TypeAdapter
 from redis.asyncio import Redis
 from redis import RedisError
 
 from elasticsearch import AsyncElasticsearch
+from core.config import settings
 from db.elastic import get_elastic
-from db.data_storage import FilmDataStorage, DataStorageError, FilmFilters
+from db.data_storage import FilmDataStorage, DataStorageError, FilmFilters, InvalidQueryError
 from db.redis import get_redis
-from db.cache_storage import RedisCacheStorage, AbstractCacheStorage
-from models.film import Film
+from db.cache_storage import NEGATIVE_CACHE_EXPIRE_IN_SECONDS, NEGATIVE_ENTRY, RedisCacheStorage, AbstractCacheStorage
+from db.cache_generations import CacheGenerations, cache_generations
+from db.catalog_snapshot import CatalogSnapshot, CatalogSnapshotFile, get_snapshot_file
+from db.embedded_storage import EmbeddedCatalogFile, get_embedded_catalog
+from db.failover_storage import make_film_data_storage
+from db.hot_keys import FILMS, PAGES, SEARCHES, HotKeys, get_hot_keys
+from db.id_filter import IdFilters, get_id_filters
+from db.refresh_ahead import RefreshAhead, get_refresh_ahead
+from db.similar_films import SimilarFilmsView
+from models.film import Film, FilmAccess
+from api.v1 import schemas
 
+MOVIES_INDEX = settings.movies_index
 _FILM_CACHE_EXPIRE_IN_SECONDS = 60 * 5  # 5 minutes
 _CACHE_PREFIX = 'films'
+_FILMS_RESPONSE = TypeAdapter(List[schemas.Film])
 
 logger = logging.getLogger(__name__)
 
@@ -25,117 +37,282 @@ class FilmServiceError(Exception):
     pass
 
 
+class FilmQueryError(FilmServiceError):
+    pass
+
+
+class RawFilm(NamedTuple):
+    # Response-shaped JSON of a film, ready to be sent as is
+    content: bytes
+    access: FilmAccess
+
+
 class FilmService:
-    def __init__(self, cache_storage: AbstractCacheStorage, film_data_storage: FilmDataStorage) -> None:
+    def __init__(
+        self,
+        cache_storage: AbstractCacheStorage,
+        film_data_storage: FilmDataStorage,
+        generations: CacheGenerations = cache_generations,
+        refresh_ahead: RefreshAhead | None = None,
+        hot_keys: HotKeys | None = None,
+        id_filters: IdFilters | None = None,
+        similar_films: SimilarFilmsView | None = None,
+        snapshot: CatalogSnapshotFile | None = None,
+    ) -> None:
         self.cache_storage = cache_storage
         self.film_data_storage = film_data_storage
+        self.generations = generations
+        self.refresh_ahead = refresh_ahead
+        self.hot_keys = hot_keys
+        self.id_filters = id_filters
+        self.similar_films = similar_films
+        self.snapshot = snapshot
 
-    async def get_films(self, genre_id: UUID | None, limit: int = 50, offset: int = 0) -> List[Film]:
-        logger.info('Getting films, genre %s, limit %s offset %s', genre_id, limit, offset)
-        films = await self._get_films_from_cache(genre_id, limit, offset)
-        if films is None:
-            films = await self._get_films_from_storage(genre_id, limit, offset)
-            if films:
-                await self._put_films_to_cache(films, genre_id, limit, offset)
-        return films
+    async def get_films(self, filters: FilmFilters, limit: int = 50, offset: int = 0) -> bytes:
+        """Return a response-shaped JSON list of films sorted by rating."""
+        logger.info('Getting films, filters %s, limit %s offset %s', filters, limit, offset)
+        self._count(PAGES, f'{filters.cache_key()}:{limit}:{offset}')
+        data = self._films_from_snapshot(filters, limit, offset)
+        if data is not None:
+            return data
+        key = self._films_cache_key(filters, limit, offset)
+        self._track(key, partial(self._load_films, key, filters, limit, offset))
+        data = await self._get_from_cache(key)
+        if data is None:
+            data = await self._load_films(key, filters, limit, offset)
+        return data
 
     async def get_films_by_query(self, query: str, limit: int = 50, offset: int = 0) -> List[Film]:
         logger.info('Getting films by query %s, limit %s offset %s', query, limit, offset)
+        self._count(SEARCHES, f'{MOVIES_INDEX}:{query.strip().lower()}')
         return await self._get_films_by_query_from_storage(query, limit, offset)
 
     async def get_film_by_id(self, film_id: UUID) -> Film | None:
         logger.info('Getting film by id %s', film_id)
-        film = await self._get_film_from_cache(film_id)
-        if not film:
-            film = await self._get_film_from_storage(film_id)
-            if not film:
+        data = await self._get_film_json(film_id)
+        return Film.model_validate_json(data) if data else None
+
+    async def get_films_by_ids(self, film_ids: Sequence[UUID]) -> List[Film]:
+        """Get several films with one cache round trip, films missing everywhere or without a rating are skipped."""
+        logger.info('Getting %s films by ids', len(film_ids))
+        found: Dict[UUID, Film] = {}
+        snapshot = self._snapshot()
+        if snapshot:
+            for film_id in film_ids:
+                data = snapshot.film(film_id)
+                if data:
+                    found[film_id] = Film.model_validate_json(data)
+        missing = [film_id for film_id in film_ids if film_id not in found]
+        if missing:
+            found.update(await self._get_films_by_ids_from_cache(missing))
+        return [found[film_id] for film_id in film_ids if film_id in found]
+
+    async def get_similar_films(self, film_id: UUID) -> bytes | None:
+        """Return a response-shaped JSON list of films similar to a film, best first, None if there is no such film."""
+        logger.info('Getting films similar to %s', film_id)
+        if self.id_filters and not self.id_filters.might_contain(MOVIES_INDEX, film_id):
+            logger.info('Film %s is not in the id filter', film_id)
+            return None
+        similar_ids = await self._similar_ids_from_view(film_id)
+        if similar_ids is None:
+            # Films without a rating and films added after the view was built have no similar films yet
+            if not await self._get_film_json(film_id):
                 return None
-            await self._put_film_to_cache(film)
-        return film
+            similar_ids = []
+        films = await self.get_films_by_ids(similar_ids)
+        return _FILMS_RESPONSE.dump_json(_FILMS_RESPONSE.validate_python(films, from_attributes=True))
+
+    async def get_raw_film(self, film_id: UUID) -> RawFilm | None:
+        """Get cached response bytes of a film, parsing only the fields needed for access checks."""
+        logger.info('Getting raw film by id %s', film_id)
+        data = await self._get_film_json(film_id)
+        return RawFilm(data, FilmAccess.model_validate_json(data)) if data else None
 
-    async def _get_films_from_storage(self, genre_id: UUID | None, limit: int, offset: int) -> List[Film]:
-        logger.info('Getting films from storage, genre %s, limit %s, offset %s', genre_id, limit, offset)
+    async def _get_film_json(self, film_id: UUID) -> bytes | None:
+        self._count(FILMS, str(film_id))
+        if self.id_filters and not self.id_filters.might_contain(MOVIES_INDEX, film_id):
+            logger.info('Film %s is not in the id filter', film_id)
+            return None
+        snapshot = self._snapshot()
+        # Films added without a release are not in the snapshot yet
+        data = snapshot.film(film_id) if snapshot else None
+        if data:
+            return data
+        key = self._film_cache_key(film_id)
+        self._track(key, partial(self._load_film_json, key, film_id))
+        data = await self._get_from_cache(key)
+        if data is None:
+            data = await self._load_film_json(key, film_id)
+        return data or None
+
+    async def _get_films_by_ids_from_cache(self, film_ids: Sequence[UUID]) -> Dict[UUID, Film]:
+        keys = [self._film_cache_key(film_id) for film_id in film_ids]
+        for key, film_id in zip(keys, film_ids):
+            self._track(key, partial(self._load_film_json, key, film_id))
         try:
-            films = await self.film_data_storage.list(
-                limit=limit, offset=offset, sort_by='-imdb_rating', filters=FilmFilters(genre_id=genre_id))
-        except DataStorageError as e:
-            logger.error('Failed to get films from storage, genre %s, limit %s, offset %s: %s',
-                         genre_id, limit, offset, e)
-            raise FilmServiceError
-        return [Film(**f) for f in films]
+            cached = await self.cache_storage.get_many(keys)
+        except RedisError as e:
+            logger.error('Failed to check cache to get %s films by ids: %s', len(film_ids), e)
+            cached = [None] * len(keys)
 
-    async def _get_films_from_cache(self, genre_id: UUID | None, limit: int, offset: int) -> List[Film] | None:
-        logger.info('Checking cache to get films by params, genre %s, limit %s, offset %s', genre_id, limit, offset)
+        missing = [film_id for film_id, data in zip(film_ids, cached) if data is None]
+        fetched = await self._get_films_by_ids_from_storage(missing)
+        new_entries = {
+            self._film_cache_key(film_id): schemas.FilmDetailed.from_orm(film).model_dump_json().encode()
+            for film_id, film in fetched.items() if film
+        }
         try:
-            data = await self.cache_storage.get(self._films_cache_key(genre_id, limit, offset))
+            await self.cache_storage.set_many(new_entries, _FILM_CACHE_EXPIRE_IN_SECONDS)
         except RedisError as e:
-            logger.error('Failed to check cache to get films by params, genre %s, limit %s, offset %s: %s',
-                         genre_id, limit, offset, e)
+            logger.error('Failed to put %s films to cache: %s', len(new_entries), e)
+
+        films = {}
+        for film_id, data in zip(film_ids, cached):
+            if data:
+                films[film_id] = Film.model_validate_json(data)
+            elif data is None and fetched[film_id]:
+                films[film_id] = fetched[film_id]
+        return films
+
+    def _films_from_snapshot(self, filters: FilmFilters, limit: int, offset: int) -> bytes | None:
+        """Pages of all films or of a lone genre by rating, None if the snapshot can't serve the filters."""
+        has_rating = filters.rating_from is not None or filters.rating_to is not None
+        if len(filters.genre_ids) > 1 or has_rating or filters.actor_ids or filters.director_ids:
             return None
-        if not data:
+        snapshot = self._snapshot()
+        if not snapshot:
             return None
-        return [Film.parse_obj(f) for f in orjson.loads(data)]
+        return snapshot.films_page(filters.genre_ids[0] if filters.genre_ids else None, limit, offset)
+
+    def _snapshot(self) -> CatalogSnapshot | None:
+        return self.snapshot.get(MOVIES_INDEX) if self.snapshot else None
 
-    async def _put_films_to_cache(self, films: List[Film], genre_id: UUID | None, limit: int, offset: int) -> None:
-        logger.info('Putting films got by params genre %s, limit %s, offset %s to cache', genre_id, limit, offset)
-        key = self._films_cache_key(genre_id, limit, offset)
-        data = orjson.dumps([f.dict() for f in films])
+    async def _load_films(self, key: str, filters: FilmFilters, limit: int, offset: int) -> bytes:
+        films = await self._get_films_from_storage(filters, limit, offset)
+        data = _FILMS_RESPONSE.dump_json(_FILMS_RESPONSE.validate_python(films, from_attributes=True))
+        if films:
+            await self._put_to_cache(key, data)
+        return data
+
+    async def _load_film_json(self, key: str, film_id: UUID) -> bytes | None:
         try:
-            await self.cache_storage.set(key, data)
-        except RedisError as e:
-            logger.error('Failed to put films got by params genre %s, limit %s, offset %s to cache: %s',
-                         genre_id, limit, offset, e)
+            film = await self._find_film(film_id)
+        except DataStorageError as e:
+            logger.error('Failed to get film from storage by id %s: %s', film_id, e)
+            return None
+        if not film:
+            await self._put_to_cache(key, NEGATIVE_ENTRY, NEGATIVE_CACHE_EXPIRE_IN_SECONDS)
+            return None
+        data = schemas.FilmDetailed.from_orm(film).model_dump_json().encode()
+        await self._put_to_cache(key, data)
+        return data
+
+    async def _get_films_from_storage(self, filters: FilmFilters, limit: int, offset: int) -> List[Film]:
+        logger.info('Getting films from storage, filters %s, limit %s, offset %s', filters, limit, offset)
+        try:
+            films = await self.film_data_storage.list(
+                limit=limit, offset=offset, sort_by='-imdb_rating', filters=filters)
+        except DataStorageError as e:
+            logger.error('Failed to get films from storage, filters %s, limit %s, offset %s: %s',
+                         filters, limit, offset, e)
+            raise FilmServiceError
+        return _rated_films(films)
 
     async def _get_films_by_query_from_storage(self, query: str, limit: int, offset: int) -> List[Film]:
         logger.info('Getting films from storage by query %s, limit %s, offset %s', query, limit, offset)
         try:
             films = await self.film_data_storage.search(query, limit=limit, offset=offset)
+        except InvalidQueryError as e:
+            logger.info('Invalid film query %s: %s', query, e)
+            raise FilmQueryError(str(e))
         except DataStorageError as e:
             logger.error('Failed to get films from storage by query %s, limit %s, offset %s: %s',
                          query, limit, offset, e)
             raise FilmServiceError
-        return [Film(**f) for f in films]
+        return _rated_films(films)
 
-    async def _get_film_from_storage(self, film_id: UUID) -> Film | None:
-        logger.info('Getting film from storage by id %s', film_id)
+    async def _get_films_by_ids_from_storage(self, film_ids: Sequence[UUID]) -> Dict[UUID, Film | None]:
         try:
-            film = await self.film_data_storage.get(id=film_id)
+            films = await self.film_data_storage.get_many(film_ids)
         except DataStorageError as e:
-            logger.error('Failed to get film from storage by id %s: %s', film_id, e)
-            return None
+            logger.error('Failed to get %s films from storage by ids: %s', len(film_ids), e)
+            films = {}
+        rated = {film.id: film for film in _rated_films(list(films.values()))}
+        return {film_id: rated.get(str(film_id)) for film_id in film_ids}
+
+    async def _find_film(self, film_id: UUID) -> Film | None:
+        logger.info('Getting film from storage by id %s', film_id)
+        film = await self.film_data_storage.get(id=film_id)
         return Film(**film) if film else None
 
-    async def _get_film_from_cache(self, film_id: UUID) -> Film | None:
-        logger.info('Checking cache to get film by id %s', film_id)
+    async def _similar_ids_from_view(self, film_id: UUID) -> List[str] | None:
+        if not self.similar_films:
+            return None
         try:
-            data = await self.cache_storage.get(self._film_cache_key(film_id))
+            return await self.similar_films.get(film_id)
         except RedisError as e:
-            logger.error('Failed to check cache to get film by id %s: %s', film_id, e)
+            logger.error('Failed to get films similar to %s: %s', film_id, e)
             return None
 
-        if not data:
+    async def _get_from_cache(self, key: str) -> bytes | None:
+        logger.info('Checking cache by key %s', key)
+        try:
+            return await self.cache_storage.get(key)
+        except RedisError as e:
+            logger.error('Failed to check cache by key %s: %s', key, e)
             return None
-        return Film.parse_raw(data)
 
-    async def _put_film_to_cache(self, film: Film) -> None:
-        logger.info('Putting film with id %s to cache', film.id)
+    async def _put_to_cache(self, key: str, data: bytes, expire_in: int = _FILM_CACHE_EXPIRE_IN_SECONDS) -> None:
+        logger.info('Putting data to cache by key %s', key)
         try:
-            await self.cache_storage.set(self._film_cache_key(film.id), film.json())
+            await self.cache_storage.set(key, data, expire_in)
         except RedisError as e:
-            logger.error('Failed to put film with id %s to cache: %s', film.id, e)
+            logger.error('Failed to put data to cache by key %s: %s', key, e)
+
+    def _track(self, key: str, loader: Callable[[], Awaitable[bytes | None]]) -> None:
+        if self.refresh_ahead:
+            self.refresh_ahead.track(key, loader, MOVIES_INDEX)
+
+    def _count(self, category: str, key: str) -> None:
+        if self.hot_keys:
+            self.hot_keys.add(category, key)
+
+    def _film_cache_key(self, film_id: UUID) -> str:
+        return self.generations.key(MOVIES_INDEX, f'{_CACHE_PREFIX}:details:{film_id}')
+
+    def _films_cache_key(self, filters: FilmFilters, limit: int, offset: int) -> str:
+        return self.generations.key(MOVIES_INDEX, f'{_CACHE_PREFIX}:page:{filters.cache_key()}_{limit}_{offset}')
+
 
-    @staticmethod
-    def _film_cache_key(film_id: UUID) -> str:
-        return f'{_CACHE_PREFIX}:{film_id}'
+def _rated_films(films: List[Dict[str, Any]]) -> List[Film]:
+    """
+    Films of a listing, search or lookup by ids that have a rating.
 
-    @staticmethod
-    def _films_cache_key(genre_id: UUID | None, limit: int, offset: int) -> str:
-        return f'{_CACHE_PREFIX}:{genre_id or ""}_{limit}_{offset}'
+    A film without a rating can't be put in a response, it would fail the whole page. Such films sort last in
+    listings, so only the last page comes out short; the catalog snapshot doesn't list them either.
+    """
+    rated = [Film(**f) for f in films if f.get('imdb_rating') is not None]
+    if len(rated) < len(films):
+        logger.warning('Skipped %s films without a rating', len(films) - len(rated))
+    return rated
 
 
 @lru_cache()
 def get_film_service(
         redis: Redis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
+        refresh_ahead: RefreshAhead | None = Depends(get_refresh_ahead),
+        hot_keys: HotKeys | None = Depends(get_hot_keys),
+        id_filters: IdFilters | None = Depends(get_id_filters),
+        snapshot: CatalogSnapshotFile | None = Depends(get_snapshot_file),
+        embedded: EmbeddedCatalogFile | None = Depends(get_embedded_catalog),
 ) -> FilmService:
-    return FilmService(RedisCacheStorage(redis), FilmDataStorage(elastic, 'movies'))
+    return FilmService(
+        RedisCacheStorage(redis),
+        make_film_data_storage(elastic, MOVIES_INDEX, embedded),
+        refresh_ahead=refresh_ahead,
+        hot_keys=hot_keys,
+        id_filters=id_filters,
+        similar_films=SimilarFilmsView(redis),
+        snapshot=snapshot,
+    )
@@ -1,48 +1,125 @@
-import json
 import logging
 from functools import lru_cache
-from typing import List
+from typing import Dict, List
 from uuid import UUID
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
 from redis.asyncio import Redis
 
+from core.config import settings
 from db.elastic import get_elastic
-from db.data_storage import DataStorage
+from db.data_storage import DataStorage, FilmDataStorage
 from db.redis import get_redis
-from db.cache_storage import RedisCacheStorage, AbstractCacheStorage
-from models.genre import Genre, Genres
+from db.cache_storage import NEGATIVE_CACHE_EXPIRE_IN_SECONDS, NEGATIVE_ENTRY, RedisCacheStorage, AbstractCacheStorage
+from db.cache_generations import CacheGenerations, cache_generations
+from db.catalog_snapshot import CatalogSnapshot, CatalogSnapshotFile, get_snapshot_file
+from db.embedded_storage import EmbeddedCatalogFile, get_embedded_catalog
+from db.failover_storage import make_data_storage, make_film_data_storage
+from db.id_filter import IdFilters, get_id_filters
+from db.refresh_ahead import RefreshAhead, get_refresh_ahead
+from services.film import MOVIES_INDEX
+from models.genre import Genre, GenreFilmCounts, Genres, GenreStats
 
 GENRE_ID_KEY_PREFIX = 'genre_id_'
 ALL_GENRES_KEY = 'all_genres'
+GENRES_INDEX = settings.genres_index
+# Film counts depend on the movies index, so they are cached in its generation
+FILM_COUNTS_KEY = 'genres:film_counts'
 
 logger = logging.getLogger(__name__)
 
 
 class GenreService:
-    def __init__(self, cache_storage: AbstractCacheStorage, genre_data_storage: DataStorage):
+    def __init__(
+        self,
+        cache_storage: AbstractCacheStorage,
+        genre_data_storage: DataStorage,
+        generations: CacheGenerations = cache_generations,
+        refresh_ahead: RefreshAhead | None = None,
+        id_filters: IdFilters | None = None,
+        film_data_storage: FilmDataStorage | None = None,
+        snapshot: CatalogSnapshotFile | None = None,
+    ):
         self.cache_storage = cache_storage
         self.genre_data_storage = genre_data_storage
+        self.film_data_storage = film_data_storage
+        self.generations = generations
+        self.refresh_ahead = refresh_ahead
+        self.id_filters = id_filters
+        self.snapshot = snapshot
 
     async def get_by_id(self, genre_id: UUID) -> Genre | None:
-        genre = await self._genre_from_cache(genre_id)
-        if not genre:
-            genre = await self._get_genre_from_storage(genre_id)
-            if not genre:
-                return None
-            await self._put_genre_to_cache(genre)
+        if self.id_filters and not self.id_filters.might_contain(GENRES_INDEX, genre_id):
+            logger.info('Genre %s is not in the id filter', genre_id)
+            return None
+        snapshot = self._snapshot()
+        data = snapshot.genre(genre_id) if snapshot else None
+        if data:
+            return Genre.model_validate_json(data)
+        data = await self._genre_from_cache(genre_id)
+        if data == NEGATIVE_ENTRY:
+            return None
+        if data:
+            return Genre.model_validate_json(data)
 
+        genre = await self._get_genre_from_storage(genre_id)
+        if not genre:
+            await self._put_missing_genre_to_cache(genre_id)
+            return None
+        await self._put_genre_to_cache(genre)
         return genre
 
     async def get_all_genres(self) -> List[Genre] | None:
+        snapshot = self._snapshot()
+        genres = Genres.model_validate_json(snapshot.genres()).genres if snapshot else None
+        # A snapshot built before any genre was loaded doesn't mean there are none
+        if genres:
+            return genres
+        if self.refresh_ahead:
+            self.refresh_ahead.track(self._cache_key(ALL_GENRES_KEY), self._load_all_genres, GENRES_INDEX)
         genres = await self._all_genres_from_cache()
         if not genres:
-            genres = await self._get_all_genres_from_storage()
-            if not genres:
-                return None
-            await self._put_all_genres_to_cache(Genres(genres=genres))
+            genres = await self._load_all_genres()
+
+        return genres
+
+    async def get_genre_stats(self) -> List[GenreStats] | None:
+        """All genres with the number of their films, counted by one aggregation over the movies index."""
+        genres = await self.get_all_genres()
+        if not genres:
+            return None
+        key = self.generations.key(MOVIES_INDEX, FILM_COUNTS_KEY)
+        if self.refresh_ahead:
+            self.refresh_ahead.track(key, self._load_film_counts, MOVIES_INDEX)
+        counts = await self._film_counts_from_cache(key)
+        if counts is None:
+            counts = await self._load_film_counts()
+        return [GenreStats(id=genre.id, name=genre.name, films_count=counts.get(genre.id, 0)) for genre in genres]
+
+    async def _load_film_counts(self) -> Dict[str, int]:
+        try:
+            logger.info('Counting films by genre in db')
+            counts = await self.film_data_storage.count_by_genre()
+        except Exception as e:
+            logger.exception(e)
+            raise
+        await self.cache_storage.set(
+            self.generations.key(MOVIES_INDEX, FILM_COUNTS_KEY), GenreFilmCounts(counts=counts))
+        return counts
+
+    async def _film_counts_from_cache(self, key: str) -> Dict[str, int] | None:
+        data = await self.cache_storage.get(key)
+        if not data:
+            return None
+        logger.info('Got film counts by genre from cache')
+        return GenreFilmCounts.model_validate_json(data).counts
 
+    async def _load_all_genres(self) -> List[Genre] | None:
+        genres = await self._get_all_genres_from_storage()
+        if not genres:
+            return None
+        await self._put_all_genres_to_cache(Genres(genres=genres))
         return genres
 
     async def _get_genre_from_storage(self, genre_id: UUID) -> Genre | None:
@@ -63,36 +140,55 @@ class GenreService:
             raise
         return [Genre(**genre) for genre in genres]
 
-    async def _genre_from_cache(self, genre_id: UUID) -> Genre | None:
-        data = await self.cache_storage.get(f'{GENRE_ID_KEY_PREFIX}{genre_id}')
-        if not data:
-            return None
-
-        logger.info('Got genre from cache by id %s', genre_id)
-        genre = Genre.parse_raw(data)
-        return genre
+    async def _genre_from_cache(self, genre_id: UUID) -> bytes | None:
+        data = await self.cache_storage.get(self._cache_key(f'{GENRE_ID_KEY_PREFIX}{genre_id}'))
+        if data is not None:
+            logger.info('Got genre from cache by id %s', genre_id)
+        return data
 
     async def _put_genre_to_cache(self, genre: Genre):
         logger.info('Putting genre to cache. genre_id = %s', genre.id)
-        await self.cache_storage.set(f'{GENRE_ID_KEY_PREFIX}{genre.id}', genre.json())
+        await self.cache_storage.set(self._cache_key(f'{GENRE_ID_KEY_PREFIX}{genre.id}'), genre)
+
+    async def _put_missing_genre_to_cache(self, genre_id: UUID):
+        logger.info('Putting missing genre to cache. genre_id = %s', genre_id)
+        await self.cache_storage.set(
+            self._cache_key(f'{GENRE_ID_KEY_PREFIX}{genre_id}'), NEGATIVE_ENTRY, NEGATIVE_CACHE_EXPIRE_IN_SECONDS)
 
     async def _all_genres_from_cache(self) -> List[Genre] | None:
-        data = await self.cache_storage.get(ALL_GENRES_KEY)
+        data = await self.cache_storage.get(self._cache_key(ALL_GENRES_KEY))
         if not data:
             return None
 
         logger.info('Got all genres from cache')
-        genres = Genres.parse_raw(data)
+        genres = Genres.model_validate_json(data)
         return genres.genres
 
     async def _put_all_genres_to_cache(self, genres: Genres):
         logger.info('Putting all genres to cache')
-        await self.cache_storage.set(ALL_GENRES_KEY, json.dumps(genres.__dict__, default=lambda o: o.__dict__))
+        await self.cache_storage.set(self._cache_key(ALL_GENRES_KEY), genres)
+
+    def _snapshot(self) -> CatalogSnapshot | None:
+        return self.snapshot.get(GENRES_INDEX) if self.snapshot else None
+
+    def _cache_key(self, key: str) -> str:
+        return self.generations.key(GENRES_INDEX, key)
 
 
 @lru_cache()
 def get_genre_service(
         redis: Redis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
+        refresh_ahead: RefreshAhead | None = Depends(get_refresh_ahead),
+        id_filters: IdFilters | None = Depends(get_id_filters),
+        snapshot: CatalogSnapshotFile | None = Depends(get_snapshot_file),
+        embedded: EmbeddedCatalogFile | None = Depends(get_embedded_catalog),
 ) -> GenreService:
-    return GenreService(RedisCacheStorage(redis), DataStorage(elastic, 'genres'))
+    return GenreService(
+        RedisCacheStorage(redis),
+        make_data_storage(elastic, GENRES_INDEX, embedded),
+        refresh_ahead=refresh_ahead,
+        id_filters=id_filters,
+        film_data_storage=make_film_data_storage(elastic, MOVIES_INDEX, embedded),
+        snapshot=snapshot,
+    )
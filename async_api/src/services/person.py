@@ -1,59 +1,124 @@
 import logging
-from functools import lru_cache
+from functools import lru_cache, partial
 from typing import List
 from uuid import UUID
 
 from elasticsearch import AsyncElasticsearch
 from fastapi import Depends
+import orjson
+from redis import RedisError
 from redis.asyncio import Redis
 
+from core.config import settings
 from db.elastic import get_elastic
-from db.data_storage import DataStorage
+from db.data_storage import DataStorage, InvalidQueryError
 from db.redis import get_redis
-from db.cache_storage import RedisCacheStorage, AbstractCacheStorage
+from db.cache_storage import (
+    CACHE_EXPIRE_IN_SECONDS, NEGATIVE_CACHE_EXPIRE_IN_SECONDS, NEGATIVE_ENTRY, RedisCacheStorage, AbstractCacheStorage
+)
+from db.cache_generations import CacheGenerations, cache_generations
+from db.catalog_snapshot import CatalogSnapshotFile, get_snapshot_file
+from db.embedded_storage import EmbeddedCatalogFile, get_embedded_catalog
+from db.failover_storage import make_data_storage
+from db.filmography import FilmographyView, sort_films
+from db.hot_keys import PERSONS, SEARCHES, HotKeys, get_hot_keys
+from db.id_filter import IdFilters, get_id_filters
+from db.refresh_ahead import RefreshAhead, get_refresh_ahead
 from models.person import Person
-from models.film import Film
-from services.film import get_film_service, FilmService
+from services.film import MOVIES_INDEX, get_film_service, FilmService
+from api.v1 import schemas
 
-PERSON_ID_KEY_PREFIX = 'person_id_'
+# Cached persons are response-shaped, see PersonService.get_raw_person
+PERSON_KEY_PREFIX = 'person_details_'
+PERSONS_INDEX = settings.persons_index
 
 logger = logging.getLogger(__name__)
 
 
+class PersonQueryError(Exception):
+    pass
+
+
 class PersonService:
     def __init__(
-        self, cache_storage: AbstractCacheStorage, person_data_storage: DataStorage, film_service: FilmService
+        self,
+        cache_storage: AbstractCacheStorage,
+        person_data_storage: DataStorage,
+        film_service: FilmService,
+        generations: CacheGenerations = cache_generations,
+        refresh_ahead: RefreshAhead | None = None,
+        hot_keys: HotKeys | None = None,
+        id_filters: IdFilters | None = None,
+        filmography: FilmographyView | None = None,
+        snapshot: CatalogSnapshotFile | None = None,
     ) -> None:
         self.cache_storage = cache_storage
         self.person_data_storage = person_data_storage
         self.film_service = film_service
+        self.generations = generations
+        self.refresh_ahead = refresh_ahead
+        self.hot_keys = hot_keys
+        self.id_filters = id_filters
+        self.filmography = filmography
+        self.snapshot = snapshot
 
     async def search(self, query: str, limit: int, offset: int) -> List[Person] | None:
+        if self.hot_keys:
+            self.hot_keys.add(SEARCHES, f'{PERSONS_INDEX}:{query.strip().lower()}')
         return await self._search_persons_in_storage(query, limit, offset)
 
     async def get_by_id(self, person_id: UUID) -> Person | None:
-        person = await self._person_from_cache(person_id)
-        if not person:
-            person = await self._get_person_from_storage(person_id)
+        data = await self._get_person_json(person_id)
+        return Person.model_validate_json(data) if data else None
+
+    async def get_raw_person(self, person_id: UUID) -> bytes | None:
+        """Get response-shaped JSON of a person, ready to be sent as is."""
+        return await self._get_person_json(person_id)
+
+    async def get_raw_films(self, person_id: UUID) -> bytes | None:
+        """Get response-shaped JSON list of films of a person sorted by rating, None if there are none."""
+        # Filmographies join persons with movies, so the snapshot has to be up to date with both
+        snapshot = self.snapshot.get(PERSONS_INDEX, MOVIES_INDEX) if self.snapshot else None
+        if snapshot and snapshot.person(person_id) is not None:
+            return snapshot.person_films(person_id)
+        films = await self._filmography_from_view(person_id)
+        if films is None:
+            person = await self.get_by_id(person_id)
             if not person:
                 return None
-            await self._put_person_to_cache(person)
-
-        return person
-
-    async def get_films(self, person_id: UUID) -> List[Film] | None:
-        person = await self._person_from_cache(person_id)
+            person_films = await self.film_service.get_films_by_ids([film.id for film in person.films])
+            films = sort_films([schemas.Film.from_orm(film).model_dump(mode='json') for film in person_films])
+            await self._put_filmography(person_id, films)
+        return orjson.dumps(films) if films else None
+
+    async def _get_person_json(self, person_id: UUID) -> bytes | None:
+        if self.hot_keys:
+            self.hot_keys.add(PERSONS, str(person_id))
+        if self.id_filters and not self.id_filters.might_contain(PERSONS_INDEX, person_id):
+            logger.info('Person %s is not in the id filter', person_id)
+            return None
+        snapshot = self.snapshot.get(PERSONS_INDEX) if self.snapshot else None
+        # Persons added without a release are not in the snapshot yet
+        data = snapshot.person(person_id) if snapshot else None
+        if data:
+            return data
+        if self.refresh_ahead:
+            self.refresh_ahead.track(
+                self._person_cache_key(person_id), partial(self._load_person_json, person_id), PERSONS_INDEX)
+        data = await self._person_from_cache(person_id)
+        if data is None:
+            data = await self._load_person_json(person_id)
+        return data or None
+
+    async def _load_person_json(self, person_id: UUID) -> bytes | None:
+        person = await self._get_person_from_storage(person_id)
         if not person:
-            person = await self._get_person_from_storage(person_id)
-            if not person:
-                return None
-            await self._put_person_to_cache(person)
-
-        films = []
-        for film in person.films:
-            cur_film = await self.film_service.get_film_by_id(film['id'])
-            films.append(cur_film)
-        return films
+            await self._put_person_to_cache(person_id, NEGATIVE_ENTRY, NEGATIVE_CACHE_EXPIRE_IN_SECONDS)
+            return None
+        response = schemas.PersonWithFilms(id=person.id, name=person.name, films=person.films)
+        data = response.model_dump_json().encode()
+        await self._put_person_to_cache(person_id, data)
+        return data
 
     async def _get_person_from_storage(self, person_id: UUID) -> Person | None:
         try:
@@ -64,33 +129,69 @@ class PersonService:
             raise
         return Person(**person) if person else None
 
-    async def _person_from_cache(self, person_id: UUID) -> Person | None:
-        data = await self.cache_storage.get(f'{PERSON_ID_KEY_PREFIX}{person_id}')
-        if not data:
-            return None
+    async def _person_from_cache(self, person_id: UUID) -> bytes | None:
+        data = await self.cache_storage.get(self._person_cache_key(person_id))
+        if data:
+            logger.info('Got person from cache by id %s', person_id)
+        return data
 
-        logger.info('Got person from cache by id %s', person_id)
-        person = Person.parse_raw(data)
-        return person
+    async def _put_person_to_cache(
+        self, person_id: UUID, data: bytes, expire_in: int = CACHE_EXPIRE_IN_SECONDS
+    ) -> None:
+        logger.info('Putting person to cache. person = %s', person_id)
+        await self.cache_storage.set(self._person_cache_key(person_id), data, expire_in)
 
-    async def _put_person_to_cache(self, person: Person):
-        logger.info('Putting person to cache. person = %s', person.id)
-        await self.cache_storage.set(f'{PERSON_ID_KEY_PREFIX}{person.id}', person.json())
+    async def _filmography_from_view(self, person_id: UUID) -> List[dict] | None:
+        if not self.filmography:
+            return None
+        try:
+            return await self.filmography.get(person_id)
+        except RedisError as e:
+            logger.error('Failed to get filmography of person %s: %s', person_id, e)
+            return None
+
+    async def _put_filmography(self, person_id: UUID, films: List[dict]) -> None:
+        if not self.filmography:
+            return
+        try:
+            await self.filmography.put(person_id, films)
+        except RedisError as e:
+            logger.error('Failed to put filmography of person %s: %s', person_id, e)
 
     async def _search_persons_in_storage(self, query: str, limit: int, offset: int) -> List[Person]:
         try:
             logging.info('Searching persons by query = %s', query)
             persons = await self.person_data_storage.search(query, limit, offset)
+        except InvalidQueryError as e:
+            logger.info('Invalid person query %s: %s', query, e)
+            raise PersonQueryError(str(e))
         except Exception as e:
             logger.exception(e)
             raise
         return [Person(**p) for p in persons]
 
+    def _person_cache_key(self, person_id: UUID) -> str:
+        return self.generations.key(PERSONS_INDEX, f'{PERSON_KEY_PREFIX}{person_id}')
+
 
 @lru_cache()
 def get_person_service(
         redis: Redis = Depends(get_redis),
         elastic: AsyncElasticsearch = Depends(get_elastic),
         film_service: FilmService = Depends(get_film_service),
+        refresh_ahead: RefreshAhead | None = Depends(get_refresh_ahead),
+        hot_keys: HotKeys | None = Depends(get_hot_keys),
+        id_filters: IdFilters | None = Depends(get_id_filters),
+        snapshot: CatalogSnapshotFile | None = Depends(get_snapshot_file),
+        embedded: EmbeddedCatalogFile | None = Depends(get_embedded_catalog),
 ) -> PersonService:
-    return PersonService(RedisCacheStorage(redis), DataStorage(elastic, 'personas'), film_service)
+    return PersonService(
+        RedisCacheStorage(redis),
+        make_data_storage(elastic, PERSONS_INDEX, embedded),
+        film_service,
+        refresh_ahead=refresh_ahead,
+        hot_keys=hot_keys,
+        id_filters=id_filters,
+        filmography=FilmographyView(redis),
+        snapshot=snapshot,
+    )
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+from functools import lru_cache
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+from fastapi import Depends
+
+from db.elastic import get_elastic
+from db.data_storage import DataStorage, DataStorageError, FilmDataStorage
+from db.cache_generations import CacheGenerations, cache_generations
+from db.embedded_storage import EmbeddedCatalogFile, get_embedded_catalog
+from db.failover_storage import make_data_storage, make_film_data_storage
+from db.prefix_cache import PrefixCache, get_suggest_cache
+from db.search import suggest_prefix
+from services.film import MOVIES_INDEX
+from services.person import PERSONS_INDEX
+
+logger = logging.getLogger(__name__)
+
+_EMPTY_SUGGESTIONS = orjson.dumps({'films': [], 'persons': []})
+
+
+class SuggestServiceError(Exception):
+    pass
+
+
+class SuggestService:
+    def __init__(
+        self,
+        film_data_storage: FilmDataStorage,
+        person_data_storage: DataStorage,
+        generations: CacheGenerations = cache_generations,
+        cache: PrefixCache | None = None,
+    ) -> None:
+        self.film_data_storage = film_data_storage
+        self.person_data_storage = person_data_storage
+        self.generations = generations
+        self.cache = cache
+
+    async def get_suggestions(self, query: str, limit: int = 10) -> bytes:
+        """Return response-shaped JSON of films and persons matching the text typed so far."""
+        prefix = suggest_prefix(query)
+        if not prefix:
+            return _EMPTY_SUGGESTIONS
+        generation = (self.generations.get(MOVIES_INDEX), self.generations.get(PERSONS_INDEX))
+        if self.cache is not None:
+            data = self.cache.get(generation, (prefix, limit))
+            if data is not None:
+                return data
+
+        logger.info('Getting suggestions for %s, limit %s', prefix, limit)
+        try:
+            films, persons = await asyncio.gather(
+                self.film_data_storage.suggest(prefix, limit),
+                self.person_data_storage.suggest(prefix, limit),
+            )
+        except DataStorageError as e:
+            logger.error('Failed to get suggestions for %s: %s', prefix, e)
+            raise SuggestServiceError
+        data = orjson.dumps({
+            'films': [
+                {'uuid': film['id'], 'title': film['title'], 'imdb_rating': film.get('imdb_rating')} for film in films
+            ],
+            'persons': [{'uuid': person['id'], 'full_name': person['full_name']} for person in persons],
+        })
+        if self.cache is not None:
+            self.cache.put(generation, (prefix, limit), data)
+        return data
+
+
+@lru_cache()
+def get_suggest_service(
+        elastic: AsyncElasticsearch = Depends(get_elastic),
+        cache: PrefixCache | None = Depends(get_suggest_cache),
+        embedded: EmbeddedCatalogFile | None = Depends(get_embedded_catalog),
+) -> SuggestService:
+    return SuggestService(
+        make_film_data_storage(elastic, MOVIES_INDEX, embedded),
+        make_data_storage(elastic, PERSONS_INDEX, embedded),
+        cache=cache,
+    )
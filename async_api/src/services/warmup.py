@@ -0,0 +1,223 @@
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Dict, List, Set, Tuple
+from uuid import UUID
+
+import orjson
+from elasticsearch import AsyncElasticsearch
+from pydantic import BaseModel, computed_field
+from redis import RedisError
+from redis.asyncio import Redis
+
+from core.config import settings
+from db.cache_generations import CacheGenerations
+from db.cache_storage import RedisCacheStorage
+from db.data_storage import FILM_PERSON_ROLES, FilmFilters
+from db.embedded_storage import EmbeddedCatalogFile
+from db.failover_storage import make_data_storage, make_film_data_storage
+from db.hot_keys import FILMS, PAGES, PERSONS, aggregated_top
+from services.film import FilmService, MOVIES_INDEX
+from services.genre import GenreService, GENRES_INDEX
+from services.person import PersonService, PERSONS_INDEX
+
+_PAGE_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupProgress(BaseModel):
+    # Set once every warm-up task is counted in total
+    planned: bool = False
+    finished: bool = False
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    # Set when the warm-up itself failed, not one of its tasks
+    error: str | None = None
+
+    @computed_field
+    @property
+    def ratio(self) -> float:
+        """Share of warm-up tasks that succeeded, failed ones don't fill the cache."""
+        if not self.planned:
+            return 0.0
+        return (self.done - self.failed) / self.total if self.total else 1.0
+
+
+class CacheWarmer:
+    """
+    Fills the cache with the data most likely to be requested: all genres and their film counts, the first
+    list pages overall and per genre, details of the top rated films and the persons appearing in most of them.
+
+    When redis is given, list pages, films and persons requested most across workers recently (see
+    db.hot_keys) are warmed first, top rated films and their persons fill the rest of the limits.
+    """
+
+    def __init__(
+        self,
+        film_service: FilmService,
+        genre_service: GenreService,
+        person_service: PersonService,
+        concurrency: int = settings.warmup_concurrency,
+        list_pages: int = settings.warmup_list_pages,
+        top_films: int = settings.warmup_top_films,
+        top_films_per_genre: int = settings.warmup_top_films_per_genre,
+        persons: int = settings.warmup_persons,
+        ready_threshold: float = settings.warmup_ready_threshold,
+        retry_seconds: float = settings.warmup_retry_seconds,
+        redis: Redis | None = None,
+    ) -> None:
+        self.film_service = film_service
+        self.genre_service = genre_service
+        self.person_service = person_service
+        self.concurrency = concurrency
+        self.list_pages = list_pages
+        self.top_films = top_films
+        self.top_films_per_genre = top_films_per_genre
+        self.persons = persons
+        self.ready_threshold = ready_threshold
+        self.retry_seconds = retry_seconds
+        self.redis = redis
+        self.progress = WarmupProgress()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def is_ready(self) -> bool:
+        return self.progress.ratio >= self.ready_threshold
+
+    async def run(self) -> None:
+        """Warm the cache up, again every retry_seconds until enough of the warm-up succeeds."""
+        while True:
+            try:
+                progress = await self.warm()
+            except Exception as e:
+                logger.exception('Cache warm-up failed')
+                self.progress.error = repr(e)
+            else:
+                if self.is_ready():
+                    return
+                logger.warning('Cache warm-up left the worker unready, %s of %s tasks failed', progress.failed,
+                               progress.total)
+            await asyncio.sleep(self.retry_seconds)
+
+    async def warm(self) -> WarmupProgress:
+        progress = self.progress = WarmupProgress(total=2)
+        logger.info('Warming cache up')
+
+        genres, _ = await self._gather([self.genre_service.get_all_genres(), self.genre_service.get_genre_stats()])
+        genre_ids = [UUID(g.id) for g in genres or []]
+
+        hot_pages, hot_films, hot_persons = await self._hot_keys()
+        page_args = [
+            *((None, _PAGE_SIZE, page * _PAGE_SIZE) for page in range(self.list_pages)),
+            *((genre_id, _PAGE_SIZE, 0) for genre_id in genre_ids),
+        ]
+        page_args.extend(args for args in hot_pages if args not in page_args)
+        page_tasks = [
+            self.film_service.get_films(FilmFilters(genre_ids=[genre_id] if genre_id else []), limit, offset)
+            for genre_id, limit, offset in page_args
+        ]
+        progress.total += len(page_tasks)
+        pages = await self._gather(page_tasks)
+        film_ids = hot_films + _film_ids(pages[:self.list_pages])[:self.top_films - len(hot_films)]
+        for page in pages[self.list_pages:self.list_pages + len(genre_ids)]:
+            film_ids.extend(_film_ids([page])[:self.top_films_per_genre])
+        film_ids = list(dict.fromkeys(film_ids))
+
+        # Persons are counted before fetching films, so the total only goes down from here on
+        progress.total += len(film_ids) + self.persons
+        progress.planned = True
+        films = await self._gather([self.film_service.get_raw_film(film_id) for film_id in film_ids])
+
+        frequent = _most_frequent_persons([orjson.loads(f.content) for f in films if f], self.persons)
+        person_ids = list(dict.fromkeys(hot_persons + frequent))[:self.persons]
+        progress.total -= self.persons - len(person_ids)
+        await self._gather([self.person_service.get_raw_person(person_id) for person_id in person_ids])
+
+        progress.finished = True
+        logger.info('Cache warm-up finished, %s tasks, %s failed', progress.done, progress.failed)
+        return progress
+
+    async def _hot_keys(self) -> Tuple[List[Tuple[UUID | None, int, int]], List[UUID], List[UUID]]:
+        if self.redis is None:
+            return [], [], []
+        try:
+            pages = await aggregated_top(self.redis, PAGES, self.list_pages + self.top_films_per_genre)
+            films = await aggregated_top(self.redis, FILMS, self.top_films)
+            persons = await aggregated_top(self.redis, PERSONS, self.persons)
+        except RedisError as e:
+            logger.warning('Failed to get hot keys, warming top rated films only: %s', e)
+            return [], [], []
+        hot_pages = [page for page in map(_page, (p.key for p in pages)) if page]
+        return hot_pages, [UUID(f.key) for f in films], [UUID(p.key) for p in persons]
+
+    async def _gather(self, tasks: List[Awaitable[Any]]) -> List[Any]:
+        return await asyncio.gather(*(self._run(task) for task in tasks))
+
+    async def _run(self, task: Awaitable[Any]) -> Any:
+        async with self._semaphore:
+            try:
+                return await task
+            except Exception as e:
+                logger.warning('Cache warm-up task failed: %r', e)
+                self.progress.failed += 1
+                return None
+            finally:
+                self.progress.done += 1
+
+
+def _page(key: str) -> Tuple[UUID | None, int, int] | None:
+    filters, limit, offset = key.rsplit(':', 2)
+    # Only pages of all films and of a single genre are warmed
+    try:
+        genre_id = UUID(filters) if filters else None
+    except ValueError:
+        return None
+    return genre_id, int(limit), int(offset)
+
+
+def _film_ids(pages: List[bytes | None]) -> List[UUID]:
+    return [UUID(f['uuid']) for page in pages if page for f in orjson.loads(page)]
+
+
+def _most_frequent_persons(films: List[Dict[str, Any]], limit: int) -> List[UUID]:
+    counts: Counter[str] = Counter()
+    for film in films:
+        persons: Set[str] = {p['uuid'] for role in FILM_PERSON_ROLES for p in film.get(role) or []}
+        counts.update(persons)
+    return [UUID(person_id) for person_id, _ in counts.most_common(limit)]
+
+
+def build_cache_warmer(
+    redis: Redis,
+    elastic: AsyncElasticsearch,
+    generations: CacheGenerations,
+    embedded: EmbeddedCatalogFile | None = None,
+    indices: Dict[str, str] | None = None,
+) -> CacheWarmer:
+    """
+    Warmer of the cache in the given generations.
+
+    indices maps the indices the service reads to the Elasticsearch indices to read instead, a release fills
+    the caches from its new versions before the aliases point at them.
+    """
+    indices = indices or {}
+    movies, genres, persons = (indices.get(index, index) for index in (MOVIES_INDEX, GENRES_INDEX, PERSONS_INDEX))
+    cache_storage = RedisCacheStorage(redis)
+    film_service = FilmService(cache_storage, make_film_data_storage(elastic, movies, embedded), generations)
+    return CacheWarmer(
+        film_service,
+        GenreService(
+            cache_storage, make_data_storage(elastic, genres, embedded), generations,
+            film_data_storage=make_film_data_storage(elastic, movies, embedded),
+        ),
+        PersonService(cache_storage, make_data_storage(elastic, persons, embedded), film_service, generations),
+        redis=redis if settings.hot_keys_enabled else None,
+    )
+
+
+cache_warmer: CacheWarmer | None = None
+
+
+def get_cache_warmer() -> CacheWarmer | None:
+    return cache_warmer
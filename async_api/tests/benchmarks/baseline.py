@@ -0,0 +1,56 @@
+"""
+Add benchmarks of a saved run to the baseline.
+
+Only benchmarks missing from the baseline are added, the recorded stats of the others stay as they are, so
+the reference they are compared with isn't reset by every run that adds a benchmark. --refresh replaces the
+whole baseline, it takes a run of a clean tree and goes in a commit of its own.
+
+    cd async_api
+    pytest tests/benchmarks -k test_new_benchmark --benchmark-save=new
+    python -m tests.benchmarks.baseline tests/benchmarks/.history/*/*_new.json
+    python -m tests.benchmarks.baseline tests/benchmarks/.history/*/*_baseline.json --refresh
+"""
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Any, Dict
+
+_BASELINE = Path(__file__).resolve().parent / 'baseline.json'
+
+logger = logging.getLogger('benchmarks')
+
+
+def merge(baseline: Dict[str, Any], run: Dict[str, Any]) -> Dict[str, Any]:
+    """The baseline with the benchmarks of the run it doesn't have yet."""
+    recorded = {benchmark['fullname'] for benchmark in baseline['benchmarks']}
+    added = [benchmark for benchmark in run['benchmarks'] if benchmark['fullname'] not in recorded]
+    for benchmark in added:
+        logger.info('Adding %s', benchmark['fullname'])
+    return {**baseline, 'benchmarks': baseline['benchmarks'] + added}
+
+
+def main(run_path: Path, refresh: bool) -> int:
+    with open(run_path, encoding='utf-8') as f:
+        run = json.load(f)
+    if refresh:
+        if run['commit_info'].get('dirty'):
+            logger.error('%s was recorded on a tree with uncommitted changes', run_path)
+            return 1
+        baseline = run
+    else:
+        with open(_BASELINE, encoding='utf-8') as f:
+            baseline = merge(json.load(f), run)
+    with open(_BASELINE, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('run', type=Path, help='benchmark run saved with --benchmark-save')
+    parser.add_argument('--refresh', action='store_true', help='replace every recorded benchmark')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.exit(main(args.run, args.refresh))
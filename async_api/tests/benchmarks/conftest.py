@@ -0,0 +1,21 @@
+from typing import Dict
+
+import pytest
+
+_ENTRY_SIZES_KEY = pytest.StashKey[Dict[str, Dict[str, int]]]()
+
+
+@pytest.fixture(scope='session')
+def entry_sizes(request) -> Dict[str, Dict[str, int]]:
+    """Cache entry sizes collected by the benchmarks, printed in the terminal summary."""
+    return request.config.stash.setdefault(_ENTRY_SIZES_KEY, {})
+
+
+def pytest_terminal_summary(terminalreporter, config) -> None:
+    sizes = config.stash.get(_ENTRY_SIZES_KEY, None)
+    if not sizes:
+        return
+    terminalreporter.write_sep('-', 'average cache entry size over the dataset, bytes')
+    for kind, by_codec in sizes.items():
+        columns = ''.join(f'{name:>10}: {size:<8}' for name, size in by_codec.items())
+        terminalreporter.write_line(f'{kind:<10}{columns}')
@@ -0,0 +1,74 @@
+from statistics import mean
+from typing import Any, Dict, List
+
+import pytest
+from pydantic import TypeAdapter
+
+from api.v1 import schemas
+from db.cache_storage import CacheCodec
+from models.film import Film
+from models.genre import Genre, Genres
+from models.person import Person
+
+_CODECS = {
+    'json': CacheCodec(compression_threshold=None),
+    'zstd': CacheCodec(),
+    'zstd-all': CacheCodec(compression_threshold=0),
+}
+_FILMS = TypeAdapter(List[schemas.Film])
+
+
+def _film_entry(source: Dict[str, Any]) -> bytes:
+    return schemas.FilmDetailed.from_orm(Film(**source)).model_dump_json().encode()
+
+
+def _person_entry(source: Dict[str, Any]) -> bytes:
+    person = Person(**source)
+    return schemas.PersonWithFilms(id=person.id, name=person.name, films=person.films).model_dump_json().encode()
+
+
+def _films_page_entry(sources: List[Dict[str, Any]]) -> bytes:
+    return _FILMS.dump_json([schemas.Film.from_orm(Film(**f)) for f in sources])
+
+
+def _genres_entry(sources: List[Dict[str, Any]]) -> bytes:
+    return CacheCodec.serialize(Genres(genres=[Genre(**g) for g in sources]))
+
+
+@pytest.fixture(scope='session')
+def entries(film_source, person_source, films_page_sources, genre_sources) -> Dict[str, bytes]:
+    return {
+        'film': _film_entry(film_source),
+        'person': _person_entry(person_source),
+        'films_page': _films_page_entry(films_page_sources),
+        'genres': _genres_entry(genre_sources),
+    }
+
+
+@pytest.fixture(scope='module', autouse=True)
+def dataset_entry_sizes(entry_sizes, movie_sources, person_sources) -> None:
+    """Average bytes per entry over the whole dataset."""
+    rated = [m for m in movie_sources if m['imdb_rating'] is not None]
+    datasets: Dict[str, List[bytes]] = {
+        'film': [_film_entry(m) for m in rated],
+        'person': [_person_entry(p) for p in person_sources],
+    }
+    for kind, data in datasets.items():
+        entry_sizes[kind] = {name: round(mean(len(codec.encode(e)) for e in data)) for name, codec in _CODECS.items()}
+
+
+@pytest.mark.parametrize('codec', list(_CODECS))
+@pytest.mark.parametrize('entry', ['film', 'person', 'films_page', 'genres'])
+def test_encode(benchmark, entries, entry, codec):
+    benchmark.group = f'cache-encode-{entry}'
+    benchmark.extra_info['bytes'] = len(_CODECS[codec].encode(entries[entry]))
+    benchmark(_CODECS[codec].encode, entries[entry])
+
+
+@pytest.mark.parametrize('codec', list(_CODECS))
+@pytest.mark.parametrize('entry', ['film', 'person', 'films_page', 'genres'])
+def test_decode(benchmark, entries, entry, codec):
+    encoded = _CODECS[codec].encode(entries[entry])
+    benchmark.group = f'cache-decode-{entry}'
+    benchmark.extra_info['bytes'] = len(encoded)
+    benchmark(_CODECS[codec].decode, encoded)
@@ -0,0 +1,10 @@
+import pytest
+
+from tests.load.catalog import SyntheticCatalog
+
+_FILMS = 2000
+
+
+@pytest.mark.benchmark(group='catalog')
+def test_catalog_generation(benchmark, tmp_path):
+    benchmark(lambda: SyntheticCatalog(_FILMS, seed=0).write(tmp_path))
@@ -0,0 +1,24 @@
+import pytest
+
+from db.catalog_snapshot import CatalogSnapshot, write_snapshot
+from jobs.catalog_snapshot import render_catalog
+
+_PAGE_SIZE = 50
+
+
+@pytest.fixture(scope='module')
+def snapshot(movie_sources, person_sources, genre_sources, tmp_path_factory) -> CatalogSnapshot:
+    catalog = render_catalog(movie_sources, person_sources, genre_sources)
+    path = tmp_path_factory.mktemp('snapshot') / 'catalog.snapshot'
+    write_snapshot(path, {}, catalog.films, catalog.persons, catalog.genres, catalog.all_genres)
+    return CatalogSnapshot(path)
+
+
+@pytest.mark.benchmark(group='catalog-snapshot')
+def test_snapshot_film_lookup(benchmark, snapshot, film_source):
+    benchmark(snapshot.film, film_source['id'])
+
+
+@pytest.mark.benchmark(group='catalog-snapshot')
+def test_snapshot_films_page(benchmark, snapshot):
+    benchmark(snapshot.films_page, None, _PAGE_SIZE, 0)
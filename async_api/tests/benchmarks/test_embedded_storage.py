@@ -0,0 +1,30 @@
+import pytest
+
+from db.embedded_storage import EmbeddedCatalog, EmbeddedCatalogFile, EmbeddedFilmDataStorage
+from db.query_builder import FilmFilters
+
+_PAGE_SIZE = 50
+
+
+@pytest.fixture(scope='module')
+def films(data_dir) -> EmbeddedFilmDataStorage:
+    catalog_file = EmbeddedCatalogFile(data_dir)
+    catalog_file.catalog = EmbeddedCatalog.from_dumps(data_dir)
+    return EmbeddedFilmDataStorage(catalog_file, 'movies')
+
+
+@pytest.mark.benchmark(group='embedded-storage')
+def test_embedded_genre_page(benchmark, loop, films, film_source):
+    filters = FilmFilters(genre_ids=[film_source['genres'][0]['id']])
+    benchmark(lambda: loop.run_until_complete(films.list(_PAGE_SIZE, 0, '-imdb_rating', filters)))
+
+
+@pytest.mark.benchmark(group='embedded-storage')
+def test_embedded_filtered_page(benchmark, loop, films, film_source):
+    filters = FilmFilters(genre_ids=[g['id'] for g in film_source['genres']], rating_from=5)
+    benchmark(lambda: loop.run_until_complete(films.list(_PAGE_SIZE, 0, '-imdb_rating', filters)))
+
+
+@pytest.mark.benchmark(group='embedded-storage')
+def test_embedded_search_page(benchmark, loop, films, film_source):
+    benchmark(lambda: loop.run_until_complete(films.search(film_source['title'], _PAGE_SIZE)))
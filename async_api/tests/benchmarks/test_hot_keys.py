@@ -0,0 +1,29 @@
+import random
+from typing import List
+
+import pytest
+
+from db.hot_keys import TopK
+
+_KEYS = 10_000
+_REQUESTS = 20_000
+_TOP = 20
+
+
+@pytest.fixture(scope='module')
+def requests() -> List[str]:
+    # Zipf-like traffic, a few keys get most of the requests
+    rng = random.Random(0)
+    weights = [1 / rank for rank in range(1, _KEYS + 1)]
+    return [f'key-{i}' for i in rng.choices(range(_KEYS), weights, k=_REQUESTS)]
+
+
+@pytest.mark.benchmark(group='hot-keys')
+def test_top_k_add(benchmark, requests):
+    def count() -> TopK:
+        top_k = TopK(k=100)
+        for key in requests:
+            top_k.add(key)
+        return top_k
+
+    benchmark(count)
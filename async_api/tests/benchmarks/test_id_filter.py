@@ -0,0 +1,22 @@
+import uuid
+
+import pytest
+
+from db.id_filter import BloomFilter
+
+_IDS = 100_000
+_ERROR_RATE = 0.001
+
+
+@pytest.fixture(scope='module')
+def bloom() -> BloomFilter:
+    bloom = BloomFilter(_IDS, _ERROR_RATE)
+    for _ in range(_IDS):
+        bloom.add(str(uuid.uuid4()))
+    return bloom
+
+
+@pytest.mark.benchmark(group='id-filter')
+def test_bloom_filter_lookup(benchmark, bloom):
+    unknown = str(uuid.uuid4())
+    benchmark(lambda: unknown in bloom)
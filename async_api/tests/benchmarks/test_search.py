@@ -0,0 +1,79 @@
+import random
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from db.prefix_cache import PrefixCache
+from db.search import SEARCH_TEMPLATES, SUGGESTERS, suggest_prefix
+from tests.load.fakes import FakeElasticsearch
+
+_SAMPLE = 30
+_TOP = 10
+
+_MOVIES_TEMPLATE = SEARCH_TEMPLATES['movies']
+_MOVIES_SUGGESTER = SUGGESTERS['movies']
+
+
+@pytest.fixture(scope='module')
+def elastic(data_dir) -> FakeElasticsearch:
+    # Scores of the fake count matched words per field times the field boost, they are not BM25
+    return FakeElasticsearch.from_dumps(data_dir, indices=('movies',))
+
+
+@pytest.fixture(scope='module')
+def films(movie_sources) -> List[Dict[str, Any]]:
+    return random.Random(0).sample(movie_sources, _SAMPLE)
+
+
+@pytest.fixture(scope='module')
+def queries(films) -> List[Tuple[str, str]]:
+    """Queries a user looking for a particular film would type: its title, or an actor and a word of the title."""
+    rng = random.Random(0)
+    queries = []
+    for movie in films:
+        queries.append((movie['title'], movie['id']))
+        if movie['actors_names']:
+            queries.append((f'{movie["actors_names"][0]} {rng.choice(movie["title"].split())}', movie['id']))
+    return queries
+
+
+def _query_string(elastic: FakeElasticsearch, query: str) -> Dict[str, Any]:
+    return elastic.search('movies', {'query': {'query_string': {'query': query}}, 'size': _TOP})
+
+
+def _template(elastic: FakeElasticsearch, query: str) -> Dict[str, Any]:
+    return elastic.search('movies', _MOVIES_TEMPLATE.render(_MOVIES_TEMPLATE.params(query, _TOP, 0)))
+
+
+@pytest.mark.benchmark(group='search')
+def test_search_query_string(benchmark, elastic, queries):
+    benchmark(lambda: [_query_string(elastic, query) for query, _ in queries[:_TOP]])
+
+
+@pytest.mark.benchmark(group='search')
+def test_search_template(benchmark, elastic, queries):
+    benchmark(lambda: [_template(elastic, query) for query, _ in queries[:_TOP]])
+
+
+@pytest.fixture(scope='module')
+def prefixes(films) -> List[str]:
+    # What the search box holds while a title is being typed
+    return [film['title'][:length] for film in films for length in (2, 4, 8)]
+
+
+@pytest.mark.benchmark(group='suggest')
+def test_suggest_search_template(benchmark, elastic, prefixes):
+    benchmark(lambda: [_template(elastic, prefix) for prefix in prefixes[:_TOP]])
+
+
+@pytest.mark.benchmark(group='suggest')
+def test_suggest_edge_ngrams(benchmark, elastic, prefixes):
+    benchmark(lambda: [elastic.search('movies', _MOVIES_SUGGESTER.body(prefix, _TOP)) for prefix in prefixes[:_TOP]])
+
+
+@pytest.mark.benchmark(group='suggest')
+def test_suggest_prefix_cache_hit(benchmark, prefixes):
+    cache = PrefixCache(max_size=1000, ttl=3600)
+    for prefix in prefixes:
+        cache.put((0, 0), (suggest_prefix(prefix), _TOP), b'[]')
+    benchmark(lambda: [cache.get((0, 0), (suggest_prefix(prefix), _TOP)) for prefix in prefixes[:_TOP]])
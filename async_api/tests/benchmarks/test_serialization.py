@@ -0,0 +1,151 @@
+import json
+from typing import Any, Coroutine, List
+
+import orjson
+import pytest
+from pydantic import TypeAdapter
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from api.v1 import films as films_api, persons as persons_api
+from api.v1 import schemas
+from models.film import Film, FilmAccess
+from models.genre import Genre, Genres
+from models.person import Person
+
+
+def _route(router, name: str) -> APIRoute:
+    return next(r for r in router.routes if r.name == name)
+
+
+def _run(coroutine: Coroutine) -> Any:
+    # serialize_response never suspends for async endpoints, so it can be driven without an event loop
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    raise RuntimeError('coroutine suspended')
+
+
+def _render(route: APIRoute, content: Any) -> bytes:
+    serialized = _run(serialize_response(
+        field=route.response_field, response_content=content, by_alias=route.response_model_by_alias))
+    return ORJSONResponse(serialized).body
+
+
+@pytest.mark.benchmark(group='es-source-to-model')
+def test_films_page_from_es_source(benchmark, films_page_sources):
+    benchmark(lambda: [Film(**f) for f in films_page_sources])
+
+
+@pytest.mark.benchmark(group='es-source-to-model')
+def test_film_from_es_source(benchmark, film_source):
+    benchmark(Film, **film_source)
+
+
+@pytest.mark.benchmark(group='es-source-to-model')
+def test_person_from_es_source(benchmark, person_source):
+    benchmark(Person, **person_source)
+
+
+@pytest.mark.benchmark(group='cache-read')
+def test_film_parse_raw(benchmark, film_source):
+    data = Film(**film_source).json()
+    benchmark(Film.parse_raw, data)
+
+
+@pytest.mark.benchmark(group='cache-read')
+def test_films_page_parse_obj(benchmark, films_page_sources):
+    data = orjson.dumps([Film(**f).dict() for f in films_page_sources])
+    benchmark(lambda: [Film.parse_obj(f) for f in orjson.loads(data)])
+
+
+@pytest.mark.benchmark(group='cache-read')
+def test_person_parse_raw(benchmark, person_source):
+    data = Person(**person_source).json()
+    benchmark(Person.parse_raw, data)
+
+
+@pytest.mark.benchmark(group='cache-read')
+def test_genres_parse_raw(benchmark, genre_sources):
+    genres = Genres(genres=[Genre(**g) for g in genre_sources])
+    data = json.dumps(genres.__dict__, default=lambda o: o.__dict__)
+    benchmark(Genres.parse_raw, data)
+
+
+@pytest.mark.benchmark(group='cache-write')
+def test_film_json(benchmark, film_source):
+    film = Film(**film_source)
+    benchmark(film.json)
+
+
+@pytest.mark.benchmark(group='cache-write')
+def test_films_page_orjson_dumps(benchmark, films_page_sources):
+    films = [Film(**f) for f in films_page_sources]
+    benchmark(lambda: orjson.dumps([f.dict() for f in films]))
+
+
+@pytest.mark.benchmark(group='cache-write')
+def test_genres_json_dumps(benchmark, genre_sources):
+    genres = Genres(genres=[Genre(**g) for g in genre_sources])
+    benchmark(lambda: json.dumps(genres.__dict__, default=lambda o: o.__dict__))
+
+
+@pytest.mark.benchmark(group='model-to-schema')
+def test_films_page_from_orm(benchmark, films_page_sources):
+    films = [Film(**f) for f in films_page_sources]
+    benchmark(lambda: [schemas.Film.from_orm(f) for f in films])
+
+
+@pytest.mark.benchmark(group='model-to-schema')
+def test_film_detailed_from_orm(benchmark, film_source):
+    film = Film(**film_source)
+    benchmark(schemas.FilmDetailed.from_orm, film)
+
+
+@pytest.mark.benchmark(group='response')
+def test_films_page_response(benchmark, films_page_sources):
+    route = _route(films_api.router, 'films')
+    content = [schemas.Film.from_orm(Film(**f)) for f in films_page_sources]
+    benchmark(_render, route, content)
+
+
+@pytest.mark.benchmark(group='response')
+def test_film_detailed_response(benchmark, film_source):
+    route = _route(films_api.router, 'film_details')
+    content = schemas.FilmDetailed.from_orm(Film(**film_source))
+    benchmark(_render, route, content)
+
+
+@pytest.mark.benchmark(group='response')
+def test_person_response(benchmark, person_source):
+    route = _route(persons_api.router, 'person_details')
+    person = Person(**person_source)
+    content = schemas.PersonWithFilms(id=person.id, name=person.name, films=person.films)
+    benchmark(_render, route, content)
+
+
+@pytest.mark.benchmark(group='end-to-end')
+def test_film_details_cache_hit(benchmark, film_source):
+    data = schemas.FilmDetailed.from_orm(Film(**film_source)).model_dump_json().encode()
+
+    def cache_hit() -> bytes:
+        FilmAccess.model_validate_json(data)
+        return Response(content=data, media_type='application/json').body
+
+    benchmark(cache_hit)
+
+
+@pytest.mark.benchmark(group='end-to-end')
+def test_films_page_cache_hit(benchmark, films_page_sources):
+    films = [schemas.Film.from_orm(Film(**f)) for f in films_page_sources]
+    data = TypeAdapter(List[schemas.Film]).dump_json(films)
+    benchmark(lambda: Response(content=data, media_type='application/json').body)
+
+
+@pytest.mark.benchmark(group='end-to-end')
+def test_person_details_cache_hit(benchmark, person_source):
+    person = Person(**person_source)
+    data = schemas.PersonWithFilms(id=person.id, name=person.name, films=person.films).model_dump_json().encode()
+    benchmark(lambda: Response(content=data, media_type='application/json').body)
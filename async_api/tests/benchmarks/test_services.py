@@ -0,0 +1,48 @@
+from typing import Any, Dict, List
+from uuid import UUID
+
+import pytest
+
+from api.v1 import schemas
+from db.cache_storage import InMemoryCacheStorage
+from db.data_storage import FilmDataStorage
+from models.film import Film
+from services.film import FilmService
+
+
+@pytest.fixture
+def filmography(movie_sources, person_source) -> List[Dict[str, Any]]:
+    film_ids = {f['id'] for f in person_source['films']}
+    return [m for m in movie_sources if m['id'] in film_ids and m['imdb_rating'] is not None]
+
+
+@pytest.fixture
+def film_service(loop, filmography) -> FilmService:
+    # Every film is cached, so Elasticsearch is never queried
+    service = FilmService(InMemoryCacheStorage(), FilmDataStorage(elastic=None, index='movies'))
+    entries = {
+        service._film_cache_key(f['id']): schemas.FilmDetailed.from_orm(Film(**f)).model_dump_json()
+        for f in filmography
+    }
+    loop.run_until_complete(service.cache_storage.set_many(entries))
+    return service
+
+
+@pytest.fixture
+def film_ids(filmography) -> List[UUID]:
+    return [UUID(f['id']) for f in filmography]
+
+
+@pytest.mark.benchmark(group='person-films-cache-hit')
+def test_person_films_one_by_one(benchmark, loop, film_service, film_ids):
+    async def resolve() -> List[Film]:
+        return [await film_service.get_film_by_id(film_id) for film_id in film_ids]
+
+    assert len(loop.run_until_complete(resolve())) == len(film_ids)
+    benchmark(lambda: loop.run_until_complete(resolve()))
+
+
+@pytest.mark.benchmark(group='person-films-cache-hit')
+def test_person_films_get_many(benchmark, loop, film_service, film_ids):
+    assert len(loop.run_until_complete(film_service.get_films_by_ids(film_ids))) == len(film_ids)
+    benchmark(lambda: loop.run_until_complete(film_service.get_films_by_ids(film_ids)))
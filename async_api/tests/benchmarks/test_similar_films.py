@@ -0,0 +1,42 @@
+from typing import Any, Dict, List, Set
+
+import pytest
+
+from db.data_storage import FILM_PERSON_ROLES
+from jobs.similar_films import nearest_films
+
+_SAMPLE = 200
+_TOP = 10
+_GENRE_WEIGHT = 0.3
+
+
+@pytest.fixture(scope='module')
+def rated_films(movie_sources) -> List[Dict[str, Any]]:
+    return [m for m in movie_sources if m['imdb_rating'] is not None]
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def _pairwise_scores(films: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Scores of every pair of films computed one pair at a time, the way the job would without matrices."""
+    genres = {f['id']: {g['id'] for g in f['genres']} for f in films}
+    persons = {f['id']: {p['id'] for role in FILM_PERSON_ROLES for p in f[role]} for f in films}
+    return {
+        a: {
+            b: _GENRE_WEIGHT * _jaccard(genres[a], genres[b]) + (1 - _GENRE_WEIGHT) * _jaccard(persons[a], persons[b])
+            for b in genres if b != a
+        }
+        for a in genres
+    }
+
+
+@pytest.mark.benchmark(group='similar-films')
+def test_similar_films_pairwise(benchmark, rated_films):
+    benchmark(lambda: _pairwise_scores(rated_films[:_SAMPLE]))
+
+
+@pytest.mark.benchmark(group='similar-films')
+def test_similar_films_sparse(benchmark, rated_films):
+    benchmark(lambda: nearest_films(rated_films[:_SAMPLE], _TOP, _GENRE_WEIGHT))
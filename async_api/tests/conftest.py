@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+_ROOT_DIR = Path(__file__).resolve().parents[1]
+_DATA_DIR = _ROOT_DIR.parent / 'infra' / 'es_data'
+_PAGE_SIZE = 50
+
+sys.path.insert(0, str(_ROOT_DIR / 'src'))
+# Settings are required to import the routers, unit tests and benchmarks never connect anywhere
+os.environ.setdefault('SERVICE_LOGIN', 'test')
+os.environ.setdefault('SERVICE_PASSWORD', 'test')
+os.environ.setdefault('JWT_PUBLIC_KEY', 'test')
+
+
+def _load_sources(index: str) -> List[Dict[str, Any]]:
+    with open(_DATA_DIR / f'{index}_data.json', encoding='utf-8') as f:
+        return [json.loads(line)['_source'] for line in f if line.strip()]
+
+
+@pytest.fixture(scope='session')
+def data_dir() -> Path:
+    """Elasticsearch dumps the service is deployed with."""
+    return _DATA_DIR
+
+
+@pytest.fixture(scope='session')
+def movie_sources() -> List[Dict[str, Any]]:
+    return _load_sources('movies')
+
+
+@pytest.fixture(scope='session')
+def person_sources() -> List[Dict[str, Any]]:
+    return _load_sources('personas')
+
+
+@pytest.fixture(scope='session')
+def genre_sources() -> List[Dict[str, Any]]:
+    return _load_sources('genres')
+
+
+@pytest.fixture(scope='session')
+def films_page_sources(movie_sources) -> List[Dict[str, Any]]:
+    """The first page of `/api/v1/films`, as returned by Elasticsearch."""
+    rated = [m for m in movie_sources if m['imdb_rating'] is not None]
+    return sorted(rated, key=lambda m: -m['imdb_rating'])[:_PAGE_SIZE]
+
+
+@pytest.fixture(scope='session')
+def film_source(movie_sources) -> Dict[str, Any]:
+    """A film with a cast size close to the 90th percentile."""
+    rated = [m for m in movie_sources if m['imdb_rating'] is not None]
+    by_cast = sorted(rated, key=lambda m: len(m['actors']) + len(m['writers']) + len(m['directors']))
+    return by_cast[int(len(by_cast) * 0.9)]
+
+
+@pytest.fixture(scope='session')
+def person_source(person_sources) -> Dict[str, Any]:
+    """A person with a filmography size close to the 90th percentile."""
+    by_films = sorted(person_sources, key=lambda p: len(p['films']))
+    return by_films[int(len(by_films) * 0.9)]
+
+
+@pytest.fixture
+def loop() -> asyncio.AbstractEventLoop:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
@@ -1,7 +1,12 @@
-from typing import Dict
+from typing import Dict, List, Tuple
 import asyncio
+import socket
+import time
+import uuid
 
 import aiohttp
+import jwt
+import pytest
 import pytest_asyncio
 
 from tests.functional.settings import test_settings
@@ -9,9 +14,23 @@ from tests.functional.settings import test_settings
 pytest_plugins = ['tests.functional.plugins.es', 'tests.functional.plugins.redis']
 
 
+def pytest_sessionstart(session):
+    # Without a service of its own a worker would fail every test with connection errors, or worse, share one
+    if test_settings.pytest_xdist_worker is None:
+        return
+    try:
+        socket.getaddrinfo(test_settings.worker_service_host, test_settings.service_port)
+    except socket.gaierror:
+        raise pytest.UsageError(
+            f'No service {test_settings.worker_service_host} for pytest-xdist worker '
+            f'{test_settings.pytest_xdist_worker} of {test_settings.pytest_xdist_worker_count}: docker-compose.yml '
+            f'defines a service per worker, run as many workers as there are services')
+
+
 @pytest_asyncio.fixture(scope='session')
 def event_loop():
-    loop = asyncio.get_event_loop()
+    # Session fixtures share their clients with the tests, so they all run on one loop of the worker process
+    loop = asyncio.new_event_loop()
     yield loop
     loop.close()
 
@@ -25,7 +44,17 @@ async def aiohttp_session():
 
 @pytest_asyncio.fixture
 async def make_get_request(aiohttp_session):
-    async def inner(path: str, params: Dict[str, str] | None = None):
-        url = f'http://{test_settings.service_host}:{test_settings.service_port}/{path}'
-        return await aiohttp_session.get(url, params=(params or {}))
+    async def inner(path: str, params: Dict[str, str] | List[Tuple[str, str]] | None = None,
+                    headers: Dict[str, str] | None = None):
+        url = f'http://{test_settings.worker_service_host}:{test_settings.service_port}/{path}'
+        return await aiohttp_session.get(url, params=(params or {}), headers=headers)
+    return inner
+
+
+@pytest.fixture
+def make_auth_headers():
+    # The auth service isn't part of the test environment, the service then trusts the roles of the token
+    def inner(roles: List[str]) -> Dict[str, str]:
+        payload = {'user_id': str(uuid.uuid4()), 'roles': roles, 'exp': int(time.time()) + 3600}
+        return {'Authorization': f'Bearer {jwt.encode(payload, test_settings.jwt_private_key, algorithm="RS256")}'}
     return inner
@@ -2,6 +2,7 @@
 
 python ./utils/wait_for_es.py
 python ./utils/wait_for_redis.py
-pytest
+# A worker per async_api_gw* service of docker-compose.yml, see PYTEST_WORKERS there
+pytest -n "${PYTEST_WORKERS:-4}"
 
 exec "$@"
@@ -1,3 +1,4 @@
+import json
 from typing import Any, Dict, List
 from pathlib import Path
 
@@ -8,6 +9,9 @@ from elasticsearch.helpers import async_bulk
 
 from tests.functional.settings import test_settings
 
+_INDICES = ('movies', 'personas', 'genres')
+_SCHEMAS_DIR = Path(__file__).resolve().parents[1] / 'testdata'
+
 
 @pytest_asyncio.fixture(scope="session")
 async def es_client():
@@ -17,53 +21,64 @@ async def es_client():
     await es_client.close()
 
 
+async def create_indices(es_client: AsyncElasticsearch, indices: Dict[str, str]) -> None:
+    """Create empty indices named by the values, with index templates of the indices the keys name."""
+    for index, name in indices.items():
+        with open(_SCHEMAS_DIR / f'schema_{index}_es.json', encoding='utf-8') as f:
+            schema = json.load(f)
+        await es_client.indices.put_index_template(name=name, index_patterns=[name], template=schema)
+        await es_client.indices.delete(index=name, ignore_unavailable=True)
+        await es_client.indices.create(index=name)
+
+
+async def delete_indices(es_client: AsyncElasticsearch, indices: Dict[str, str]) -> None:
+    await es_client.indices.delete(index=','.join(indices.values()), ignore_unavailable=True)
+    await es_client.indices.delete_index_template(name=','.join(indices.values()))
+
+
+@pytest_asyncio.fixture(scope="session")
+async def es_indices(es_client):
+    """
+    Indices of the worker by the names the tests use, created once per session from index templates.
+
+    Tests get empty indices by deleting the documents, which is much cheaper than recreating an index.
+    """
+    indices = {index: test_settings.index_name(index) for index in _INDICES}
+    await create_indices(es_client, indices)
+    yield indices
+    await delete_indices(es_client, indices)
+
+
 @pytest_asyncio.fixture
-def es_write_data(es_client):
+def es_write_data(es_client, es_indices):
     async def inner(data: List[Dict[str, Any]]) -> None:
-        _, errors = await async_bulk(client=es_client, actions=data, refresh='wait_for')
+        actions = [{**action, '_index': es_indices[action['_index']]} for action in data]
+        _, errors = await async_bulk(client=es_client, actions=actions)
         if errors:
             raise Exception('Ошибка записи данных в Elasticsearch')
+        # One refresh for all documents makes them visible right away, without waiting for a scheduled refresh
+        await es_client.indices.refresh(index=','.join({action['_index'] for action in actions}))
     return inner
 
 
 @pytest_asyncio.fixture
-async def create_index(es_client):
-    async def inner(index: str) -> None:
-        path = (Path('.') / 'testdata').resolve()
-        with open(f'{path}/schema_{index}_es.json', encoding='utf-8') as f:
-            schema = f.read()
-        if await es_client.indices.exists(index=index):
-            await es_client.indices.delete(index=index)
-        await es_client.indices.create(index=index, body=schema)
-    return inner
-
-
-@pytest_asyncio.fixture
-async def remove_index(es_client):
+def clear_index(es_client, es_indices):
     async def inner(index: str) -> None:
-        await es_client.indices.delete(index=index)
+        await es_client.delete_by_query(
+            index=es_indices[index], query={'match_all': {}}, conflicts='proceed', refresh=True)
     return inner
 
 
 @pytest_asyncio.fixture
-async def films_index(create_index, remove_index):
-    index = "movies"
-    await create_index(index)
-    yield
-    await remove_index(index)
+async def films_index(clear_index):
+    await clear_index('movies')
 
 
 @pytest_asyncio.fixture
-async def persons_index(create_index, remove_index):
-    index = "personas"
-    await create_index(index)
-    yield
-    await remove_index(index)
+async def persons_index(clear_index):
+    await clear_index('personas')
 
 
 @pytest_asyncio.fixture
-async def genres_index(create_index, remove_index):
-    index = "genres"
-    await create_index(index)
-    yield
-    await remove_index(index)
+async def genres_index(clear_index):
+    await clear_index('genres')
@@ -9,7 +9,7 @@ _TEST_REDIS_KEY_EXPIRE_IN_SECONDS = 10
 
 @pytest_asyncio.fixture(scope="session")
 async def redis_client():
-    redis_client = Redis(host=test_settings.redis_host, port=test_settings.redis_port)
+    redis_client = Redis(host=test_settings.redis_host, port=test_settings.redis_port, db=test_settings.worker_redis_db)
     yield redis_client
     await redis_client.aclose()
 
@@ -8,8 +8,26 @@ class TestSettings(BaseSettings):
     elastic_port: int = 9200
     redis_host: str = '127.0.0.1'
     redis_port: int = 6379
+    redis_db: int = 0
     service_host: str = '127.0.0.1'
     service_port: int = 8000
+    # Signs test tokens, the service checks them with the JWT_PUBLIC_KEY of the same pair
+    jwt_private_key: str = ''
+    # Set by pytest-xdist in its workers, gw0, gw1 and so on. Every worker gets its own indices, Redis database
+    # and service, so tests running at the same time do not see each other's data, see docker-compose.yml
+    pytest_xdist_worker: str | None = None
+    pytest_xdist_worker_count: int | None = None
+
+    def index_name(self, index: str) -> str:
+        return f'{self.pytest_xdist_worker}_{index}' if self.pytest_xdist_worker else index
+
+    @property
+    def worker_redis_db(self) -> int:
+        return int(self.pytest_xdist_worker.removeprefix('gw')) + 1 if self.pytest_xdist_worker else self.redis_db
+
+    @property
+    def worker_service_host(self) -> str:
+        return f'{self.service_host}_{self.pytest_xdist_worker}' if self.pytest_xdist_worker else self.service_host
 
 
 test_settings = TestSettings()
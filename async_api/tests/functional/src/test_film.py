@@ -1,13 +1,17 @@
+import json
 import uuid
 from http import HTTPStatus
+from typing import Any, Dict, List
 
 import pytest
 
-from tests.functional.utils.models import Film
+from tests.functional.utils.models import Film, film_response
 from tests.functional.utils.data_generators import generate_films
 
 _MOVIES_INDEX_NAME = 'movies'
-_FILM_CACHE_PREFIX = 'films'
+_FILM_CACHE_PREFIX = 'films:details'
+_SIMILAR_FILMS_PREFIX = 'similar:film:'
+_EXPORT_PATH = 'api/v1/films/export'
 
 
 @pytest.mark.asyncio
@@ -28,7 +32,7 @@ async def test_get_existing_film_by_id_from_db(es_write_data, make_get_request):
 async def test_get_existing_film_by_id_from_cache(redis_write_data, make_get_request):
     film = generate_films(cnt=1)[0]
     cache_key = f'{_FILM_CACHE_PREFIX}:{film.id}'
-    await redis_write_data(cache_key, film.model_dump_json())
+    await redis_write_data(cache_key, json.dumps(film_response(film)))
 
     response = await make_get_request(f'api/v1/films/{film.id}')
 
@@ -54,7 +58,9 @@ async def test_search_existing_film(es_write_data, make_get_request):
         if query in film.title:
             cnt_films_with_keyword += 1
 
-        await es_write_data([{'_index': _MOVIES_INDEX_NAME, '_id': str(film.id), '_source': film.model_dump()}])
+    await es_write_data([
+        {'_index': _MOVIES_INDEX_NAME, '_id': str(film.id), '_source': film.model_dump()} for film in films
+    ])
 
     response = await make_get_request(f'api/v1/films/search?query={query}')
 
@@ -75,3 +81,154 @@ async def test_search_not_existing_film(es_write_data, make_get_request):
     assert response.status == HTTPStatus.OK
     body = await response.json()
     assert len(body) == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_search_film_with_too_long_query(make_get_request):
+    query = ' '.join(['word'] * 100)
+
+    response = await make_get_request(f'api/v1/films/search?query={query}')
+
+    assert response.status == HTTPStatus.BAD_REQUEST
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_list_films_with_filters(es_write_data, make_get_request):
+    films = generate_films(cnt=20)
+    await es_write_data([
+        {'_index': _MOVIES_INDEX_NAME, '_id': str(film.id), '_source': film.model_dump()} for film in films
+    ])
+    genre_ids = sorted({genre.id for film in films for genre in film.genres}, key=str)[:2]
+    expected = {
+        str(film.id) for film in films
+        if 2 <= film.imdb_rating <= 8 and set(genre_ids) <= {genre.id for genre in film.genres}
+    }
+
+    genres = '&'.join(f'genre={genre_id}' for genre_id in genre_ids)
+    response = await make_get_request(f'api/v1/films/?{genres}&genre_match=all&rating_from=2&rating_to=8')
+
+    assert response.status == HTTPStatus.OK
+    body = await response.json()
+    assert {film['uuid'] for film in body} == expected
+    assert [film['imdb_rating'] for film in body] == sorted((film['imdb_rating'] for film in body), reverse=True)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_list_films_with_invalid_rating_range(make_get_request):
+    response = await make_get_request('api/v1/films/?rating_from=8&rating_to=2')
+    assert response.status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_get_similar_films(es_write_data, redis_write_data, make_get_request):
+    film, *similar = generate_films(cnt=4)
+    await es_write_data([
+        {'_index': _MOVIES_INDEX_NAME, '_id': str(f.id), '_source': f.model_dump()} for f in [film, *similar]
+    ])
+    await redis_write_data(f'{_SIMILAR_FILMS_PREFIX}{film.id}', json.dumps([str(f.id) for f in similar]))
+
+    response = await make_get_request(f'api/v1/films/{film.id}/similar')
+
+    assert response.status == HTTPStatus.OK
+    body = await response.json()
+    assert [f['uuid'] for f in body] == [str(f.id) for f in similar]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_get_similar_films_of_not_existing_film(make_get_request):
+    response = await make_get_request(f'api/v1/films/{uuid.uuid4()}/similar')
+    assert response.status == HTTPStatus.NOT_FOUND
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films_requires_authentication(make_get_request):
+    response = await make_get_request(_EXPORT_PATH)
+    assert response.status == HTTPStatus.FORBIDDEN
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films_requires_subscription(make_get_request, make_auth_headers):
+    response = await make_get_request(_EXPORT_PATH, headers=make_auth_headers([]))
+    assert response.status == HTTPStatus.FORBIDDEN
+
+
+async def _write_films(es_write_data, cnt: int) -> List[Film]:
+    films = generate_films(cnt=cnt)
+    await es_write_data([
+        {'_index': _MOVIES_INDEX_NAME, '_id': str(film.id), '_source': film.model_dump()} for film in films
+    ])
+    return sorted(films, key=lambda film: str(film.id))
+
+
+async def _export(make_get_request, make_auth_headers, params=None, encoding: str = 'identity'):
+    headers = {**make_auth_headers(['subscriber']), 'Accept-Encoding': encoding}
+    return await make_get_request(_EXPORT_PATH, params=params, headers=headers)
+
+
+def _lines(body: bytes) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in body.splitlines()]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films(es_write_data, make_get_request, make_auth_headers):
+    films = await _write_films(es_write_data, cnt=10)
+
+    response = await _export(make_get_request, make_auth_headers)
+
+    assert response.status == HTTPStatus.OK
+    assert response.headers['Content-Type'] == 'application/x-ndjson'
+    assert 'Content-Encoding' not in response.headers
+    assert [Film(**line) for line in _lines(await response.read())] == films
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films_fields(es_write_data, make_get_request, make_auth_headers):
+    films = await _write_films(es_write_data, cnt=5)
+
+    params = [('fields', 'title'), ('fields', 'imdb_rating')]
+    response = await _export(make_get_request, make_auth_headers, params=params)
+
+    assert response.status == HTTPStatus.OK
+    assert _lines(await response.read()) == [
+        {'id': str(film.id), 'imdb_rating': film.imdb_rating, 'title': film.title} for film in films
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films_unknown_field(make_get_request, make_auth_headers):
+    response = await _export(make_get_request, make_auth_headers, params={'fields': 'no_such_field'})
+    assert response.status == HTTPStatus.UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films_gzip(es_write_data, make_get_request, make_auth_headers):
+    films = await _write_films(es_write_data, cnt=10)
+
+    response = await _export(make_get_request, make_auth_headers, encoding='gzip')
+
+    assert response.status == HTTPStatus.OK
+    assert response.headers['Content-Encoding'] == 'gzip'
+    # aiohttp decodes the gzip stream
+    assert [Film(**line) for line in _lines(await response.read())] == films
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index')
+async def test_export_films_after(es_write_data, make_get_request, make_auth_headers):
+    films = await _write_films(es_write_data, cnt=10)
+
+    response = await _export(make_get_request, make_auth_headers, params={'after': str(films[3].id)})
+
+    assert response.status == HTTPStatus.OK
+    assert [Film(**line) for line in _lines(await response.read())] == films[4:]
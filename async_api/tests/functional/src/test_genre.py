@@ -3,10 +3,14 @@ from http import HTTPStatus
 
 import pytest
 
-from tests.functional.utils.data_generators import generate_genre, generate_genres
+from tests.functional.utils.data_generators import generate_films, generate_genre, generate_genres
+from tests.functional.utils.models import FilmGenre
 
 GENRE_INDEX_NAME = 'genres'
+_MOVIES_INDEX_NAME = 'movies'
 _GENRE_ID_KEY_PREFIX = 'genre_id_'
+_ALL_GENRES_KEY = 'all_genres'
+_FILM_COUNTS_KEY = 'genres:film_counts'
 
 
 @pytest.mark.asyncio
@@ -54,6 +58,32 @@ async def test_genres_list(es_write_data, make_get_request):
     assert len(body) == len(genres)
 
 
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('genres_index', 'films_index')
+async def test_genre_stats(es_write_data, redis_client, make_get_request):
+    genres = generate_genres(cnt=3)
+    films = generate_films(cnt=10)
+    for i, film in enumerate(films):
+        # The first genre is listed twice in some films, they are still counted once
+        film.genres = [FilmGenre(id=genre.id, name=genre.name) for genre in genres[:i % 3]]
+        if i % 3 == 2:
+            film.genres.append(film.genres[0])
+    await es_write_data(
+        [{'_index': GENRE_INDEX_NAME, '_id': str(genre.id), '_source': genre.model_dump()} for genre in genres]
+        + [{'_index': _MOVIES_INDEX_NAME, '_id': str(film.id), '_source': film.model_dump()} for film in films]
+    )
+    await redis_client.delete(_ALL_GENRES_KEY, _FILM_COUNTS_KEY)
+
+    response = await make_get_request('api/v1/genres/stats')
+
+    assert response.status == HTTPStatus.OK
+    body = await response.json()
+    counts = {genre['uuid']: genre['films_count'] for genre in body}
+    assert counts == {
+        str(genre.id): sum(1 for film in films if genre.id in {g.id for g in film.genres}) for genre in genres
+    }
+
+
 @pytest.mark.asyncio
 async def test_get_genre_in_redis(redis_write_data, make_get_request):
     id = uuid.uuid4()
@@ -1,3 +1,4 @@
+import json
 import uuid
 from http import HTTPStatus
 from uuid import UUID
@@ -6,13 +7,13 @@ from typing import Any, Dict, List
 import pytest
 from pydantic import BaseModel as PydanticBaseModel, ConfigDict, field_validator, Field
 
-from tests.functional.utils.models import Person, Film, FilmPerson
+from tests.functional.utils.models import Person, Film, FilmPerson, film_response
 from tests.functional.utils.data_generators import generate_films, generate_persons, generate_person
 
 _PERSONS_INDEX_NAME = 'personas'
 _FILMS_INDEX_NAME = 'movies'
-_PERSON_ID_KEY_PREFIX = 'person_id_'
-_FILMS_ID_KEY_PREFIX = 'films'
+_PERSON_ID_KEY_PREFIX = 'person_details_'
+_FILMS_ID_KEY_PREFIX = 'films:details'
 
 
 @pytest.mark.asyncio
@@ -32,7 +33,7 @@ async def test_get_existing_person_by_id(es_write_data, make_get_request) -> Non
 async def test_get_person_by_id_from_cache(redis_write_data, make_get_request) -> None:
     person = generate_person()
     redis_key = _PERSON_ID_KEY_PREFIX + str(person.id)
-    await redis_write_data(redis_key, person.model_dump_json())
+    await redis_write_data(redis_key, json.dumps(_expected_person(person)))
 
     response = await make_get_request(f'api/v1/persons/{person.id}')
 
@@ -96,8 +97,7 @@ async def test_get_films_for_person(es_write_data, make_get_request) -> None:
         *generate_films(directors=[FilmPerson(id=person_id, name=person_full_name)], cnt=3),
     ]
     person = generate_person(id=person_id, full_name=person_full_name, films=films)
-    await es_write_data([_build_es_person(person)])
-    await es_write_data([_build_es_film(film) for film in films])
+    await es_write_data([_build_es_person(person), *(_build_es_film(film) for film in films)])
 
     response = await make_get_request(f'api/v1/persons/{person.id}/film')
 
@@ -117,10 +117,10 @@ async def test_get_films_for_person_from_cache(redis_write_data, make_get_reques
     ]
     person = generate_person(id=person_id, full_name=person_full_name, films=films)
     person_redis_key = _PERSON_ID_KEY_PREFIX + str(person.id)
-    await redis_write_data(person_redis_key, person.model_dump_json())
+    await redis_write_data(person_redis_key, json.dumps(_expected_person(person)))
     for film in films:
         film_redis_key = _FILMS_ID_KEY_PREFIX + ':' + str(film.id)
-        await redis_write_data(film_redis_key, film.model_dump_json())
+        await redis_write_data(film_redis_key, json.dumps(film_response(film)))
 
     response = await make_get_request(f'api/v1/persons/{person.id}/film')
 
@@ -155,6 +155,7 @@ def _expected_persons(persons: List[Person]) -> Dict[str, Any]:
 
 
 def _expected_films(films: List[Film]) -> Dict[str, Any]:
+    films = sorted(films, key=lambda film: (-film.imdb_rating, film.title))
     return [_FilmResponse.model_validate(film).model_dump() for film in films]
 
 
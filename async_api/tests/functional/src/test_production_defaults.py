@@ -0,0 +1,87 @@
+"""
+Tests of the async_api service of docker-compose.yml, which keeps the production defaults: the id filter and
+the suggestions cache are on. Documents reach it the way they reach production, with a release that moves
+the indices to new cache generations.
+
+The service reads the indices without a worker prefix and Redis database REDIS_DB, only this module uses them.
+"""
+import asyncio
+import time
+import uuid
+from http import HTTPStatus
+from typing import Dict
+
+import pytest
+import pytest_asyncio
+from elasticsearch.helpers import async_bulk
+from redis.asyncio import Redis
+
+from tests.functional.plugins.es import create_indices, delete_indices
+from tests.functional.settings import test_settings
+from tests.functional.utils.data_generators import generate_films
+from tests.functional.utils.models import Film
+
+# Generations of the indices the service caches, changes are published on the channel of the same name
+_GENERATIONS_KEY = 'cache:generations'
+_INDICES = {index: index for index in ('movies', 'personas', 'genres')}
+# Workers rebuild their id filters after a release, until then every id is looked up in Elasticsearch
+_RELEASE_TIMEOUT_SECONDS = 10
+
+
+@pytest_asyncio.fixture
+async def production_indices(es_client):
+    await create_indices(es_client, _INDICES)
+    yield _INDICES
+    await delete_indices(es_client, _INDICES)
+
+
+@pytest_asyncio.fixture
+async def production_redis():
+    redis = Redis(host=test_settings.redis_host, port=test_settings.redis_port, db=test_settings.redis_db)
+    yield redis
+    await redis.aclose()
+
+
+async def _release(redis: Redis, indices: Dict[str, str]) -> None:
+    for name in indices.values():
+        generation = await redis.hincrby(_GENERATIONS_KEY, name, 1)
+        await redis.publish(_GENERATIONS_KEY, f'{name}:{generation}')
+
+
+async def _get(aiohttp_session, path: str):
+    url = f'http://{test_settings.service_host}:{test_settings.service_port}/{path}'
+    return await aiohttp_session.get(url)
+
+
+async def _get_until_found(aiohttp_session, path: str):
+    deadline = time.monotonic() + _RELEASE_TIMEOUT_SECONDS
+    while True:
+        response = await _get(aiohttp_session, path)
+        if response.status != HTTPStatus.NOT_FOUND or time.monotonic() > deadline:
+            return response
+        await asyncio.sleep(0.2)
+
+
+@pytest.mark.asyncio
+async def test_released_films_are_served(es_client, production_indices, production_redis, aiohttp_session):
+    keyword = 'starship'
+    films = generate_films(keyword=keyword, cnt=10)
+    # Films above the subscription threshold are for subscribers only
+    films[0].imdb_rating = 5.0
+    await async_bulk(client=es_client, actions=[
+        {'_index': production_indices['movies'], '_id': str(film.id), '_source': film.model_dump()} for film in films
+    ])
+    await es_client.indices.refresh(index=production_indices['movies'])
+    await _release(production_redis, production_indices)
+
+    response = await _get_until_found(aiohttp_session, f'api/v1/films/{films[0].id}')
+    assert response.status == HTTPStatus.OK
+    assert Film(**await response.json()) == films[0]
+
+    response = await _get(aiohttp_session, f'api/v1/films/{uuid.uuid4()}')
+    assert response.status == HTTPStatus.NOT_FOUND
+
+    response = await _get(aiohttp_session, 'api/v1/suggest?query=Stars&limit=20')
+    assert response.status == HTTPStatus.OK
+    body = await response.json()
+    assert {film['uuid'] for film in body['films']} == {str(film.id) for film in films if keyword in film.title}
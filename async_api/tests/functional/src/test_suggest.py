@@ -0,0 +1,37 @@
+from http import HTTPStatus
+
+import pytest
+
+from tests.functional.utils.data_generators import generate_films
+
+_MOVIES_INDEX_NAME = 'movies'
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures('films_index', 'persons_index')
+async def test_suggest_films_by_prefix(es_write_data, make_get_request):
+    keyword = 'starship'
+    films = generate_films(keyword=keyword, cnt=10)
+    await es_write_data([
+        {'_index': _MOVIES_INDEX_NAME, '_id': str(film.id), '_source': film.model_dump()} for film in films
+    ])
+    expected = sorted(
+        (film for film in films if keyword in film.title), key=lambda film: -film.imdb_rating
+    )
+
+    response = await make_get_request('api/v1/suggest?query=Stars&limit=20')
+
+    assert response.status == HTTPStatus.OK
+    body = await response.json()
+    assert body['persons'] == []
+    assert body['films'] == [
+        {'uuid': str(film.id), 'title': film.title, 'imdb_rating': film.imdb_rating} for film in expected
+    ]
+
+
+@pytest.mark.asyncio
+async def test_suggest_without_words(make_get_request):
+    response = await make_get_request('api/v1/suggest?query=***')
+
+    assert response.status == HTTPStatus.OK
+    assert await response.json() == {'films': [], 'persons': []}
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, Dict, List
 from uuid import UUID
 
 from pydantic import BaseModel as PydanticBaseModel, Field, AliasChoices
@@ -38,3 +38,19 @@ class Film(BaseModel):
 class Genre(BaseModel):
     id: UUID
     name: str
+
+
+def film_response(film: Film) -> Dict[str, Any]:
+    """Build the film as the API returns and caches it."""
+    persons = {
+        role: [{'uuid': str(p.id), 'full_name': p.name} for p in getattr(film, role)]
+        for role in ('actors', 'writers', 'directors')
+    }
+    return {
+        'uuid': str(film.id),
+        'title': film.title,
+        'imdb_rating': film.imdb_rating,
+        'description': film.description,
+        'genres': [{'uuid': str(g.id), 'name': g.name} for g in film.genres],
+        **persons,
+    }
@@ -0,0 +1,322 @@
+"""
+Generate a synthetic catalog of any size as dumps in the format of infra/es_data, to benchmark the service,
+its caches and Elasticsearch at production scale.
+
+The shape of the data follows the real dumps: numbers of genres, actors, writers and directors per film, ratings,
+lengths of titles, descriptions and names, and skewed popularity of genres. Filmography sizes follow a Zipf
+distribution, most persons have a film or two and a few have hundreds. Dumps are written as documents are
+generated, only ids and the casts are kept in memory. The same seed always gives the same catalog.
+
+    cd async_api
+    python -m tests.load.catalog /tmp/catalog --films 1000000 --seed 1
+    python -m tests.load.run --data-dir /tmp/catalog
+    cd src && python -m jobs.load_es /tmp/catalog
+"""
+import argparse
+import logging
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+import orjson
+
+_DATA_DIR = Path(__file__).resolve().parents[3] / 'infra' / 'es_data'
+_INDICES = ('movies', 'personas', 'genres')
+_ROLES = ('actors', 'writers', 'directors')
+_ROLE_NAMES = ('actor', 'writer', 'director')
+# Films of infra/es_data by the number of genres (from 1), actors, writers and directors (from 0)
+_GENRE_COUNTS = (337, 278, 272, 65, 29, 12, 4, 1, 1)
+_ROLE_COUNTS = (
+    (70, 67, 40, 34, 788),
+    (320, 284, 191, 101, 44, 27, 11, 4, 3, 4, 4, 0, 1, 2, 2),
+    (304, 607, 69, 11, 4, 2, 0, 1),
+)
+# Persons of infra/es_data by the number of parts of their names, from 1
+_NAME_PARTS = (30, 3779, 345, 12)
+# Genres of infra/es_data, most popular first
+_GENRE_NAMES = (
+    'Sci-Fi', 'Action', 'Adventure', 'Comedy', 'Drama', 'Short', 'Documentary', 'Animation', 'Family', 'Fantasy',
+    'Romance', 'Music', 'Reality-TV', 'Biography', 'Thriller', 'Musical', 'Sport', 'History', 'Western',
+    'Game-Show', 'Horror', 'Crime', 'Mystery', 'War', 'Talk-Show', 'News',
+)
+_RATING_MEAN = 6.6
+_RATING_SD = 1.4
+_UNRATED = 0.001
+_UNDESCRIBED = 0.25
+# Words of titles are 1 + Poisson, of descriptions log-normal with a long tail
+_TITLE_EXTRA_WORDS = 3.7
+_DESCRIPTION_WORDS = (3.8, 0.6)
+_MAX_DESCRIPTION_WORDS = 600
+_VOCABULARY = 50000
+_FIRST_NAMES = 3000
+_LAST_NAMES = 60000
+# Word and genre popularity is Zipfian as well
+_WORD_SKEW = 1.07
+# Last names repeat far less than first names
+_LAST_NAME_SKEW = 0.5
+_GENRE_SKEW = 1.0
+_FILMOGRAPHY_SKEW = 2.2
+_MAX_FILMOGRAPHY = 3000
+_CHUNK_SIZE = 10000
+_CONSONANTS = ('b', 'c', 'd', 'f', 'g', 'h', 'k', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'z',
+               'br', 'ch', 'cl', 'dr', 'gr', 'sh', 'st', 'th', 'tr')
+_VOWELS = ('a', 'e', 'i', 'o', 'u', 'a', 'e', 'o', 'ai', 'ea', 'ou', 'y')
+
+logger = logging.getLogger('load')
+
+
+class CatalogStats(NamedTuple):
+    films: int
+    persons: int
+    genres: int
+    seconds: float
+
+
+class _Words:
+    """A vocabulary of made-up words picked with Zipfian frequencies."""
+
+    def __init__(self, rng: np.random.Generator, size: int, skew: float, capitalize: bool = False) -> None:
+        syllables = rng.integers(1, 5, size)
+        consonants = rng.integers(0, len(_CONSONANTS), (size, 5))
+        vowels = rng.integers(0, len(_VOWELS), (size, 4))
+        self.words = [
+            ''.join(_CONSONANTS[c] + _VOWELS[v] for c, v in zip(consonants[i, :n], vowels[i, :n]))
+            + (_CONSONANTS[consonants[i, 4]] if consonants[i, 4] % 2 else '')
+            for i, n in enumerate(syllables)
+        ]
+        if capitalize:
+            self.words = [w.capitalize() for w in self.words]
+        self._cdf = _zipf_cdf(size, skew)
+
+    def pick(self, rng: np.random.Generator, size: int | Tuple[int, ...]) -> np.ndarray:
+        return _pick(rng, self._cdf, size)
+
+    def text(self, picked: Sequence[int]) -> str:
+        return ' '.join(self.words[i] for i in picked)
+
+
+class _Persons:
+    """Ids and names of persons, formatted when written, millions of them do not fit in memory as strings."""
+
+    def __init__(self, rng: np.random.Generator, count: int) -> None:
+        self.ids = _uuid_bytes(rng, count)
+        self._first = _Words(rng, _FIRST_NAMES, _WORD_SKEW, capitalize=True)
+        self._last = _Words(rng, _LAST_NAMES, _LAST_NAME_SKEW, capitalize=True)
+        self._parts = 1 + _draw(rng, _NAME_PARTS, count)
+        self._first_names = self._first.pick(rng, (count, 3))
+        self._last_names = self._last.pick(rng, count)
+
+    def id(self, person: int) -> str:
+        return str(uuid.UUID(bytes=self.ids[person].tobytes()))
+
+    def name(self, person: int) -> str:
+        first = self._first_names[person, :self._parts[person] - 1]
+        return ' '.join([*(self._first.words[i] for i in first), self._last.words[self._last_names[person]]])
+
+
+class SyntheticCatalog:
+    def __init__(
+        self,
+        films: int,
+        genres: int = len(_GENRE_NAMES),
+        seed: int = 0,
+        filmography_skew: float = _FILMOGRAPHY_SKEW,
+        max_filmography: int = _MAX_FILMOGRAPHY,
+        unrated: float = _UNRATED,
+    ) -> None:
+        self.films = films
+        self.genres = genres
+        self.seed = seed
+        self.filmography_skew = filmography_skew
+        self.max_filmography = max_filmography
+        self.unrated = unrated
+
+    def write(self, out_dir: Path) -> CatalogStats:
+        """Write settings, mappings and data dumps of all indices to the directory."""
+        started = time.perf_counter()
+        out_dir.mkdir(parents=True, exist_ok=True)
+        for index in _INDICES:
+            for dump in ('settings', 'mapping'):
+                shutil.copyfile(_DATA_DIR / f'{index}_{dump}.json', out_dir / f'{index}_{dump}.json')
+
+        rng = np.random.default_rng(self.seed)
+        genres = self._write_genres(rng, out_dir / 'genres_data.json')
+        # Slots of every role of every film, in film order, are filled with persons in random order
+        role_counts = np.stack([_draw(rng, counts, self.films) for counts in _ROLE_COUNTS], axis=1)
+        slots = self._cast(rng, int(role_counts.sum()))
+        persons = _Persons(rng, int(slots.max()) + 1 if len(slots) else 0)
+        film_ids = _uuid_bytes(rng, self.films)
+        credits = self._write_films(rng, out_dir / 'movies_data.json', film_ids, genres, role_counts, slots, persons)
+        written = self._write_persons(out_dir / 'personas_data.json', film_ids, persons, *credits)
+
+        stats = CatalogStats(self.films, written, len(genres), time.perf_counter() - started)
+        logger.info('Generated %s films, %s persons and %s genres in %.1f s',
+                    stats.films, stats.persons, stats.genres, stats.seconds)
+        return stats
+
+    def _write_genres(self, rng: np.random.Generator, path: Path) -> List[Dict[str, str]]:
+        names = list(_GENRE_NAMES[:self.genres])
+        if self.genres > len(names):
+            extra = _Words(rng, self.genres * 2, 0, capitalize=True).words
+            names.extend(w for w in dict.fromkeys(extra) if w not in names)
+            names = names[:self.genres]
+        ids = _uuid_bytes(rng, len(names))
+        genres = [{'id': str(uuid.UUID(bytes=i.tobytes())), 'name': n} for i, n in zip(ids, names)]
+        with open(path, 'wb') as f:
+            for genre in genres:
+                f.write(_dump_line('genres', genre))
+        return genres
+
+    def _cast(self, rng: np.random.Generator, slots: int) -> np.ndarray:
+        """Persons of all slots, every person takes as many slots as the Zipfian size of their filmography."""
+        sizes, total = [], 0
+        while total < slots:
+            batch = np.minimum(rng.zipf(self.filmography_skew, max(slots // 2, 1024)), self.max_filmography)
+            sizes.append(batch)
+            total += int(batch.sum())
+        if not sizes:
+            return np.zeros(0, dtype=np.int32)
+        sizes = np.concatenate(sizes)
+        persons = int(np.searchsorted(np.cumsum(sizes), slots)) + 1
+        sizes = sizes[:persons]
+        sizes[-1] -= int(sizes.sum()) - slots
+        cast = np.repeat(np.arange(persons, dtype=np.int32), sizes)
+        rng.shuffle(cast)
+        return cast
+
+    def _write_films(
+        self,
+        rng: np.random.Generator,
+        path: Path,
+        film_ids: np.ndarray,
+        genres: List[Dict[str, str]],
+        role_counts: np.ndarray,
+        slots: np.ndarray,
+        persons: _Persons,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Write the films, returns the person, film and role of every credit."""
+        words = _Words(rng, _VOCABULARY, _WORD_SKEW)
+        genre_cdf = _zipf_cdf(len(genres), _GENRE_SKEW)
+        offsets = np.concatenate(([0], np.cumsum(role_counts.ravel())))
+        credit_persons = np.empty(len(slots), dtype=np.int32)
+        credit_films = np.empty(len(slots), dtype=np.int32)
+        credit_roles = np.empty(len(slots), dtype=np.int8)
+        credits = 0
+
+        with open(path, 'wb') as f:
+            for start in range(0, self.films, _CHUNK_SIZE):
+                stop = min(start + _CHUNK_SIZE, self.films)
+                size = stop - start
+                ratings = np.round(np.clip(rng.normal(_RATING_MEAN, _RATING_SD, size), 1, 10), 1)
+                rated = rng.random(size) >= self.unrated
+                described = rng.random(size) >= _UNDESCRIBED
+                genre_counts = 1 + _draw(rng, _GENRE_COUNTS, size)
+                genre_picks = _pick(rng, genre_cdf, (size, len(_GENRE_COUNTS)))
+                title_words = 1 + np.minimum(rng.poisson(_TITLE_EXTRA_WORDS, size), 14)
+                description_words = np.clip(
+                    np.round(rng.lognormal(*_DESCRIPTION_WORDS, size)), 3, _MAX_DESCRIPTION_WORDS).astype(int)
+                text = words.pick(rng, int(title_words.sum() + description_words.sum()))
+                text_offset = 0
+
+                for i, film in enumerate(range(start, stop)):
+                    title = words.text(text[text_offset:text_offset + title_words[i]])
+                    text_offset += title_words[i]
+                    description = words.text(text[text_offset:text_offset + description_words[i]])
+                    text_offset += description_words[i]
+                    source: Dict[str, Any] = {
+                        'id': str(uuid.UUID(bytes=film_ids[film].tobytes())),
+                        'imdb_rating': float(ratings[i]) if rated[i] else None,
+                        'genres': [genres[g] for g in dict.fromkeys(genre_picks[i, :genre_counts[i]].tolist())],
+                        'title': title.capitalize(),
+                        'description': description.capitalize() + '.' if described[i] else None,
+                    }
+                    for role_index, role in enumerate(_ROLES):
+                        slot = film * len(_ROLES) + role_index
+                        # A person filling two slots of a role is credited once
+                        members = list(dict.fromkeys(slots[offsets[slot]:offsets[slot + 1]].tolist()))
+                        credit_persons[credits:credits + len(members)] = members
+                        credit_films[credits:credits + len(members)] = film
+                        credit_roles[credits:credits + len(members)] = role_index
+                        credits += len(members)
+                        names = [persons.name(p) for p in members]
+                        source[role] = [{'id': persons.id(p), 'name': n} for p, n in zip(members, names)]
+                        source[f'{role}_names'] = names
+                    f.write(_dump_line('movies', source))
+                logger.debug('Generated %s of %s films', stop, self.films)
+        return credit_persons[:credits], credit_films[:credits], credit_roles[:credits]
+
+    def _write_persons(
+        self,
+        path: Path,
+        film_ids: np.ndarray,
+        persons: _Persons,
+        credit_persons: np.ndarray,
+        credit_films: np.ndarray,
+        credit_roles: np.ndarray,
+    ) -> int:
+        """Write the persons credited in any film with their films, returns the number of persons."""
+        order = np.lexsort((credit_roles, credit_films, credit_persons))
+        credit_persons, credit_films, credit_roles = credit_persons[order], credit_films[order], credit_roles[order]
+        starts = np.flatnonzero(np.diff(credit_persons, prepend=-1))
+        ends = np.append(starts[1:], len(credit_persons))
+        with open(path, 'wb') as f:
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                person = int(credit_persons[start])
+                films: Dict[int, List[str]] = {}
+                for film, role in zip(credit_films[start:end].tolist(), credit_roles[start:end].tolist()):
+                    films.setdefault(film, []).append(_ROLE_NAMES[role])
+                f.write(_dump_line('personas', {
+                    'id': persons.id(person),
+                    'full_name': persons.name(person),
+                    'films': [{'id': str(uuid.UUID(bytes=film_ids[film].tobytes())), 'roles': roles}
+                              for film, roles in films.items()],
+                }))
+        return len(starts)
+
+
+def _zipf_cdf(size: int, skew: float) -> np.ndarray:
+    weights = 1 / np.arange(1, size + 1) ** skew
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def _pick(rng: np.random.Generator, cdf: np.ndarray, size: int | Tuple[int, ...]) -> np.ndarray:
+    return np.minimum(np.searchsorted(cdf, rng.random(size), side='right'), len(cdf) - 1)
+
+
+def _draw(rng: np.random.Generator, counts: Sequence[int], size: int) -> np.ndarray:
+    """Values from 0 with the frequencies of the counts."""
+    p = np.asarray(counts, dtype=float)
+    return rng.choice(len(counts), size, p=p / p.sum())
+
+
+def _uuid_bytes(rng: np.random.Generator, count: int) -> np.ndarray:
+    """Bytes of random version 4 UUIDs, one row each."""
+    ids = rng.integers(0, 256, (count, 16), dtype=np.uint8)
+    ids[:, 6] = ids[:, 6] & 0x0F | 0x40
+    ids[:, 8] = ids[:, 8] & 0x3F | 0x80
+    return ids
+
+
+def _dump_line(index: str, source: Dict[str, Any]) -> bytes:
+    hit = {'_index': index, '_id': source['id'], '_score': 1, '_source': source}
+    return orjson.dumps(hit, option=orjson.OPT_APPEND_NEWLINE)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('out_dir', type=Path, help='directory to write the dumps to')
+    parser.add_argument('--films', type=int, default=100000)
+    parser.add_argument('--genres', type=int, default=len(_GENRE_NAMES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--filmography-skew', type=float, default=_FILMOGRAPHY_SKEW,
+                        help='exponent of the Zipf distribution of filmography sizes, greater than 1')
+    parser.add_argument('--max-filmography', type=int, default=_MAX_FILMOGRAPHY, help='films per person at most')
+    parser.add_argument('--unrated', type=float, default=_UNRATED, help='share of films without a rating')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    SyntheticCatalog(args.films, args.genres, args.seed, args.filmography_skew, args.max_filmography,
+                     args.unrated).write(args.out_dir)
@@ -0,0 +1,619 @@
+import asyncio
+import fnmatch
+import json
+import re
+import multiprocessing
+import time
+import urllib.request
+import uuid
+from multiprocessing.connection import Connection
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+import jwt
+from aiohttp import web
+from fakeredis import TcpFakeServer
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_MUSTACHE_RE = re.compile(r'{{(\w+)}}')
+
+
+def tokenize(text: Any) -> List[str]:
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def iter_dump(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield documents of an elasticdump data file (one JSON hit per line)."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_mapping(path: Path) -> Dict[str, Any]:
+    """Read an elasticdump mapping file and return the properties of its single index."""
+    with open(path, encoding='utf-8') as f:
+        mapping = json.load(f)
+    if isinstance(mapping, str):
+        mapping = json.loads(mapping)
+    (index_mapping,) = mapping.values()
+    return index_mapping['mappings']['properties']
+
+
+def load_analysis(path: Path) -> Dict[str, Any]:
+    """Read an elasticdump settings file and return the analysis settings of its single index."""
+    if not path.exists():
+        return {}
+    with open(path, encoding='utf-8') as f:
+        settings = json.load(f)
+    if isinstance(settings, str):
+        settings = json.loads(settings)
+    (index_settings,) = settings.values()
+    return index_settings['settings']['index'].get('analysis') or {}
+
+
+class FakeIndex:
+    def __init__(self, name: str, properties: Dict[str, Any], analysis: Dict[str, Any] | None = None) -> None:
+        self.name = name
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.field_types: Dict[str, str] = {}
+        self.source_paths: Dict[str, str] = {}
+        # Fields indexed with an edge_ngram token filter, with its min_gram and max_gram
+        self.edge_ngrams: Dict[str, Tuple[int, int]] = {}
+        self._analysis = analysis or {}
+        self.tokens: Dict[Tuple[int, str], frozenset] = {}
+        self.keywords: Dict[Tuple[int, str], frozenset] = {}
+        self._expanded_fields: Dict[str, List[str]] = {}
+        self._flatten(properties)
+
+    def _flatten(self, properties: Dict[str, Any], prefix: str = '') -> None:
+        for name, field in properties.items():
+            path = f'{prefix}{name}'
+            self.field_types[path] = field.get('type', 'object')
+            self.source_paths[path] = path
+            self._add_edge_ngrams(path, field)
+            for sub_name, sub_field in (field.get('fields') or {}).items():
+                self.field_types[f'{path}.{sub_name}'] = sub_field['type']
+                self.source_paths[f'{path}.{sub_name}'] = path
+                self._add_edge_ngrams(f'{path}.{sub_name}', sub_field)
+            if 'properties' in field:
+                self._flatten(field['properties'], f'{path}.')
+
+    def _add_edge_ngrams(self, path: str, field: Dict[str, Any]) -> None:
+        analyzer = (self._analysis.get('analyzer') or {}).get(field.get('analyzer'), {})
+        for name in analyzer.get('filter', []):
+            token_filter = (self._analysis.get('filter') or {}).get(name, {})
+            if token_filter.get('type') == 'edge_ngram':
+                self.edge_ngrams[path] = (int(token_filter.get('min_gram', 1)), int(token_filter.get('max_gram', 2)))
+
+    def text_fields(self) -> List[str]:
+        return [f for f, t in self.field_types.items() if t == 'text']
+
+    def expand_fields(self, pattern: str) -> List[str]:
+        if pattern not in self._expanded_fields:
+            self._expanded_fields[pattern] = fnmatch.filter(self.field_types, pattern)
+        return self._expanded_fields[pattern]
+
+    def is_stored(self, doc: Dict[str, Any]) -> bool:
+        return doc is self.docs.get(doc.get('id'))
+
+
+class FakeElasticsearch:
+    """Evaluates the subset of the Elasticsearch search DSL used by the service over in-memory documents."""
+
+    def __init__(self) -> None:
+        self.indices: Dict[str, FakeIndex] = {}
+        self.scripts: Dict[str, str] = {}
+        # Points in time are just names of their index, searches on them see changes made meanwhile
+        self.pits: Dict[str, str] = {}
+        self.requests = 0
+
+    @classmethod
+    def from_dumps(
+        cls, data_dir: Path, indices: Iterable[str] = ('movies', 'genres', 'personas')
+    ) -> 'FakeElasticsearch':
+        es = cls()
+        for name in indices:
+            properties = load_mapping(data_dir / f'{name}_mapping.json')
+            index = FakeIndex(name, properties, load_analysis(data_dir / f'{name}_settings.json'))
+            for hit in iter_dump(data_dir / f'{name}_data.json'):
+                index.docs[hit['_id']] = hit['_source']
+            es.indices[name] = index
+        return es
+
+    def search(self, index_name: str | None, body: Dict[str, Any]) -> Dict[str, Any]:
+        self.requests += 1
+        if body.get('pit'):
+            index_name = self.pits[body['pit']['id']]
+        index = self.indices.get(index_name)
+        if index is None:
+            raise KeyError(index_name)
+        started = time.perf_counter()
+        query = body.get('query') or {'match_all': {}}
+        hits: List[Tuple[float, str, Dict[str, Any]]] = []
+        for doc_id, doc in self._candidates(index, query):
+            score = self._score(index, doc, doc_id, query)
+            if score is not None:
+                hits.append((score, doc_id, doc))
+        sort = body.get('sort')
+        if body.get('pit') and sort:
+            # Searches on a point in time break ties with an implicit sort on _shard_doc
+            sort = [*_as_list(sort), {'_shard_doc': 'asc'}]
+        hits = self._sort(hits, sort)
+        if body.get('search_after') is not None:
+            if len(body['search_after']) != len(self._sort_specs(sort)):
+                raise ValueError('search_after has %s value(s) but sort has %s' % (
+                    len(body['search_after']), len(self._sort_specs(sort))))
+            hits = [h for h in hits if self._is_after(h, sort, body['search_after'])]
+        offset, size = body.get('from', 0), body.get('size', 10)
+        aggs = body.get('aggs') or body.get('aggregations')
+        aggregations = self._aggregate(index, [(doc, doc) for _, _, doc in hits], aggs) if aggs else None
+        return {
+            **({'aggregations': aggregations} if aggs else {}),
+            **({'pit_id': body['pit']['id']} if body.get('pit') else {}),
+            'took': int((time.perf_counter() - started) * 1000),
+            'timed_out': False,
+            'hits': {
+                'total': {'value': len(hits), 'relation': 'eq'},
+                'max_score': max((h[0] for h in hits), default=None),
+                'hits': [
+                    {
+                        '_index': index_name,
+                        '_id': doc_id,
+                        '_score': score,
+                        '_source': self._project(doc, body.get('_source', True)),
+                        **({'sort': self._sort_values((score, doc_id, doc), sort)} if sort else {}),
+                    }
+                    for score, doc_id, doc in hits[offset:offset + size]
+                ],
+            },
+        }
+
+    def search_template(self, index_name: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Render a stored mustache template with plain {{name}} placeholders and run the search."""
+        params = body.get('params') or {}
+
+        def value(match: re.Match) -> str:
+            param = params.get(match.group(1), '')
+            return json.dumps(param)[1:-1] if isinstance(param, str) else json.dumps(param)
+
+        rendered = _MUSTACHE_RE.sub(value, self.scripts[body['id']])
+        return self.search(index_name, json.loads(rendered))
+
+    def _aggregate(self, index: FakeIndex, items: List[Tuple[Dict[str, Any], Dict[str, Any]]], aggs) -> Dict[str, Any]:
+        """Evaluate nested, reverse_nested and terms aggregations over (document, root document) pairs."""
+        results = {}
+        for name, spec in aggs.items():
+            sub_aggs = spec.get('aggs') or spec.get('aggregations') or {}
+            if 'nested' in spec:
+                path = spec['nested']['path']
+                nested = [({**doc, path: [item]}, root) for doc, root in items for item in doc.get(path) or []]
+                results[name] = {'doc_count': len(nested), **self._aggregate(index, nested, sub_aggs)}
+            elif 'reverse_nested' in spec:
+                roots = list({id(root): (root, root) for _, root in items}.values())
+                results[name] = {'doc_count': len(roots), **self._aggregate(index, roots, sub_aggs)}
+            elif 'terms' in spec:
+                groups: Dict[Any, List[Tuple[Dict[str, Any], Dict[str, Any]]]] = {}
+                for doc, root in items:
+                    for value in dict.fromkeys(self._values(index, doc, spec['terms']['field'])):
+                        groups.setdefault(value, []).append((doc, root))
+                ordered = sorted(groups.items(), key=lambda group: (-len(group[1]), str(group[0])))
+                results[name] = {'buckets': [
+                    {'key': key, 'doc_count': len(group), **self._aggregate(index, group, sub_aggs)}
+                    for key, group in ordered[:spec['terms'].get('size', 10)]
+                ]}
+            else:
+                raise ValueError(f'unsupported aggregation {name}')
+        return results
+
+    @staticmethod
+    def _candidates(index: FakeIndex, query: Dict[str, Any]) -> Iterable[Tuple[str, Dict[str, Any]]]:
+        # Documents are stored by id, so id lookups don't need a full scan
+        ((kind, spec),) = query.items()
+        ids = None
+        if kind in ('match', 'term') and list(spec) == ['id']:
+            value = spec['id']
+            ids = [value.get('query', value.get('value')) if isinstance(value, dict) else value]
+        elif kind == 'ids':
+            ids = spec['values']
+        elif kind == 'terms' and 'id' in spec:
+            ids = spec['id']
+        if ids is None:
+            return index.docs.items()
+        return [(str(i), index.docs[str(i)]) for i in ids if str(i) in index.docs]
+
+    def _score(self, index: FakeIndex, doc: Dict[str, Any], doc_id: str, query: Dict[str, Any]) -> float | None:
+        ((kind, spec),) = query.items()
+        handler: Callable[..., float | None] = getattr(self, f'_query_{kind}', None)
+        if handler is None:
+            raise ValueError(f'unsupported query {kind}')
+        return handler(index, doc, doc_id, spec)
+
+    def _query_match_all(self, index, doc, doc_id, spec) -> float | None:
+        return 1.0
+
+    def _query_ids(self, index, doc, doc_id, spec) -> float | None:
+        return 1.0 if doc_id in spec['values'] else None
+
+    def _query_match(self, index, doc, doc_id, spec) -> float | None:
+        ((field, value),) = spec.items()
+        operator = 'or'
+        if isinstance(value, dict):
+            operator = value.get('operator', 'or').lower()
+            value = value['query']
+        return self._match_field(index, doc, field, value, operator)
+
+    def _query_term(self, index, doc, doc_id, spec) -> float | None:
+        ((field, value),) = spec.items()
+        if isinstance(value, dict):
+            value = value['value']
+        return 1.0 if str(value) in self._keywords(index, doc, field) else None
+
+    def _query_terms(self, index, doc, doc_id, spec) -> float | None:
+        ((field, values),) = ((k, v) for k, v in spec.items() if k != 'boost')
+        return 1.0 if {str(v) for v in values} & self._keywords(index, doc, field) else None
+
+    def _query_range(self, index, doc, doc_id, spec) -> float | None:
+        ((field, bounds),) = spec.items()
+        checks = {
+            'gte': lambda v, b: v >= b, 'gt': lambda v, b: v > b,
+            'lte': lambda v, b: v <= b, 'lt': lambda v, b: v < b,
+        }
+        for value in self._values(index, doc, field):
+            if all(check(value, bounds[op]) for op, check in checks.items() if op in bounds):
+                return 1.0
+        return None
+
+    def _query_exists(self, index, doc, doc_id, spec) -> float | None:
+        return 1.0 if self._values(index, doc, spec['field']) else None
+
+    def _query_nested(self, index, doc, doc_id, spec) -> float | None:
+        path = spec['path']
+        scores = []
+        for item in doc.get(path) or []:
+            score = self._score(index, {**doc, path: [item]}, doc_id, spec['query'])
+            if score is not None:
+                scores.append(score)
+        return max(scores) if scores else None
+
+    def _query_bool(self, index, doc, doc_id, spec) -> float | None:
+        score = 0.0
+        for clause in _as_list(spec.get('must')):
+            clause_score = self._score(index, doc, doc_id, clause)
+            if clause_score is None:
+                return None
+            score += clause_score
+        for clause in _as_list(spec.get('filter')):
+            if self._score(index, doc, doc_id, clause) is None:
+                return None
+        for clause in _as_list(spec.get('must_not')):
+            if self._score(index, doc, doc_id, clause) is not None:
+                return None
+        should = [self._score(index, doc, doc_id, c) for c in _as_list(spec.get('should'))]
+        matched = [s for s in should if s is not None]
+        required = spec.get('minimum_should_match', 0 if spec.get('must') or spec.get('filter') else 1 if should else 0)
+        if len(matched) < int(required):
+            return None
+        return score + sum(matched) or 1.0
+
+    def _query_query_string(self, index, doc, doc_id, spec) -> float | None:
+        fields = spec.get('fields') or index.text_fields() + [f for f, t in index.field_types.items() if t == 'keyword']
+        return self._multi_match(index, doc, fields, spec['query'], spec.get('default_operator', 'or').lower())
+
+    def _query_multi_match(self, index, doc, doc_id, spec) -> float | None:
+        return self._multi_match(index, doc, spec['fields'], spec['query'], spec.get('operator', 'or').lower())
+
+    def _multi_match(self, index, doc, fields, text, operator) -> float | None:
+        best = None
+        for pattern in fields:
+            pattern, _, boost = pattern.partition('^')
+            for field in index.expand_fields(pattern):
+                score = self._match_field(index, doc, field, text, operator)
+                if score is not None:
+                    score *= float(boost or 1)
+                    best = score if best is None else max(best, score)
+        return best
+
+    def _match_field(self, index, doc, field, value, operator) -> float | None:
+        if index.field_types.get(field) != 'text':
+            return 1.0 if str(value) in self._keywords(index, doc, field) else None
+        query_tokens = set(tokenize(value))
+        doc_tokens = index.tokens.get((id(doc), field))
+        if doc_tokens is None:
+            doc_tokens = frozenset(t for v in self._values(index, doc, field) for t in tokenize(v))
+            if field in index.edge_ngrams:
+                min_gram, max_gram = index.edge_ngrams[field]
+                doc_tokens = frozenset(t[:n] for t in doc_tokens for n in range(min_gram, min(len(t), max_gram) + 1))
+            if index.is_stored(doc):
+                index.tokens[(id(doc), field)] = doc_tokens
+        matched = query_tokens & doc_tokens
+        if not matched or (operator == 'and' and matched != query_tokens):
+            return None
+        return float(len(matched))
+
+    def _keywords(self, index, doc, field) -> frozenset:
+        keywords = index.keywords.get((id(doc), field))
+        if keywords is None:
+            keywords = frozenset(str(v) for v in self._values(index, doc, field))
+            if index.is_stored(doc):
+                index.keywords[(id(doc), field)] = keywords
+        return keywords
+
+    def _values(self, index: FakeIndex, doc: Dict[str, Any], field: str) -> List[Any]:
+        values: List[Any] = [doc]
+        for part in index.source_paths.get(field, field).split('.'):
+            next_values = []
+            for value in values:
+                for item in _as_list(value):
+                    if isinstance(item, dict) and item.get(part) is not None:
+                        next_values.extend(_as_list(item[part]))
+            values = next_values
+        return values
+
+    def open_point_in_time(self, index_name: str) -> Dict[str, Any]:
+        self.requests += 1
+        if index_name not in self.indices:
+            raise KeyError(index_name)
+        pit_id = f'pit-{uuid.uuid4().hex}'
+        self.pits[pit_id] = index_name
+        return {'id': pit_id}
+
+    def close_point_in_time(self, pit_id: str) -> Dict[str, Any]:
+        self.requests += 1
+        found = self.pits.pop(pit_id, None) is not None
+        return {'succeeded': found, 'num_freed': int(found)}
+
+    def count(self, index_name: str) -> Dict[str, Any]:
+        self.requests += 1
+        index = self.indices.get(index_name)
+        if index is None:
+            raise KeyError(index_name)
+        return {'count': len(index.docs)}
+
+    def _sort(self, hits, sort) -> List[Tuple[float, str, Dict[str, Any]]]:
+        if not sort:
+            return sorted(hits, key=lambda h: -h[0])
+        for field, order in reversed(self._sort_specs(sort)):
+            reverse = order == 'desc'
+            if field in ('_score', '_shard_doc'):
+                position = 0 if field == '_score' else 1
+                hits = sorted(hits, key=lambda h: h[position], reverse=reverse)
+                continue
+            present = [h for h in hits if h[2].get(field) is not None]
+            missing = [h for h in hits if h[2].get(field) is None]
+            hits = sorted(present, key=lambda h: h[2][field], reverse=reverse) + missing
+        return hits
+
+    @staticmethod
+    def _sort_specs(sort) -> List[Tuple[str, str]]:
+        specs = []
+        for spec in _as_list(sort):
+            if isinstance(spec, str):
+                field, order = spec, 'desc' if spec == '_score' else 'asc'
+            else:
+                ((field, order),) = spec.items()
+                if isinstance(order, dict):
+                    order = order.get('order', 'asc')
+            specs.append((field, order))
+        return specs
+
+    def _sort_values(self, hit, sort) -> List[Any]:
+        # The document id stands in for the shard doc, it is just as unique within an index
+        special = {'_score': lambda: hit[0], '_shard_doc': lambda: hit[1]}
+        return [special[field]() if field in special else hit[2].get(field) for field, _ in self._sort_specs(sort)]
+
+    def _is_after(self, hit, sort, search_after) -> bool:
+        for value, bound, (_, order) in zip(self._sort_values(hit, sort), search_after, self._sort_specs(sort)):
+            if value == bound:
+                continue
+            if value is None or bound is None:
+                return bound is not None
+            return (value > bound) != (order == 'desc')
+        return False
+
+    @staticmethod
+    def _project(doc: Dict[str, Any], source: Any) -> Dict[str, Any]:
+        if source is True:
+            return doc
+        if source is False:
+            return {}
+        includes = source.get('includes', []) if isinstance(source, dict) else _as_list(source)
+        return {k: v for k, v in doc.items() if any(fnmatch.fnmatch(k, p) for p in includes)}
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[_elastic_product_header])
+        app.router.add_get('/', self._handle_info)
+        app.router.add_get('/_fake/stats', self._handle_stats)
+        app.router.add_route('*', '/_search', self._handle_search)
+        app.router.add_route('*', '/{index}/_search', self._handle_search)
+        app.router.add_route('*', '/{index}/_pit', self._handle_open_pit)
+        app.router.add_route('DELETE', '/_pit', self._handle_close_pit)
+        app.router.add_route('*', '/{index}/_search/template', self._handle_search_template)
+        app.router.add_route('*', '/_scripts/{id}', self._handle_put_script)
+        app.router.add_route('*', '/{index}/_count', self._handle_count)
+        return app
+
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({'requests': self.requests})
+
+    async def _handle_info(self, request: web.Request) -> web.Response:
+        return web.json_response({'name': 'fake', 'version': {'number': '8.6.2'}, 'tagline': 'You Know, for Search'})
+
+    async def _handle_search(self, request: web.Request) -> web.Response:
+        body = await request.json() if request.can_read_body else {}
+        try:
+            result = self.search(request.match_info.get('index'), body)
+        except KeyError as e:
+            error_type = 'search_context_missing_exception' if body.get('pit') else 'index_not_found_exception'
+            return web.json_response({'error': {'type': error_type, 'index': str(e)}}, status=404)
+        except ValueError as e:
+            return web.json_response({'error': {'type': 'parsing_exception', 'reason': str(e)}}, status=400)
+        return web.json_response(result)
+
+    async def _handle_open_pit(self, request: web.Request) -> web.Response:
+        try:
+            return web.json_response(self.open_point_in_time(request.match_info['index']))
+        except KeyError as e:
+            return web.json_response({'error': {'type': 'index_not_found_exception', 'index': str(e)}}, status=404)
+
+    async def _handle_close_pit(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        result = self.close_point_in_time(body['id'])
+        return web.json_response(result, status=200 if result['succeeded'] else 404)
+
+    async def _handle_search_template(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        if body['id'] not in self.scripts:
+            self.requests += 1
+            error = {'type': 'resource_not_found_exception', 'reason': f'unable to find script [{body["id"]}]'}
+            return web.json_response({'error': {**error, 'root_cause': [error]}, 'status': 404}, status=404)
+        try:
+            result = self.search_template(request.match_info['index'], body)
+        except KeyError as e:
+            return web.json_response({'error': {'type': 'index_not_found_exception', 'index': str(e)}}, status=404)
+        except ValueError as e:
+            return web.json_response({'error': {'type': 'parsing_exception', 'reason': str(e)}}, status=400)
+        return web.json_response(result)
+
+    async def _handle_put_script(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.scripts[request.match_info['id']] = body['script']['source']
+        return web.json_response({'acknowledged': True})
+
+    async def _handle_count(self, request: web.Request) -> web.Response:
+        try:
+            return web.json_response(self.count(request.match_info['index']))
+        except KeyError as e:
+            return web.json_response({'error': {'type': 'index_not_found_exception', 'index': str(e)}}, status=404)
+
+
+class FakeAsyncElasticsearch:
+    """Calls the fake in process, with the arguments AsyncElasticsearch takes for searches and points in time."""
+
+    def __init__(self, fake: FakeElasticsearch) -> None:
+        self.fake = fake
+
+    async def search(self, body: Dict[str, Any], index: str | None = None) -> Dict[str, Any]:
+        return self.fake.search(index, body)
+
+    async def open_point_in_time(self, index: str, keep_alive: str) -> Dict[str, Any]:
+        return self.fake.open_point_in_time(index)
+
+    async def close_point_in_time(self, id: str) -> Dict[str, Any]:
+        return self.fake.close_point_in_time(id)
+
+    async def count(self, index: str) -> Dict[str, Any]:
+        return self.fake.count(index)
+
+    async def close(self) -> None:
+        pass
+
+
+@web.middleware
+async def _elastic_product_header(request: web.Request, handler: Callable) -> web.StreamResponse:
+    response = await handler(request)
+    response.headers['X-Elastic-Product'] = 'Elasticsearch'
+    return response
+
+
+class StubAuthService:
+    """Issues tokens for the service account and answers role lookups like the auth service does."""
+
+    def __init__(self, private_key: bytes, subscribers: Iterable[str] = ()) -> None:
+        self._private_key = private_key
+        self.subscribers = set(subscribers)
+
+    def issue_token(self, user_id: str, roles: List[str], expires_in: int = 3600) -> str:
+        payload = {'user_id': user_id, 'roles': roles, 'exp': int(time.time()) + expires_in}
+        return jwt.encode(payload, self._private_key, algorithm='RS256')
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post('/api/v1/auth/login', self._handle_tokens)
+        app.router.add_post('/api/v1/auth/refresh', self._handle_tokens)
+        app.router.add_get('/api/v1/users/{user_id}/roles', self._handle_roles)
+        return app
+
+    async def _handle_tokens(self, request: web.Request) -> web.Response:
+        service_id = '00000000-0000-0000-0000-000000000000'
+        return web.json_response({
+            'access_token': self.issue_token(service_id, ['service']),
+            'refresh_token': self.issue_token(service_id, ['service'], expires_in=86400),
+        })
+
+    async def _handle_roles(self, request: web.Request) -> web.Response:
+        roles = [{'name': 'subscriber'}] if request.match_info['user_id'] in self.subscribers else []
+        return web.json_response(roles)
+
+
+class FakeServices:
+    """Runs stand-ins for Elasticsearch, Redis and the auth service on localhost, each in its own process."""
+
+    def __init__(self, data_dir: Path, auth_private_key: bytes, subscribers: Iterable[str] = (),
+                 host: str = '127.0.0.1') -> None:
+        self.host = host
+        self.ports: Dict[str, int] = {}
+        self._targets = {
+            'elastic': (_run_elastic, (data_dir,)),
+            'redis': (_run_redis, ()),
+            'auth': (_run_auth, (auth_private_key, list(subscribers))),
+        }
+        self._processes: List[multiprocessing.Process] = []
+
+    def start(self) -> 'FakeServices':
+        context = multiprocessing.get_context('spawn')
+        for name, (target, args) in self._targets.items():
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=target, args=(*args, self.host, sender), name=f'fake-{name}', daemon=True)
+            process.start()
+            self._processes.append(process)
+            self.ports[name] = receiver.recv()
+        return self
+
+    def stop(self) -> None:
+        for process in self._processes:
+            process.terminate()
+            process.join()
+
+    def elastic_requests(self) -> int:
+        with urllib.request.urlopen(f'http://{self.host}:{self.ports["elastic"]}/_fake/stats') as response:
+            return json.load(response)['requests']
+
+    def env(self) -> Dict[str, str]:
+        return {
+            'ELASTIC_HOST': self.host,
+            'ELASTIC_PORT': str(self.ports['elastic']),
+            'REDIS_HOST': self.host,
+            'REDIS_PORT': str(self.ports['redis']),
+            'AUTH_SERVICE_HOST': self.host,
+            'AUTH_SERVICE_PORT': str(self.ports['auth']),
+        }
+
+
+def _run_elastic(data_dir: Path, host: str, conn: Connection) -> None:
+    asyncio.run(_serve_app(FakeElasticsearch.from_dumps(data_dir).app(), host, conn))
+
+
+def _run_auth(private_key: bytes, subscribers: List[str], host: str, conn: Connection) -> None:
+    asyncio.run(_serve_app(StubAuthService(private_key, subscribers).app(), host, conn))
+
+
+def _run_redis(host: str, conn: Connection) -> None:
+    server = TcpFakeServer((host, 0), server_type='redis')
+    conn.send(server.server_address[1])
+    server.serve_forever()
+
+
+async def _serve_app(app: web.Application, host: str, conn: Connection) -> None:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    conn.send(site._server.sockets[0].getsockname()[1])
+    await asyncio.Event().wait()
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
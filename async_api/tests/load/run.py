@@ -0,0 +1,299 @@
+"""
+Load test the API against local stand-ins for Elasticsearch, Redis and the auth service.
+
+    cd async_api
+    python -m tests.load.run --concurrency 32 --duration 30
+    python -m tests.load.run --server uvicorn --workers 4 --mix tests/load/mixes/default.json
+    python -m tests.load.run --catalog-snapshot --filmography
+    python -m tests.load.run --embedded-storage
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+import httpx
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from tests.load.fakes import FakeElasticsearch, FakeServices, StubAuthService
+from tests.load.traffic import Dataset, TrafficMix
+
+_ROOT_DIR = Path(__file__).resolve().parents[2]
+_SRC_DIR = _ROOT_DIR / 'src'
+_DATA_DIR = _ROOT_DIR.parent / 'infra' / 'es_data'
+_DEFAULT_MIX = Path(__file__).resolve().parent / 'mixes' / 'default.json'
+_USERS_CNT = 100
+
+logger = logging.getLogger('load')
+
+
+class RouteStats:
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.statuses: Counter[int] = Counter()
+        self.errors = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+    def summary(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            'requests': len(self.latencies),
+            'rps': round(len(self.latencies) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(self.percentile(50) * 1000, 2),
+            'p95_ms': round(self.percentile(95) * 1000, 2),
+            'p99_ms': round(self.percentile(99) * 1000, 2),
+            'errors': self.errors + sum(c for s, c in self.statuses.items() if s >= 500),
+            'statuses': dict(sorted(self.statuses.items())),
+        }
+
+
+class LoadTest:
+    def __init__(self, mix: TrafficMix, dataset: Dataset, tokens: List[str], seed: int = 0) -> None:
+        self._mix = mix
+        self._dataset = dataset
+        self._tokens = tokens
+        self._rng = random.Random(seed)
+        self._weights = [r.weight for r in mix.routes]
+        self.stats: Dict[str, RouteStats] = {r.name: RouteStats() for r in mix.routes}
+        self.total = RouteStats()
+
+    async def run(
+        self, client: httpx.AsyncClient, concurrency: int, duration: float, requests: int | None = None
+    ) -> float:
+        deadline = time.perf_counter() + duration
+        budget = iter(range(requests)) if requests else None
+        started = time.perf_counter()
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline and (budget is None or next(budget, None) is not None):
+                await self._request(client)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    async def _request(self, client: httpx.AsyncClient) -> None:
+        route = self._rng.choices(self._mix.routes, weights=self._weights)[0]
+        headers = {'Authorization': f'Bearer {self._rng.choice(self._tokens)}'} if route.auth else {}
+        path = self._dataset.render(route.path)
+        started = time.perf_counter()
+        try:
+            response = await client.get(path, headers=headers)
+            await response.aread()
+        except httpx.HTTPError as e:
+            logger.debug('Request to %s failed: %s', path, e)
+            for stats in (self.stats[route.name], self.total):
+                stats.errors += 1
+            return
+        latency = time.perf_counter() - started
+        for stats in (self.stats[route.name], self.total):
+            stats.latencies.append(latency)
+            stats.statuses[response.status_code] += 1
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'total': self.total.summary(elapsed),
+            'routes': {name: stats.summary(elapsed) for name, stats in self.stats.items()},
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    header = f'{"route":<24}{"requests":>10}{"rps":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}'
+    print(header)
+    print('-' * len(header))
+    for name, row in [*report['routes'].items(), ('TOTAL', report['total'])]:
+        print(f'{name:<24}{row["requests"]:>10}{row["rps"]:>10}{row["p50_ms"]:>10}'
+              f'{row["p95_ms"]:>10}{row["p99_ms"]:>10}{row["errors"]:>8}')
+    print(f'Elasticsearch requests: {report["elastic_requests"]}')
+
+
+@contextlib.asynccontextmanager
+async def in_process_client(log_level: str) -> AsyncIterator[httpx.AsyncClient]:
+    sys.path.insert(0, str(_SRC_DIR))
+    from main import app
+
+    logging.getLogger().setLevel(log_level)
+    logging.getLogger('httpx').setLevel(log_level)
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver', timeout=30) as client:
+            await _wait_until_ready(client)
+            yield client
+
+
+@contextlib.asynccontextmanager
+async def uvicorn_client(workers: int, log_file: Path | None) -> AsyncIterator[httpx.AsyncClient]:
+    port = _free_port()
+    output = open(log_file, 'wb') if log_file else subprocess.DEVNULL
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--app-dir', str(_SRC_DIR), '--host', '127.0.0.1',
+         '--port', str(port), '--workers', str(workers), '--no-access-log'],
+        env=os.environ.copy(), stdout=output, stderr=subprocess.STDOUT,
+    )
+    try:
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+        async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=30, limits=limits) as client:
+            await _wait_until_ready(client, server)
+            yield client
+    finally:
+        server.terminate()
+        server.wait()
+        if log_file:
+            output.close()
+
+
+async def _wait_until_ready(
+    client: httpx.AsyncClient, server: subprocess.Popen | None = None, timeout: float = 60
+) -> None:
+    """Wait until the service reports ready, which includes the cache warm-up unless WARMUP_ENABLED=false."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server and server.poll() is not None:
+            raise RuntimeError('uvicorn exited before becoming ready')
+        with contextlib.suppress(httpx.HTTPError):
+            if (await client.get('/api/v1/health/ready')).status_code == 200:
+                return
+        await asyncio.sleep(0.2)
+    raise RuntimeError('service did not become ready in time')
+
+
+async def _build_filmography() -> None:
+    sys.path.insert(0, str(_SRC_DIR))
+    from jobs.filmography import update_filmography
+
+    await update_filmography([])
+
+
+async def _build_similar_films() -> None:
+    sys.path.insert(0, str(_SRC_DIR))
+    from jobs.similar_films import update_similar_films
+
+    await update_similar_films()
+
+
+async def _build_catalog_snapshot() -> None:
+    sys.path.insert(0, str(_SRC_DIR))
+    from core.config import settings
+    from jobs.catalog_snapshot import run
+
+    await run(Path(settings.catalog_snapshot_path), watch=False)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _configure_environment(
+    services: FakeServices,
+    public_key: bytes,
+    snapshot_path: Path,
+    catalog_snapshot: bool,
+    embedded_catalog: Path | None,
+) -> None:
+    os.environ.update(services.env())
+    os.environ.update({
+        'SERVICE_LOGIN': 'load-test',
+        'SERVICE_PASSWORD': 'load-test',
+        'JWT_PUBLIC_KEY': public_key.decode(),
+        # A snapshot or id filters left by another run must not be used
+        'CATALOG_SNAPSHOT_PATH': str(snapshot_path),
+        'ID_FILTER_PATH': str(snapshot_path.parent / 'id_filters'),
+        'CATALOG_SNAPSHOT_ENABLED': str(catalog_snapshot).lower(),
+    })
+    if embedded_catalog:
+        os.environ.update({'DATA_STORAGE_BACKEND': 'embedded', 'EMBEDDED_CATALOG_PATH': str(embedded_catalog)})
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    mix = TrafficMix.from_file(args.mix)
+    dataset = Dataset(FakeElasticsearch.from_dumps(args.data_dir), mix.skew, seed=args.seed)
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_key = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+    public_key = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+    users = [str(uuid.uuid4()) for _ in range(_USERS_CNT)]
+    subscribers = users[:int(len(users) * mix.subscribers_share)]
+    auth = StubAuthService(private_key, subscribers)
+    tokens = [auth.issue_token(user_id, roles=[], expires_in=24 * 60 * 60) for user_id in users]
+
+    services = FakeServices(args.data_dir, private_key, subscribers).start()
+    snapshot_dir = tempfile.TemporaryDirectory()
+    try:
+        _configure_environment(services, public_key, Path(snapshot_dir.name) / 'catalog.snapshot',
+                               args.catalog_snapshot, args.data_dir if args.embedded_storage else None)
+        if args.filmography:
+            await _build_filmography()
+        if args.similar_films:
+            await _build_similar_films()
+        if args.catalog_snapshot:
+            await _build_catalog_snapshot()
+        if args.server == 'uvicorn':
+            client_context = uvicorn_client(args.workers, args.server_log)
+        else:
+            client_context = in_process_client(args.app_log_level)
+        async with client_context as client:
+            if args.warmup:
+                await LoadTest(mix, dataset, tokens, args.seed).run(client, args.concurrency, args.warmup)
+            load_test = LoadTest(mix, dataset, tokens, args.seed)
+            elastic_requests = services.elastic_requests()
+            elapsed = await load_test.run(client, args.concurrency, args.duration, args.requests)
+            elastic_requests = services.elastic_requests() - elastic_requests
+    finally:
+        services.stop()
+        snapshot_dir.cleanup()
+
+    report = load_test.report(elapsed)
+    report['elastic_requests'] = elastic_requests
+    return report
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=('in-process', 'uvicorn'), default='in-process')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--requests', type=int, default=None, help='stop after this many requests')
+    parser.add_argument('--warmup', type=float, default=0.0, help='seconds of unrecorded traffic before the run')
+    parser.add_argument('--mix', type=Path, default=_DEFAULT_MIX)
+    parser.add_argument('--data-dir', type=Path, default=_DATA_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--filmography', action='store_true', help='build the person filmography view first')
+    parser.add_argument('--similar-films', action='store_true', help='build the similar films view first')
+    parser.add_argument('--catalog-snapshot', action='store_true', help='build the catalog snapshot first')
+    parser.add_argument('--embedded-storage', action='store_true',
+                        help='read the embedded catalog of the dumps instead of Elasticsearch')
+    parser.add_argument('--output', type=Path, default=None, help='write the report as JSON')
+    parser.add_argument('--server-log', type=Path, default=None, help='uvicorn output file')
+    parser.add_argument('--app-log-level', default='WARNING', help='service log level when running in-process')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    result = asyncio.run(main(arguments))
+    print_report(result)
+    if arguments.output:
+        arguments.output.write_text(json.dumps(result, indent=2))
@@ -0,0 +1,84 @@
+import json
+import random
+import uuid
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from pydantic import BaseModel, Field
+
+from tests.load.fakes import FakeElasticsearch, tokenize
+
+
+class RouteSpec(BaseModel):
+    name: str
+    path: str
+    weight: float = 1.0
+    auth: bool = False
+
+
+class TrafficMix(BaseModel):
+    routes: List[RouteSpec]
+    # Exponent of the Zipf distribution used to pick ids, 0 makes all ids equally likely
+    skew: float = Field(default=1.1, ge=0)
+    subscribers_share: float = Field(default=0.5, ge=0, le=1)
+
+    @classmethod
+    def from_file(cls, path: Path) -> 'TrafficMix':
+        with open(path, encoding='utf-8') as f:
+            return cls.model_validate(json.load(f))
+
+
+class ZipfSampler:
+    """Picks items with probability proportional to 1 / rank ** skew, so a few items dominate the traffic."""
+
+    def __init__(self, items: List[str], skew: float, rng: random.Random) -> None:
+        self._items = items[:]
+        rng.shuffle(self._items)
+        weights = [1 / (rank ** skew) for rank in range(1, len(self._items) + 1)]
+        total, acc = sum(weights), 0.0
+        self._cum_weights = []
+        for w in weights:
+            acc += w
+            self._cum_weights.append(acc / total)
+        self._rng = rng
+
+    def __call__(self) -> str:
+        return self._rng.choices(self._items, cum_weights=self._cum_weights)[0]
+
+
+class Dataset:
+    """Fills route path placeholders with values taken from the fake catalog."""
+
+    def __init__(self, elastic: FakeElasticsearch, skew: float, seed: int = 0) -> None:
+        rng = random.Random(seed)
+        movies = elastic.indices['movies'].docs
+        persons = elastic.indices['personas'].docs
+        genres = elastic.indices['genres'].docs
+        words = sorted({t for doc in movies.values() for t in tokenize(doc['title']) if len(t) > 3})
+        names = sorted({t for doc in persons.values() for t in tokenize(doc['full_name']) if len(t) > 2})
+        query = ZipfSampler(words, skew, rng)
+        # The film model requires a rating, so films without one are not served by id
+        rated = [film_id for film_id, doc in movies.items() if doc.get('imdb_rating') is not None]
+        self._placeholders: Dict[str, Callable[[], str]] = {
+            'film_id': ZipfSampler(rated, skew, rng),
+            'person_id': ZipfSampler(list(persons), skew, rng),
+            'genre_id': ZipfSampler(list(genres), skew, rng),
+            'query': query,
+            'person_name': ZipfSampler(names, skew, rng),
+            'prefix': lambda: query()[:rng.randint(1, 4)],
+            'rating': lambda: str(rng.randint(5, 8)),
+            'page': lambda: str(min(int(rng.paretovariate(1.5)), 20)),
+            'missing_id': lambda: str(uuid.uuid4()),
+        }
+
+    def render(self, path: str) -> str:
+        return path.format_map(_Placeholders(self._placeholders))
+
+
+class _Placeholders(dict):
+    def __init__(self, factories: Dict[str, Callable[[], str]]) -> None:
+        super().__init__()
+        self._factories = factories
+
+    def __missing__(self, key: str) -> str:
+        return self._factories[key]()
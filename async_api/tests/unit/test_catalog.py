@@ -0,0 +1,34 @@
+from collections import Counter
+
+from tests.load.catalog import SyntheticCatalog
+from tests.load.fakes import FakeElasticsearch
+
+_FILMS = 2000
+_ROLE_NAMES = {'actors': 'actor', 'writers': 'writer', 'directors': 'director'}
+
+
+def test_catalog_is_deterministic(tmp_path):
+    SyntheticCatalog(_FILMS, seed=7).write(tmp_path / 'a')
+    SyntheticCatalog(_FILMS, seed=7).write(tmp_path / 'b')
+    for dump in ('movies_data.json', 'personas_data.json', 'genres_data.json'):
+        assert (tmp_path / 'a' / dump).read_bytes() == (tmp_path / 'b' / dump).read_bytes()
+
+
+def test_catalog_persons_match_casts(tmp_path):
+    stats = SyntheticCatalog(_FILMS, seed=1).write(tmp_path)
+    elastic = FakeElasticsearch.from_dumps(tmp_path)
+    films, persons = elastic.indices['movies'].docs, elastic.indices['personas'].docs
+    assert len(films) == _FILMS and len(persons) == stats.persons
+
+    cast = {
+        (person['id'], film_id, _ROLE_NAMES[role])
+        for film_id, film in films.items() for role in _ROLE_NAMES for person in film[role]
+    }
+    credits = {
+        (person_id, film['id'], role)
+        for person_id, person in persons.items() for film in person['films'] for role in film['roles']
+    }
+    assert credits == cast
+    # Filmography sizes are skewed, most persons have a single film
+    sizes = Counter(len(person['films']) for person in persons.values())
+    assert sizes[1] > len(persons) / 2 and max(sizes) > 10
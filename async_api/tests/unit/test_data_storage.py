@@ -0,0 +1,45 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from db.data_storage import DataStorage
+from tests.load.fakes import FakeAsyncElasticsearch, FakeElasticsearch
+
+
+class _Elastic(FakeAsyncElasticsearch):
+    """Keeps the bodies of searches sent to the fake."""
+
+    def __init__(self, fake: FakeElasticsearch) -> None:
+        super().__init__(fake)
+        self.bodies: List[Dict[str, Any]] = []
+
+    async def search(self, body: Dict[str, Any], index: str | None = None) -> Dict[str, Any]:
+        self.bodies.append({**body})
+        return await super().search(body, index)
+
+
+@pytest.fixture(scope='module')
+def fake(data_dir) -> FakeElasticsearch:
+    return FakeElasticsearch.from_dumps(data_dir, indices=('movies',))
+
+
+def _export(loop, storage: DataStorage, after: str | None, batch_size: int) -> List[str]:
+    async def read() -> List[str]:
+        return [doc['id'] async for batch in storage.export(['id'], after, batch_size) for doc in batch]
+
+    return loop.run_until_complete(read())
+
+
+def test_export_resumes_after_id(loop, fake, movie_sources):
+    elastic = _Elastic(fake)
+    ids = sorted(movie['id'] for movie in movie_sources)
+    after = ids[len(ids) // 2]
+
+    exported = _export(loop, DataStorage(elastic, 'movies'), after, batch_size=100)
+
+    assert exported == [i for i in ids if i > after]
+    # Sort values of a point in time end with a tiebreaker, so the id to resume after is a query instead
+    first, *rest = elastic.bodies
+    assert first['query'] == {'range': {'id': {'gt': after}}}
+    assert 'search_after' not in first
+    assert rest and all(len(body['search_after']) == 2 for body in rest)
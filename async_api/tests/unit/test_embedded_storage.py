@@ -0,0 +1,114 @@
+from typing import Any, Dict, List
+
+import pytest
+
+from db.catalog_snapshot import write_snapshot
+from db.data_storage import FILM_PERSON_ROLES, DataStorage, DataStorageError, InvalidQueryError
+from db.embedded_storage import EmbeddedCatalog, EmbeddedCatalogFile, EmbeddedDataStorage, EmbeddedFilmDataStorage
+from db.failover_storage import FailoverDataStorage, Outage
+from db.query_builder import FilmFilters
+from db.search import query_terms
+from jobs.catalog_snapshot import render_catalog
+
+_PAGE_SIZE = 50
+_SEARCH_FIELDS = ('title', 'description', 'actors_names', 'writers_names', 'directors_names')
+
+
+@pytest.fixture(scope='module')
+def catalog_file(data_dir) -> EmbeddedCatalogFile:
+    catalog_file = EmbeddedCatalogFile(data_dir)
+    catalog_file.catalog = EmbeddedCatalog.from_dumps(data_dir)
+    return catalog_file
+
+
+@pytest.fixture(scope='module')
+def films(catalog_file) -> EmbeddedFilmDataStorage:
+    return EmbeddedFilmDataStorage(catalog_file, 'movies')
+
+
+def _by_rating(movies: List[Dict[str, Any]]) -> List[float]:
+    return sorted((m['imdb_rating'] for m in movies if m['imdb_rating'] is not None), reverse=True)
+
+
+def test_embedded_film_listings(loop, films, film_source, movie_sources):
+    genre_ids = [genre['id'] for genre in film_source['genres']]
+    actor_ids = [actor['id'] for actor in film_source['actors']]
+    cases = [
+        (FilmFilters(), lambda m: True),
+        (FilmFilters(genre_ids=genre_ids[:1]), lambda m: genre_ids[0] in {g['id'] for g in m['genres']}),
+        (FilmFilters(genre_ids=genre_ids, genres_match='all'),
+         lambda m: set(genre_ids) <= {g['id'] for g in m['genres']}),
+        (FilmFilters(genre_ids=genre_ids, rating_from=5, rating_to=8),
+         lambda m: bool(set(genre_ids) & {g['id'] for g in m['genres']}) and 5 <= (m['imdb_rating'] or -1) <= 8),
+        (FilmFilters(actor_ids=actor_ids), lambda m: bool(set(actor_ids) & {a['id'] for a in m['actors']})),
+    ]
+    for filters, matches in cases:
+        listed = loop.run_until_complete(films.list(len(movie_sources), 0, '-imdb_rating', filters))
+        expected = [m for m in movie_sources if matches(m)]
+        assert sorted(m['id'] for m in listed) == sorted(m['id'] for m in expected)
+        assert _by_rating(listed) == [m['imdb_rating'] for m in listed if m['imdb_rating'] is not None]
+    assert loop.run_until_complete(films.get(film_source['id'])) == film_source
+
+
+def test_embedded_search(loop, films, catalog_file, film_source, movie_sources):
+    query = f"{film_source['title']} {film_source['actors'][0]['name']}"
+    terms = set(query_terms(query))
+    found = loop.run_until_complete(films.search(query, len(movie_sources)))
+    expected = {
+        m['id'] for m in movie_sources
+        if any(terms & set(query_terms(' '.join(_texts(m.get(field))))) for field in _SEARCH_FIELDS)
+    }
+    assert {m['id'] for m in found} == expected and film_source['id'] in expected
+    with pytest.raises(InvalidQueryError):
+        loop.run_until_complete(films.search(' '.join(['word'] * 100)))
+
+    persons = EmbeddedDataStorage(catalog_file, 'personas')
+    name = film_source['directors'][0]['name']
+    suggestions = loop.run_until_complete(persons.suggest(name[:len(name) - 1]))
+    assert any(s['full_name'] == name for s in suggestions) and set(suggestions[0]) == {'id', 'full_name'}
+
+
+def test_embedded_catalog_from_snapshot(tmp_path, loop, films, movie_sources, person_sources, genre_sources):
+    catalog = render_catalog(movie_sources, person_sources, genre_sources)
+    path = tmp_path / 'catalog.snapshot'
+    write_snapshot(path, {}, catalog.films, catalog.persons, catalog.genres, catalog.all_genres)
+    snapshot_file = EmbeddedCatalogFile(path)
+    assert loop.run_until_complete(snapshot_file.reload())
+    from_snapshot = EmbeddedFilmDataStorage(snapshot_file, 'movies')
+
+    page = loop.run_until_complete(from_snapshot.list(_PAGE_SIZE, 0, '-imdb_rating'))
+    expected = loop.run_until_complete(films.list(_PAGE_SIZE, 0, '-imdb_rating'))
+    assert [film['id'] for film in page] == [film['id'] for film in expected]
+    for film, source in zip(page, expected):
+        for field in ('title', 'imdb_rating', 'genres', *FILM_PERSON_ROLES, 'actors_names'):
+            assert film[field] == source[field]
+
+
+class _FailingStorage(DataStorage):
+    def __init__(self, error: DataStorageError) -> None:
+        self._index = 'movies'
+        self.error = error
+        self.calls = 0
+
+    async def get(self, id):
+        self.calls += 1
+        raise self.error
+
+
+def test_failover(loop, films, film_source):
+    primary = _FailingStorage(DataStorageError('unavailable'))
+    storage = FailoverDataStorage(primary, films, Outage(retry_after=60))
+    for _ in range(3):
+        assert loop.run_until_complete(storage.get(film_source['id'])) == film_source
+    # The primary is not asked again until the retry interval passes
+    assert primary.calls == 1
+
+    rejected = FailoverDataStorage(_FailingStorage(InvalidQueryError('rejected')), films)
+    with pytest.raises(InvalidQueryError):
+        loop.run_until_complete(rejected.get(film_source['id']))
+
+
+def _texts(value: Any) -> List[str]:
+    if isinstance(value, list):
+        return [text for item in value for text in _texts(item)]
+    return [value] if isinstance(value, str) else []
@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Sequence
+from uuid import UUID
+
+import orjson
+import pytest
+
+from db.cache_storage import InMemoryCacheStorage
+from db.data_storage import FilmDataStorage, FilmFilters
+from services.film import FilmService
+
+
+class _Storage(FilmDataStorage):
+    """Answers listings and searches with the same films, whatever is asked."""
+
+    def __init__(self, films: List[Dict[str, Any]]) -> None:
+        super().__init__(elastic=None, index='movies')
+        self._films = films
+
+    async def list(self, *args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+        return self._films
+
+    async def search(self, *args: Any, **kwargs: Any) -> List[Dict[str, Any]]:
+        return self._films
+
+    async def get_many(self, ids: Sequence[UUID | str]) -> Dict[str, Dict[str, Any]]:
+        return {f['id']: f for f in self._films if f['id'] in {str(i) for i in ids}}
+
+
+@pytest.fixture
+def films(movie_sources) -> List[Dict[str, Any]]:
+    rated = [m for m in movie_sources if m['imdb_rating'] is not None][:3]
+    return rated + [{**rated[0], 'id': 'unrated', 'imdb_rating': None}]
+
+
+def test_films_page_leaves_unrated_films_out(loop, films):
+    service = FilmService(InMemoryCacheStorage(), _Storage(films))
+
+    page = loop.run_until_complete(service.get_films(FilmFilters(), limit=len(films)))
+
+    assert [f['uuid'] for f in orjson.loads(page)] == [f['id'] for f in films[:-1]]
+    # The cached page is the same as the one answered
+    key = service._films_cache_key(FilmFilters(), len(films), 0)
+    assert loop.run_until_complete(service.cache_storage.get(key)) == page
+
+
+def test_search_leaves_unrated_films_out(loop, films):
+    service = FilmService(InMemoryCacheStorage(), _Storage(films))
+
+    found = loop.run_until_complete(service.get_films_by_query('film', limit=len(films)))
+
+    assert [f.id for f in found] == [f['id'] for f in films[:-1]]
+
+
+def test_films_by_ids_leave_unrated_films_out(loop, films):
+    service = FilmService(InMemoryCacheStorage(), _Storage(films))
+
+    found = loop.run_until_complete(service.get_films_by_ids([f['id'] for f in reversed(films)]))
+
+    assert [f.id for f in found] == [f['id'] for f in reversed(films[:-1])]
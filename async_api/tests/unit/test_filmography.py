@@ -0,0 +1,72 @@
+from typing import Any, Dict
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from db.cache_generations import CacheGenerations
+from db.data_storage import FILM_PERSON_ROLES, FilmDataStorage
+from db.filmography import FilmographyView, sort_films
+from tests.load.fakes import FakeElasticsearch
+
+
+class _Elastic:
+    """The client calls of the storages, answered by the fake."""
+
+    def __init__(self, fake: FakeElasticsearch) -> None:
+        self.fake = fake
+
+    async def search(self, index: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        return self.fake.search(index, body)
+
+
+@pytest.fixture(scope='module')
+def films(data_dir) -> FilmDataStorage:
+    return FilmDataStorage(_Elastic(FakeElasticsearch.from_dumps(data_dir, indices=('movies',))), 'movies')
+
+
+def test_list_by_persons_reads_every_page(loop, films, movie_sources, person_sources):
+    person_ids = {p['id'] for p in sorted(person_sources, key=lambda p: -len(p['films']))[:3]}
+    expected = {m['id'] for m in movie_sources if person_ids & {p['id'] for role in FILM_PERSON_ROLES for p in m[role]}}
+    assert len(expected) > 2
+    listed = loop.run_until_complete(films.list_by_persons(list(person_ids), ['id'], batch_size=2))
+    assert sorted(film['id'] for film in listed) == sorted(expected)
+
+
+def test_filmography_view_follows_movies_generation(loop, films, movie_sources, person_source):
+    redis = FakeAsyncRedis()
+    generations = CacheGenerations()
+    view = FilmographyView(redis, generations)
+    film_ids = {film['id'] for film in person_source['films']}
+    expected = sort_films([
+        {'uuid': m['id'], 'title': m['title'], 'imdb_rating': m['imdb_rating']}
+        for m in movie_sources if m['id'] in film_ids and m['imdb_rating'] is not None
+    ])
+    loop.run_until_complete(view.build(films))
+    assert loop.run_until_complete(view.get(person_source['id'])) == expected
+
+    async def keys(match: str):
+        return [key async for key in redis.scan_iter(match=match)]
+
+    previous = loop.run_until_complete(keys('filmography:*'))
+    replaced = FilmographyView(redis, generations.pinned({}))
+    loop.run_until_complete(generations._set('movies', 1))
+    # Movies reloaded in a new generation are not read from the view of the previous one
+    assert loop.run_until_complete(view.get(person_source['id'])) is None
+    loop.run_until_complete(view.build(films))
+    assert loop.run_until_complete(view.get(person_source['id'])) == expected
+    # Building a generation leaves the others alone, the replaced one is deleted by itself
+    assert sorted(loop.run_until_complete(keys('filmography:*'))) == sorted(previous)
+    loop.run_until_complete(replaced.delete())
+    assert loop.run_until_complete(keys('filmography:*')) == []
+    assert len(loop.run_until_complete(keys('g1:filmography:*'))) == len(previous)
+
+
+def test_filled_filmographies_do_not_expire(loop):
+    redis = FakeAsyncRedis()
+    view = FilmographyView(redis, CacheGenerations())
+    film = {'uuid': 'film', 'title': 'Film', 'imdb_rating': 7.0}
+
+    loop.run_until_complete(view.put('person', [film]))
+
+    assert loop.run_until_complete(view.get('person')) == [film]
+    assert loop.run_until_complete(redis.ttl('filmography:person:person')) == -1
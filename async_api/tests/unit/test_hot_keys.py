@@ -0,0 +1,48 @@
+import os
+import random
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import List
+
+import pytest
+
+import db.hot_keys
+from db.hot_keys import CountMinSketch, TopK
+
+_KEYS = 10_000
+_REQUESTS = 20_000
+_TOP = 20
+
+
+@pytest.fixture(scope='module')
+def requests() -> List[str]:
+    # Zipf-like traffic, a few keys get most of the requests
+    rng = random.Random(0)
+    weights = [1 / rank for rank in range(1, _KEYS + 1)]
+    return [f'key-{i}' for i in rng.choices(range(_KEYS), weights, k=_REQUESTS)]
+
+
+def test_top_k_finds_most_requested_keys(requests):
+    top_k = TopK(k=100)
+    for key in requests:
+        top_k.add(key)
+
+    expected = {key for key, _ in Counter(requests).most_common(_TOP)}
+    found = {hot_key.key for hot_key in top_k.top(_TOP)}
+    assert len(expected & found) >= _TOP - 2
+
+
+def test_sketch_columns_are_the_same_in_every_worker():
+    keys = [f'key-{i}' for i in range(10)]
+    script = f'from db.hot_keys import CountMinSketch; print([CountMinSketch()._columns(k) for k in {keys}])'
+    # Workers are processes with their own hash seeds
+    columns = [
+        subprocess.run(
+            [sys.executable, '-c', script], cwd=Path(db.hot_keys.__file__).parents[1],
+            env={**os.environ, 'PYTHONHASHSEED': seed}, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        for seed in ('1', '2')
+    ]
+    assert columns == [str([CountMinSketch()._columns(k) for k in keys])] * 2
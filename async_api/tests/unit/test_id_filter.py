@@ -0,0 +1,73 @@
+import asyncio
+import uuid
+from typing import AsyncIterator, List
+
+import pytest
+
+from db.cache_generations import CacheGenerations
+from db.data_storage import DataStorage
+from db.id_filter import BloomFilter, IdFilters
+
+_IDS = 100_000
+_ERROR_RATE = 0.001
+
+
+@pytest.fixture(scope='module')
+def ids() -> List[str]:
+    return [str(uuid.uuid4()) for _ in range(_IDS)]
+
+
+@pytest.fixture(scope='module')
+def bloom(ids) -> BloomFilter:
+    bloom = BloomFilter(_IDS, _ERROR_RATE)
+    for id in ids:
+        bloom.add(id)
+    return bloom
+
+
+def test_bloom_filter_error_rate(bloom, ids):
+    assert all(id in bloom for id in ids)
+    unknown = [str(uuid.uuid4()) for _ in range(_IDS)]
+    assert sum(id in bloom for id in unknown) / len(unknown) < 2 * _ERROR_RATE
+
+
+class _Storage(DataStorage):
+    def __init__(self, ids: List[str]) -> None:
+        self._index = 'movies'
+        self.documents = list(ids)
+        self.reads = 0
+
+    async def count(self) -> int:
+        return len(self.documents)
+
+    async def ids(self, batch_size: int = 5000) -> AsyncIterator[str]:
+        self.reads += 1
+        for id in self.documents:
+            yield id
+
+
+def test_id_filters_are_built_once_per_host(loop, tmp_path):
+    storage = _Storage([str(uuid.uuid4()) for _ in range(10)])
+    # Workers of a host, they share the directory of the filters
+    workers = [IdFilters({'movies': storage}, tmp_path, CacheGenerations()) for _ in range(3)]
+
+    async def update_all() -> None:
+        await asyncio.gather(*(worker.update_all() for worker in workers))
+
+    async def on_generation(generation: int) -> None:
+        for worker in workers:
+            await worker.on_generation('movies', generation)
+        await asyncio.gather(*(task for worker in workers for task in worker._rebuilds))
+
+    loop.run_until_complete(update_all())
+    assert storage.reads == 1
+    added = str(uuid.uuid4())
+    storage.documents.append(added)
+    assert all(worker.might_contain('movies', storage.documents[0]) for worker in workers)
+    assert not any(worker.might_contain('movies', added) for worker in workers)
+
+    # Documents written with a release are there once the filter is rebuilt for the new generation
+    loop.run_until_complete(on_generation(1))
+    assert storage.reads == 2
+    assert all(worker.might_contain('movies', added) for worker in workers)
+    assert not any(worker.might_contain('movies', uuid.uuid4()) for worker in workers)
@@ -0,0 +1,174 @@
+import fnmatch
+from typing import Any, Dict, List, Set
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+from db.cache_generations import GENERATIONS_KEY
+from jobs import cache_generations, indices
+from jobs.indices import release, switch_aliases, _prune
+
+
+class _Indices:
+    """The index and alias calls of the jobs, over indices held as their sets of aliases."""
+
+    def __init__(self, aliases: Dict[str, Set[str]]) -> None:
+        self.aliases = aliases
+
+    async def get_alias(self, index: str) -> Dict[str, Any]:
+        return {
+            name: {'aliases': {alias: {} for alias in aliases}}
+            for name, aliases in self.aliases.items() if fnmatch.fnmatch(name, index)
+        }
+
+    async def exists_alias(self, name: str) -> bool:
+        return any(name in aliases for aliases in self.aliases.values())
+
+    async def exists(self, index: str) -> bool:
+        return index in self.aliases
+
+    async def update_aliases(self, actions: List[Dict[str, Any]]) -> None:
+        for action in actions:
+            ((kind, spec),) = action.items()
+            if kind == 'add':
+                self.aliases[spec['index']].add(spec['alias'])
+            elif kind == 'remove':
+                self.aliases[spec['index']].remove(spec['alias'])
+            else:
+                del self.aliases[spec['index']]
+
+    async def delete(self, index: str, ignore_unavailable: bool = False) -> None:
+        for name in index.split(','):
+            if name in self.aliases or not ignore_unavailable:
+                del self.aliases[name]
+
+
+class _Elastic:
+    def __init__(self, aliases: Dict[str, Set[str]]) -> None:
+        self.indices = _Indices(aliases)
+
+    async def close(self) -> None:
+        pass
+
+
+def test_switch_aliases(loop):
+    elastic = _Elastic({
+        'movies_v1': set(), 'movies_v2': {'movies'}, 'movies_v3': set(), 'genres': set(), 'genres_v1': set(),
+    })
+
+    loop.run_until_complete(switch_aliases(elastic, {'movies': 'movies_v3', 'genres': 'genres_v1'}))
+
+    # The index loaded before aliases were used gives its name up to the alias
+    assert elastic.indices.aliases == {
+        'movies_v1': set(), 'movies_v2': set(), 'movies_v3': {'movies'}, 'genres_v1': {'genres'},
+    }
+
+
+def test_prune_keeps_aliased_and_latest_versions(loop):
+    elastic = _Elastic({f'movies_v{v}': set() for v in range(1, 5)} | {'movies_v10': {'movies'}})
+
+    loop.run_until_complete(_prune(elastic, 'movies', keep=2))
+
+    assert set(elastic.indices.aliases) == {'movies_v3', 'movies_v4', 'movies_v10'}
+
+
+def test_release_deletes_new_versions_of_failed_load(loop, monkeypatch, tmp_path):
+    elastic = _Elastic({'movies_v1': {'movies'}, 'genres_v1': {'genres'}})
+    monkeypatch.setattr(indices, 'AsyncElasticsearch', lambda **kwargs: elastic)
+
+    async def load_index(elastic, data_dir, dump, chunk_size, concurrency, target, overrides):
+        elastic.indices.aliases[target] = set()
+        if dump == 'genres':
+            raise ConnectionError
+
+    async def bump_generations(*args):
+        raise AssertionError('generations of a failed release are not bumped')
+
+    monkeypatch.setattr(indices, 'load_index', load_index)
+    monkeypatch.setattr(indices, 'bump_generations', bump_generations)
+
+    with pytest.raises(ConnectionError):
+        loop.run_until_complete(release(tmp_path, ['movies', 'genres']))
+    assert elastic.indices.aliases == {'movies_v1': {'movies'}, 'genres_v1': {'genres'}}
+
+
+def test_release_fills_generations_before_switch_and_activates_them_after(loop, monkeypatch, tmp_path):
+    elastic = _Elastic({'movies_v1': {'movies'}, 'genres_v1': {'genres'}})
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(indices, 'AsyncElasticsearch', lambda **kwargs: elastic)
+    monkeypatch.setattr(cache_generations, 'AsyncElasticsearch', lambda **kwargs: elastic)
+    monkeypatch.setattr(cache_generations, 'Redis', lambda **kwargs: redis)
+
+    async def load_index(elastic, data_dir, dump, chunk_size, concurrency, target, overrides):
+        elastic.indices.aliases[target] = set()
+
+    warmed = []
+
+    class _Warmer:
+        def __init__(self, generations, sources):
+            self.generations = generations
+            self.sources = sources
+
+        async def warm(self) -> None:
+            # Filled from the new versions while the aliases and the active generations are still the previous ones
+            assert elastic.indices.aliases['movies_v2'] == set()
+            assert await redis.hgetall(GENERATIONS_KEY) == {}
+            warmed.append((self.generations.all(), self.sources))
+
+    def build_cache_warmer(redis, elastic, generations, indices=None):
+        return _Warmer(generations, indices)
+
+    views = []
+
+    class _FilmographyView:
+        def __init__(self, redis, generations):
+            self.generations = generations
+
+        async def build(self, storage):
+            # Built like the warm-up, before the switch
+            assert elastic.indices.aliases['movies_v2'] == set()
+            assert await redis.hgetall(GENERATIONS_KEY) == {}
+            views.append(('build', self.generations.all(), storage._index))
+
+        async def delete(self):
+            views.append(('delete', self.generations.all()))
+
+    monkeypatch.setattr(indices, 'load_index', load_index)
+    monkeypatch.setattr(cache_generations, 'build_cache_warmer', build_cache_warmer)
+    monkeypatch.setattr(cache_generations, 'FilmographyView', _FilmographyView)
+
+    targets = loop.run_until_complete(release(tmp_path, ['movies', 'genres'], prewarm=True))
+
+    assert targets == {'movies': 'movies_v2', 'genres': 'genres_v2'}
+    assert warmed == [({'movies': 1, 'genres': 1}, targets)]
+    assert views == [('build', {'movies': 1, 'genres': 1}, 'movies_v2'), ('delete', {})]
+    assert loop.run_until_complete(redis.hgetall(GENERATIONS_KEY)) == {b'movies': b'1', b'genres': b'1'}
+    assert set(elastic.indices.aliases) == {'movies_v1', 'movies_v2', 'genres_v1', 'genres_v2'}
+    assert elastic.indices.aliases['movies_v2'] == {'movies'}
+
+
+def test_failed_switch_deletes_filmography_view_of_new_generation(loop, monkeypatch):
+    redis = FakeAsyncRedis()
+    monkeypatch.setattr(cache_generations, 'AsyncElasticsearch', lambda **kwargs: _Elastic({}))
+    monkeypatch.setattr(cache_generations, 'Redis', lambda **kwargs: redis)
+    views = []
+
+    class _FilmographyView:
+        def __init__(self, redis, generations):
+            self.generations = generations
+
+        async def build(self, storage):
+            views.append(('build', self.generations.all()))
+
+        async def delete(self):
+            views.append(('delete', self.generations.all()))
+
+    async def switch():
+        raise ConnectionError
+
+    monkeypatch.setattr(cache_generations, 'FilmographyView', _FilmographyView)
+
+    with pytest.raises(ConnectionError):
+        loop.run_until_complete(cache_generations.bump_generations(['movies'], prewarm=False, switch=switch))
+    assert views == [('build', {'movies': 1}), ('delete', {'movies': 1})]
+    assert loop.run_until_complete(redis.hgetall(GENERATIONS_KEY)) == {}
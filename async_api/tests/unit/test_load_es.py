@@ -0,0 +1,90 @@
+import asyncio
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import pytest
+from elastic_transport import JsonSerializer
+from elasticsearch.helpers import BulkIndexError
+
+from jobs import load_es
+from jobs.load_es import load
+
+_DUMP_SETTINGS = {'number_of_shards': '1', 'number_of_replicas': '2', 'refresh_interval': '5s'}
+
+
+class _Indices:
+    """The index calls of the load, over indices held as their settings."""
+
+    def __init__(self) -> None:
+        self.settings: Dict[str, Dict[str, Any]] = {}
+
+    async def exists(self, index: str) -> bool:
+        return index in self.settings
+
+    async def exists_alias(self, name: str) -> bool:
+        return False
+
+    async def create(self, index: str, settings: Dict[str, Any], mappings: Dict[str, Any]) -> None:
+        self.settings[index] = dict(settings)
+
+    async def put_settings(self, index: str, settings: Dict[str, Any]) -> None:
+        self.settings[index].update(settings)
+
+    async def refresh(self, index: str) -> None:
+        pass
+
+
+class _Elastic:
+    """The client calls of the bulk helper, rejecting documents with the bad id."""
+
+    def __init__(self, bad_id: str) -> None:
+        self.indices = _Indices()
+        self.transport = SimpleNamespace(serializers=SimpleNamespace(get_serializer=lambda mimetype: JsonSerializer()))
+        self.bad_id = bad_id
+        self.closed = False
+
+    def options(self, **kwargs: Any) -> '_Elastic':
+        return self
+
+    async def bulk(self, operations: List[bytes]) -> SimpleNamespace:
+        # Action and source lines take turns
+        headers = [json.loads(line)['index'] for line in operations[::2]]
+        # Slow enough for the loads of other indices to be in flight
+        await asyncio.sleep(0.01)
+        items = [
+            {'index': {'_id': h['_id'], 'status': 400 if h['_id'] == self.bad_id else 201}} for h in headers
+        ]
+        return SimpleNamespace(body={'errors': any(i['index']['status'] >= 300 for i in items), 'items': items})
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+def _write_dumps(data_dir: Path, index: str, ids: List[str]) -> None:
+    (data_dir / f'{index}_settings.json').write_text(json.dumps({index: {'settings': {'index': _DUMP_SETTINGS}}}))
+    (data_dir / f'{index}_mapping.json').write_text(json.dumps({index: {'mappings': {}}}))
+    (data_dir / f'{index}_data.json').write_text(''.join(
+        json.dumps({'_id': i, '_source': {'id': i}}) + '\n' for i in ids))
+
+
+def test_rejected_document_aborts_load_and_restores_settings(loop, monkeypatch, tmp_path):
+    _write_dumps(tmp_path, 'movies', [f'film-{i}' for i in range(50)])
+    _write_dumps(tmp_path, 'genres', ['genre-0', 'bad', 'genre-2'])
+    elastic = _Elastic(bad_id='bad')
+    monkeypatch.setattr(load_es, 'AsyncElasticsearch', lambda **kwargs: elastic)
+
+    async def bump_generations(*args, **kwargs):
+        raise AssertionError('generations of a failed load are not bumped')
+
+    monkeypatch.setattr(load_es, 'bump_generations', bump_generations)
+
+    with pytest.raises(BulkIndexError):
+        loop.run_until_complete(load(tmp_path, ['movies', 'genres'], chunk_size=2, concurrency=2))
+
+    # The index still loading when the other failed gets its settings back too, before the client is closed
+    for index in ('movies', 'genres'):
+        settings = elastic.indices.settings[index]
+        assert (settings['refresh_interval'], settings['number_of_replicas']) == ('5s', '2')
+    assert elastic.closed
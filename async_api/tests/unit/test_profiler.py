@@ -0,0 +1,97 @@
+import asyncio
+import marshal
+import uuid
+from http import HTTPStatus
+from typing import Any, Dict, List
+
+import pytest
+from fastapi import HTTPException
+
+from api.v1.admin import profile_worker
+from core.config import settings
+from core.profiler import ProfileMode, Profiler, ProfilingMiddleware
+from models.user import User
+
+_SECRET = 'secret'
+_ADMIN = User(id=uuid.uuid4(), roles=['admin'])
+
+
+async def _app(scope, receive, send) -> None:
+    await asyncio.sleep(0.01)
+    await send({'type': 'http.response.start', 'status': HTTPStatus.NOT_FOUND, 'headers': []})
+    await send({'type': 'http.response.body', 'body': b'{}'})
+
+
+async def _request(middleware: ProfilingMiddleware, headers: List[tuple]) -> List[Dict[str, Any]]:
+    sent: List[Dict[str, Any]] = []
+
+    async def send(message) -> None:
+        sent.append(message)
+
+    await middleware({'type': 'http', 'headers': headers}, None, send)
+    return sent
+
+
+def test_profiled_request_answers_with_profile(loop):
+    profiler = Profiler()
+    middleware = ProfilingMiddleware(_app, profiler, _SECRET)
+
+    start, body = loop.run_until_complete(_request(middleware, [(b'x-profile', _SECRET.encode())]))
+
+    assert start['status'] == HTTPStatus.OK
+    assert (b'x-profiled-status', b'404') in start['headers']
+    # pstats data: functions by (file, line, name)
+    assert any(name == '_app' for _, _, name in marshal.loads(body['body']))
+    assert not profiler.active
+
+
+def test_request_with_wrong_secret_is_not_profiled(loop):
+    middleware = ProfilingMiddleware(_app, Profiler(), _SECRET)
+
+    start, body = loop.run_until_complete(_request(middleware, [(b'x-profile', b'guess')]))
+
+    assert start['status'] == HTTPStatus.NOT_FOUND and body['body'] == b'{}'
+
+
+def test_sampling_session_counts_requests(loop):
+    profiler = Profiler(sampling_interval=0.001)
+    middleware = ProfilingMiddleware(_app, profiler)
+
+    async def profile():
+        session = asyncio.create_task(profiler.profile(ProfileMode.SAMPLING, seconds=5, requests=2))
+        await asyncio.sleep(0)
+        for _ in range(2):
+            await _request(middleware, [])
+        # The session ends after the requests, well before its seconds
+        return await asyncio.wait_for(session, timeout=1)
+
+    session = loop.run_until_complete(profile())
+
+    assert session.requests == 2
+    # Collapsed stacks of the whole event loop, idle time included
+    stacks = session.dump().decode().splitlines()
+    assert stacks and all(line.rsplit(' ', 1)[1].isdigit() for line in stacks)
+
+
+def test_admin_profile_endpoint(loop, monkeypatch):
+    profiler = Profiler()
+
+    async def profile():
+        return await profile_worker(_ADMIN, profiler, ProfileMode.DETERMINISTIC, seconds=0.01, requests=None)
+
+    monkeypatch.setattr(settings, 'profiling_enabled', False)
+    with pytest.raises(HTTPException) as e:
+        loop.run_until_complete(profile())
+    assert e.value.status_code == HTTPStatus.NOT_FOUND
+
+    monkeypatch.setattr(settings, 'profiling_enabled', True)
+    response = loop.run_until_complete(profile())
+    assert response.media_type == 'application/octet-stream'
+    assert response.headers['x-profiled-requests'] == '0'
+    assert isinstance(marshal.loads(response.body), dict)
+
+    profiler.start(ProfileMode.SAMPLING)
+    with pytest.raises(HTTPException) as e:
+        loop.run_until_complete(profile())
+    assert e.value.status_code == HTTPStatus.CONFLICT
+    profiler.stop()
@@ -0,0 +1,20 @@
+from uuid import uuid4
+
+from db.query_builder import FilmFilters, build_film_query
+from db.query_log import normalize_query
+
+
+def test_normalize_query_keeps_every_clause():
+    genre_ids = [uuid4(), uuid4()]
+    filters = FilmFilters(genre_ids=genre_ids, genres_match='all', rating_from=5, actor_ids=[uuid4(), uuid4()])
+    body = {**build_film_query(filters), 'sort': [{'imdb_rating': 'desc'}, {'id': 'asc'}], 'size': 50}
+
+    clauses = normalize_query(body)['query']['bool']['filter']
+    assert len(clauses) == 4
+    assert clauses[0] == {'nested': {'path': 'genres', 'query': {'terms': {'genres.id': ['?']}}}}
+    assert clauses[2] == {'range': {'imdb_rating': {'gte': '?'}}}
+    assert clauses[3] == {'nested': {'path': 'actors', 'query': {'terms': {'actors.id': ['?']}}}}
+    assert normalize_query(body)['sort'] == body['sort']
+    # Queries differing only in the values share a shape
+    other = FilmFilters(genre_ids=[uuid4(), uuid4()], genres_match='all', rating_from=7, actor_ids=[uuid4()])
+    assert normalize_query({**build_film_query(other), 'sort': body['sort'], 'size': 50}) == normalize_query(body)
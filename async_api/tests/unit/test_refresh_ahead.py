@@ -0,0 +1,31 @@
+from typing import List
+
+from db.cache_generations import CacheGenerations
+from db.cache_storage import NEGATIVE_ENTRY, InMemoryCacheStorage
+from db.refresh_ahead import RefreshAhead
+
+
+def test_refresh_ahead_reloads_only_live_entries(loop):
+    cache = InMemoryCacheStorage()
+    generations = CacheGenerations()
+    refresh_ahead = RefreshAhead(cache, generations, min_hits=1, refresh_before=30, rate=1000)
+    loaded: List[str] = []
+
+    def loader(key: str):
+        async def load() -> None:
+            loaded.append(key)
+        return load
+
+    loop.run_until_complete(cache.set_many(
+        {'due': b'{}', 'fresh': b'{}', 'negative': NEGATIVE_ENTRY, 'genre': b'{}'},
+        {'due': 10, 'fresh': 300, 'negative': 30, 'genre': 10},
+    ))
+    for key in ('due', 'fresh', 'negative', 'missing'):
+        refresh_ahead.track(key, loader(key), 'movies')
+    refresh_ahead.track('genre', loader('genre'), 'genres')
+    loop.run_until_complete(generations._set('genres', 1))
+
+    assert loop.run_until_complete(refresh_ahead.refresh_due()) == 1
+    assert loaded == ['due']
+    # Missing keys and keys of a previous generation are forgotten
+    assert set(refresh_ahead.hot_keys()) == {'due', 'fresh', 'negative'}
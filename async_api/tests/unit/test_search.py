@@ -0,0 +1,82 @@
+import random
+from typing import Any, Callable, Dict, List, Tuple
+
+import pytest
+
+from db.search import SEARCH_TEMPLATES, SUGGESTERS, SearchQueryError, suggest_prefix
+from tests.load.fakes import FakeElasticsearch
+
+_SAMPLE = 30
+_TOP = 10
+
+_MOVIES_TEMPLATE = SEARCH_TEMPLATES['movies']
+_MOVIES_SUGGESTER = SUGGESTERS['movies']
+
+
+@pytest.fixture(scope='module')
+def elastic(data_dir) -> FakeElasticsearch:
+    # Scores of the fake count matched words per field times the field boost, they are not BM25
+    return FakeElasticsearch.from_dumps(data_dir, indices=('movies',))
+
+
+@pytest.fixture(scope='module')
+def films(movie_sources) -> List[Dict[str, Any]]:
+    return random.Random(0).sample(movie_sources, _SAMPLE)
+
+
+@pytest.fixture(scope='module')
+def queries(films) -> List[Tuple[str, str]]:
+    """Queries a user looking for a particular film would type: its title, or an actor and a word of the title."""
+    rng = random.Random(0)
+    queries = []
+    for movie in films:
+        queries.append((movie['title'], movie['id']))
+        if movie['actors_names']:
+            queries.append((f'{movie["actors_names"][0]} {rng.choice(movie["title"].split())}', movie['id']))
+    return queries
+
+
+def _query_string(elastic: FakeElasticsearch, query: str) -> Dict[str, Any]:
+    return elastic.search('movies', {'query': {'query_string': {'query': query}}, 'size': _TOP})
+
+
+def _template(elastic: FakeElasticsearch, query: str) -> Dict[str, Any]:
+    return elastic.search('movies', _MOVIES_TEMPLATE.render(_MOVIES_TEMPLATE.params(query, _TOP, 0)))
+
+
+def _mean_reciprocal_rank(
+    elastic: FakeElasticsearch, search: Callable[[FakeElasticsearch, str], Dict[str, Any]], queries
+) -> float:
+    total = 0.0
+    for query, film_id in queries:
+        ids = [hit['_id'] for hit in search(elastic, query)['hits']['hits']]
+        total += 1 / (ids.index(film_id) + 1) if film_id in ids else 0
+    return total / len(queries)
+
+
+def test_template_smoke(elastic, queries):
+    """
+    The rendered template finds the films users look for at least as well as the query it replaced.
+
+    Both are ranked by the scorer of the fake, so this only checks the template is wired up with its fields
+    and boosts, it says nothing of relevance in Elasticsearch.
+    """
+    baseline = _mean_reciprocal_rank(elastic, _query_string, queries)
+    assert _mean_reciprocal_rank(elastic, _template, queries) >= baseline
+
+
+def test_template_query_guard():
+    assert _MOVIES_TEMPLATE.params('*wars* AND "title:(', 10, 0)['query'] == 'wars and title'
+    assert _MOVIES_TEMPLATE.params('?! *', 10, 0) is None
+    with pytest.raises(SearchQueryError):
+        _MOVIES_TEMPLATE.params(' '.join(['word'] * 50), 10, 0)
+
+
+def test_suggest_finds_film_being_typed(elastic, films):
+    for film in films:
+        prefix = suggest_prefix(film['title'][:-1])
+        if not prefix:
+            continue
+        hits = elastic.search('movies', _MOVIES_SUGGESTER.body(prefix, 1000))['hits']['hits']
+        assert film['id'] in {hit['_id'] for hit in hits}
+        assert set(hits[0]['_source']) <= {'id', 'title', 'imdb_rating'}
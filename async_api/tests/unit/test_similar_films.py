@@ -0,0 +1,49 @@
+from typing import Any, Dict, List, Set
+
+import pytest
+
+from db.data_storage import FILM_PERSON_ROLES
+from jobs.similar_films import nearest_films
+
+_SAMPLE = 200
+_TOP = 10
+_GENRE_WEIGHT = 0.3
+
+
+@pytest.fixture(scope='module')
+def rated_films(movie_sources) -> List[Dict[str, Any]]:
+    return [m for m in movie_sources if m['imdb_rating'] is not None]
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b) if a | b else 0.0
+
+
+def _pairwise_scores(films: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """Scores of every pair of films sharing a person, one pair at a time, the way the job would without matrices."""
+    genres = {f['id']: {g['id'] for g in f['genres']} for f in films}
+    persons = {f['id']: {p['id'] for role in FILM_PERSON_ROLES for p in f[role]} for f in films}
+    return {
+        a: {
+            b: _GENRE_WEIGHT * _jaccard(genres[a], genres[b]) + (1 - _GENRE_WEIGHT) * _jaccard(persons[a], persons[b])
+            for b in genres if b != a and persons[a] & persons[b]
+        }
+        for a in genres
+    }
+
+
+def test_nearest_films_are_the_best_scoring(rated_films):
+    films = rated_films[:_SAMPLE]
+    scores = _pairwise_scores(films)
+    neighbors = nearest_films(films, _TOP, _GENRE_WEIGHT)
+    for film_id, similar in neighbors.items():
+        assert film_id not in similar
+        expected = sorted(scores[film_id].values(), reverse=True)[:_TOP]
+        assert [scores[film_id][i] for i in similar] == pytest.approx(expected, abs=1e-6)
+
+
+def test_nearest_films_of_films_sharing_nothing():
+    films = [{'id': str(i), 'imdb_rating': 5.0, 'genres': [{'id': 'drama'}]} for i in range(3)]
+    # Genres alone don't make films similar, they only rank films sharing a person
+    assert nearest_films(films) == {'0': [], '1': [], '2': []}
+    assert nearest_films([]) == {}
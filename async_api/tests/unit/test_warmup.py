@@ -0,0 +1,87 @@
+import asyncio
+from http import HTTPStatus
+from typing import Any, List
+
+import orjson
+
+from api.v1.health import ready
+from services.warmup import CacheWarmer
+
+
+class _FilmService:
+    def __init__(self, pages: List[bytes]) -> None:
+        # Pages to answer with, the last one from then on
+        self._pages = pages
+        self.calls = 0
+
+    async def get_films(self, *args: Any) -> bytes:
+        self.calls += 1
+        return self._pages[min(self.calls, len(self._pages)) - 1]
+
+    async def get_raw_film(self, *args: Any) -> None:
+        return None
+
+
+class _GenreService:
+    def __init__(self, error: Exception | None = None) -> None:
+        self._error = error
+
+    async def get_all_genres(self) -> List[Any]:
+        if self._error:
+            raise self._error
+        return []
+
+    async def get_genre_stats(self) -> List[Any]:
+        if self._error:
+            raise self._error
+        return []
+
+
+class _PersonService:
+    async def get_raw_person(self, *args: Any) -> None:
+        return None
+
+
+def _warmer(film_service: _FilmService, genre_service: _GenreService) -> CacheWarmer:
+    return CacheWarmer(
+        film_service, genre_service, _PersonService(),
+        list_pages=3, top_films=0, top_films_per_genre=0, persons=0, ready_threshold=0.9, retry_seconds=0,
+    )
+
+
+def _readiness(loop, warmer: CacheWarmer) -> tuple[int, dict]:
+    response = loop.run_until_complete(ready(warmer))
+    return response.status_code, orjson.loads(response.body)
+
+
+def test_failed_tasks_keep_worker_unready(loop):
+    # Elasticsearch is down: genres fail, pages of the films fail too
+    warmer = _warmer(_FilmService([b'[]']), _GenreService(ConnectionError('down')))
+
+    progress = loop.run_until_complete(warmer.warm())
+
+    assert progress.finished and progress.failed == 2 and progress.done == progress.total == 5
+    status, body = _readiness(loop, warmer)
+    assert status == HTTPStatus.SERVICE_UNAVAILABLE and not body['ready']
+
+
+def test_run_retries_until_ready(loop):
+    # The first warm-up fails outside of its tasks, on a page it can't read
+    film_service = _FilmService([b'not json', b'[]'])
+    warmer = _warmer(film_service, _GenreService())
+    errors = []
+
+    async def run() -> None:
+        task = asyncio.create_task(warmer.run())
+        while not task.done():
+            if warmer.progress.error:
+                errors.append(warmer.progress.error)
+            await asyncio.sleep(0)
+        await task
+
+    loop.run_until_complete(asyncio.wait_for(run(), timeout=5))
+
+    assert errors and 'JSONDecodeError' in errors[0]
+    assert warmer.progress.error is None and warmer.progress.ratio == 1.0
+    status, body = _readiness(loop, warmer)
+    assert status == HTTPStatus.OK and body['ready']
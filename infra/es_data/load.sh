@@ -2,12 +2,7 @@
 
 set -e
 
-for index in movies personas genres; do
-    echo "uploading $index"
-    for type in settings mapping data; do
-        /usr/bin/dumb-init elasticdump \
-        --input=/data/"$index"_"$type".json \
-        --output=http://$ELASTIC_HOST:$ELASTIC_PORT/$index \
-        --type=$type
-    done
-done
+# Releases the dumps as new versions of the indices behind the read aliases, see async_api/src/jobs/indices.py
+# for options
+cd /home/app/async_api/src
+python -m jobs.indices /data "$@"